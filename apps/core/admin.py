@@ -1,6 +1,6 @@
 from django import forms
 from django.contrib import admin
-from .models import Tenant, TimeStampedModel, SoftDeleteModel
+from .models import OutboundEmail, Tenant, TimeStampedModel, SoftDeleteModel
 
 
 class TenantAdminForm(forms.ModelForm):
@@ -76,3 +76,14 @@ class TenantAdmin(admin.ModelAdmin):
         if obj: 
             return self.readonly_fields + ['domain']
         return self.readonly_fields
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'recipient', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['recipient', 'subject']
+    readonly_fields = [field.name for field in OutboundEmail._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
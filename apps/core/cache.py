@@ -0,0 +1,347 @@
+"""
+Cache primitives shared by the tenant, property and admin layers.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django_redis.cache import RedisCache
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from apps.core import metrics
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class CacheVersion:
+    """
+    Generation counter shared between worker processes through the cache.
+
+    Each process keeps a local copy and re-reads the shared value at most
+    every ``check_interval`` seconds, so hot paths can compare versions
+    without a Redis round trip per request. ``bump()`` is visible
+    immediately in the calling process and within ``check_interval``
+    seconds everywhere else.
+
+    Usage:
+        version = CacheVersion('tenant_routing:version')
+        if local_version != version.get():
+            rebuild()
+    """
+
+    def __init__(self, key, check_interval=2, timeout=None):
+        self.key = key
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self._value = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, force=False):
+        """Return the current generation; ``force`` skips the local interval."""
+        now = time.monotonic()
+        if not force and self._value is not None and now - self._checked_at < self.check_interval:
+            return self._value
+        with self._lock:
+            if force or self._value is None or now - self._checked_at >= self.check_interval:
+                self._value = self._read()
+                self._checked_at = now
+            return self._value
+
+    def bump(self):
+        """Start a new generation and return it."""
+        with self._lock:
+            try:
+                value = cache.incr(self.key)
+            except ValueError:
+                # Key missing (first bump or cache flushed): seed a fresh value.
+                value = self._seed()
+                cache.set(self.key, value, self.timeout)
+            except Exception as e:
+                logger.warning(f"Could not bump cache version {self.key}: {str(e)}")
+                value = (self._value or 0) + 1
+            self._value = value
+            self._checked_at = time.monotonic()
+            return value
+
+    def _read(self):
+        # Strict calls raise instead of returning the breaker's fallback, so
+        # an outage keeps the last known generation rather than looking like
+        # a missing key and seeding a new one on every check.
+        try:
+            value = _strict_call('get', self.key)
+            if value is None:
+                value = self._seed()
+                if not _strict_call('add', self.key, value, self.timeout):
+                    value = _strict_call('get', self.key, value)
+            return value
+        except Exception as e:
+            logger.warning(f"Could not read cache version {self.key}: {str(e)}")
+            return self._value if self._value is not None else 0
+
+    @staticmethod
+    def _seed():
+        # Millisecond timestamps never go backwards across a cache flush, so
+        # a reseeded counter can't collide with a generation seen before.
+        return int(time.time() * 1000)
+
+
+def _strict_call(method, *args):
+    strict = getattr(cache, 'call_strict', None)
+    if strict is None:
+        return getattr(cache, method)(*args)
+    return strict(method, *args)
+
+
+class CacheVersionMap:
+    """
+    Lazily created CacheVersion per name, for generations scoped to one
+    tenant or agency.
+
+    With ``maxsize`` only the most recently used versions are kept in the
+    process (an evicted one is re-read from the cache on next use), and
+    ``timeout`` expires the shared keys, for maps keyed by open-ended names.
+
+    Usage:
+        versions = CacheVersionMap('home_sections:{}:version')
+        versions[agency_id].bump()
+    """
+
+    def __init__(self, key_template, check_interval=2, maxsize=None, timeout=None):
+        self.key_template = key_template
+        self.check_interval = check_interval
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        if self.maxsize is None:
+            version = self._versions.get(name)
+            if version is not None:
+                return version
+        with self._lock:
+            version = self._versions.get(name)
+            if version is None:
+                version = CacheVersion(self.key_template.format(name), self.check_interval, self.timeout)
+                self._versions[name] = version
+                if self.maxsize is not None and len(self._versions) > self.maxsize:
+                    self._versions.popitem(last=False)
+            elif self.maxsize is not None:
+                self._versions.move_to_end(name)
+        return version
+
+    def __len__(self):
+        return len(self._versions)
+
+    def clear(self):
+        """Forget the local copies; every version is re-read from the cache on next use."""
+        with self._lock:
+            self._versions.clear()
+
+
+class BoundedTTLCache:
+    """
+    Small thread-safe LRU mapping whose entries expire after ``ttl`` seconds.
+
+    Used for per-process caches that must never grow with attacker-chosen
+    keys (e.g. unknown Host headers).
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CacheUnavailable(Exception):
+    """Raised by counter operations while the cache circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail fast with their fallback for ``reset_timeout`` seconds. The
+    first call after that is let through as a probe (half-open): success
+    closes the circuit, failure opens it for another ``reset_timeout``.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    FAILURE_EXCEPTIONS = (ConnectionInterrupted, RedisConnectionError, RedisTimeoutError, OSError)
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        if self.state == self.CLOSED:
+            return True
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        if self.state != self.CLOSED or self._failures:
+            with self._lock:
+                if self.state != self.CLOSED:
+                    logger.info(f"Circuit {self.name} closed")
+                self.state = self.CLOSED
+                self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit {self.name} opened after {self._failures} failures")
+                    metrics.incr('cache.circuit_opened', label=self.name)
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def call(self, func, *args, fallback=None, raise_unavailable=False, **kwargs):
+        """
+        Run ``func`` unless the circuit is open. Returns ``fallback`` (or
+        raises CacheUnavailable) when the call is skipped or fails with a
+        connection error.
+        """
+        if not self.allow_request():
+            metrics.incr('cache.fast_fail', label=self.name)
+            return self._fail(fallback, raise_unavailable)
+        try:
+            result = func(*args, **kwargs)
+        except self.FAILURE_EXCEPTIONS as e:
+            self.record_failure()
+            logger.warning(f"Cache {self.name} call failed: {str(e)}")
+            return self._fail(fallback, raise_unavailable)
+        except BaseException:
+            # The server answered (bad value, serialization error...): the
+            # connection is fine, and a half-open probe must not stay stuck.
+            self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def _fail(self, fallback, raise_unavailable):
+        if raise_unavailable:
+            raise CacheUnavailable(f"Cache {self.name} is unavailable")
+        return fallback
+
+
+class CircuitBreakerCacheMixin:
+    """
+    Routes a cache backend's operations through a CircuitBreaker, so an
+    unreachable server costs at most ``FAILURE_THRESHOLD`` socket timeouts
+    before every caller (views, TenantMiddleware, sessions, Celery results)
+    gets an instant miss instead.
+
+    Reads return their default, writes report failure, and incr/decr raise
+    CacheUnavailable. Configure through the cache's ``CIRCUIT_BREAKER``
+    entry:
+
+        'CIRCUIT_BREAKER': {'FAILURE_THRESHOLD': 3, 'RESET_TIMEOUT': 30}
+    """
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        options = params.get('CIRCUIT_BREAKER', {})
+        self.breaker = CircuitBreaker(
+            name=options.get('NAME', 'cache'),
+            failure_threshold=options.get('FAILURE_THRESHOLD', 3),
+            reset_timeout=options.get('RESET_TIMEOUT', 30),
+        )
+
+    def get(self, key, default=None, *args, **kwargs):
+        return self.breaker.call(super().get, key, default, *args, fallback=default, **kwargs)
+
+    def get_many(self, keys, *args, **kwargs):
+        return self.breaker.call(super().get_many, keys, *args, fallback={}, **kwargs)
+
+    def has_key(self, key, *args, **kwargs):
+        return self.breaker.call(super().has_key, key, *args, fallback=False, **kwargs)
+
+    def set(self, key, value, *args, **kwargs):
+        return self.breaker.call(super().set, key, value, *args, fallback=False, **kwargs)
+
+    def add(self, key, value, *args, **kwargs):
+        return self.breaker.call(super().add, key, value, *args, fallback=False, **kwargs)
+
+    def set_many(self, data, *args, **kwargs):
+        return self.breaker.call(super().set_many, data, *args, fallback=list(data), **kwargs)
+
+    def touch(self, key, *args, **kwargs):
+        return self.breaker.call(super().touch, key, *args, fallback=False, **kwargs)
+
+    def delete(self, key, *args, **kwargs):
+        return self.breaker.call(super().delete, key, *args, fallback=False, **kwargs)
+
+    def delete_many(self, keys, *args, **kwargs):
+        return self.breaker.call(super().delete_many, keys, *args, fallback=None, **kwargs)
+
+    def clear(self, *args, **kwargs):
+        return self.breaker.call(super().clear, *args, fallback=None, **kwargs)
+
+    def call_strict(self, method, *args, **kwargs):
+        """Run backend ``method`` raising CacheUnavailable instead of returning a fallback."""
+        return self.breaker.call(getattr(super(), method), *args, raise_unavailable=True, **kwargs)
+
+    def incr(self, key, *args, **kwargs):
+        return self.breaker.call(super().incr, key, *args, raise_unavailable=True, **kwargs)
+
+    def decr(self, key, *args, **kwargs):
+        return self.breaker.call(super().decr, key, *args, raise_unavailable=True, **kwargs)
+
+
+class CircuitBreakerRedisCache(CircuitBreakerCacheMixin, RedisCache):
+    """django-redis backend guarded by a circuit breaker."""
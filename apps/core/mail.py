@@ -0,0 +1,192 @@
+"""
+Batched outbound email.
+
+``queue_email()`` stores one OutboundEmail row per recipient (inside the
+caller's transaction, so a rolled-back lead never mails anyone) and, after
+commit, schedules a ``flush_outbox`` task ``EMAIL_BATCH_WINDOW`` seconds
+out, at most one per window. The flush sends every due message over a
+single connection from ``get_connection()``: one SMTP login and TLS
+handshake per batch instead of one per email. Messages go out one
+``send_messages()`` call at a time on that open connection, so a rejected
+message is retried alone instead of resending the ones before it.
+
+A recipient who already received ``EMAIL_RATE_LIMIT`` messages in the last
+hour is deferred to the next batch rather than sent. Failures are retried
+with exponential backoff up to ``MAX_ATTEMPTS`` times. The backend comes
+from ``EMAIL_BACKEND`` (SMTP in production, console or file locally).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.core import metrics
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 6
+MAX_RETRY_DELAY = 60 * 60
+RATE_LIMIT_DEFER = 5 * 60
+SENT_RETENTION_DAYS = 7
+
+FLUSH_LOCK_KEY = 'mail:outbox:flush_scheduled'
+
+
+def queue_email(subject, body, recipient_list, from_email=None):
+    """Queue ``body`` for every address in ``recipient_list``; returns the rows."""
+    from apps.core.models import OutboundEmail
+
+    now = timezone.now()
+    emails = OutboundEmail.objects.bulk_create([
+        OutboundEmail(
+            recipient=recipient,
+            subject=subject[:255],
+            body=body,
+            from_email=from_email or '',
+            next_attempt_at=now,
+        )
+        for recipient in dict.fromkeys(recipient_list)
+    ])
+    transaction.on_commit(schedule_flush)
+    return emails
+
+
+def schedule_flush():
+    """Queue the next batch unless one is already scheduled for this window."""
+    from apps.core.tasks import flush_outbox
+
+    window = settings.EMAIL_BATCH_WINDOW
+    try:
+        if not cache.add(FLUSH_LOCK_KEY, 1, window):
+            return
+    except Exception as e:
+        logger.warning(f"Outbox flush lock unavailable: {str(e)}")
+    try:
+        flush_outbox.apply_async(countdown=window)
+    except Exception as e:
+        # The beat sweep sends it on its next run.
+        logger.warning(f"Could not queue outbox flush: {str(e)}")
+
+
+def flush(batch_size=BATCH_SIZE):
+    """Send the due messages over one connection. Returns the number sent."""
+    from apps.core.models import OutboundEmail
+
+    try:
+        cache.delete(FLUSH_LOCK_KEY)
+    except Exception:
+        pass
+
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects
+            .select_for_update()
+            .filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not emails:
+            return 0
+        emails, deferred = _apply_rate_limit(emails, now)
+        if deferred:
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in deferred]).update(
+                next_attempt_at=now + timedelta(seconds=RATE_LIMIT_DEFER)
+            )
+            metrics.incr('mail.rate_limited', amount=len(deferred))
+        # Claim the batch so an overlapping flush skips it while we send.
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt_at=now + timedelta(seconds=MAX_RETRY_DELAY)
+        )
+
+    sent, failed = _send(emails)
+    _record_results(sent, failed)
+    OutboundEmail.objects.filter(
+        status=OutboundEmail.SENT, sent_at__lt=now - timedelta(days=SENT_RETENTION_DAYS)
+    ).delete()
+    logger.info(f"Outbox flush: {len(sent)} sent, {len(failed)} failed, {len(deferred)} deferred")
+    return len(sent)
+
+
+def _apply_rate_limit(emails, now):
+    from apps.core.models import OutboundEmail
+
+    limit = settings.EMAIL_RATE_LIMIT
+    recipients = {email.recipient for email in emails}
+    sent_counts = dict(
+        OutboundEmail.objects
+        .filter(recipient__in=recipients, sent_at__gte=now - timedelta(hours=1))
+        .values('recipient')
+        .annotate(total=Count('id'))
+        .values_list('recipient', 'total')
+    )
+    allowed, deferred = [], []
+    for email in emails:
+        if sent_counts.get(email.recipient, 0) >= limit:
+            deferred.append(email)
+        else:
+            sent_counts[email.recipient] = sent_counts.get(email.recipient, 0) + 1
+            allowed.append(email)
+    return allowed, deferred
+
+
+def _send(emails):
+    sent, failed = [], []
+    if not emails:
+        return sent, failed
+    try:
+        connection = get_connection(fail_silently=False)
+        connection.open()
+    except Exception as e:
+        logger.error(f"Could not open email connection: {str(e)}")
+        return sent, [(email, e) for email in emails]
+
+    try:
+        for email in emails:
+            message = EmailMessage(
+                subject=email.subject,
+                body=email.body,
+                from_email=email.from_email or settings.DEFAULT_FROM_EMAIL,
+                to=[email.recipient],
+                connection=connection,
+            )
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                logger.error(f"Error sending email to {email.recipient}: {str(e)}")
+                failed.append((email, e))
+            else:
+                sent.append(email)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+    return sent, failed
+
+
+def _record_results(sent, failed):
+    from apps.core.models import OutboundEmail
+
+    now = timezone.now()
+    if sent:
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in sent]).update(
+            status=OutboundEmail.SENT, sent_at=now, last_error=''
+        )
+        metrics.incr('mail.sent', amount=len(sent))
+    for email, error in failed:
+        email.attempts += 1
+        email.last_error = str(error)[:1000]
+        if email.attempts >= MAX_ATTEMPTS:
+            email.status = OutboundEmail.FAILED
+        email.next_attempt_at = now + timedelta(seconds=min(60 * 2 ** email.attempts, MAX_RETRY_DELAY))
+    if failed:
+        OutboundEmail.objects.bulk_update(
+            [email for email, _ in failed], ['attempts', 'last_error', 'status', 'next_attempt_at']
+        )
+        metrics.incr('mail.failed', amount=len(failed))
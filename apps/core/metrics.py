@@ -0,0 +1,44 @@
+"""
+Per-process counters exposed through the staff-only /api/metrics/ endpoint.
+
+Counters live in the worker's memory: they are cheap enough for hot paths
+and reset when the worker restarts. Each metric keeps at most
+``MAX_LABELS`` distinct labels; later labels are folded into ``other`` so
+attacker-chosen values (hosts, user agents) can't grow memory.
+"""
+import threading
+
+MAX_LABELS = 500
+OTHER_LABEL = 'other'
+
+_counters = {}
+_lock = threading.Lock()
+
+
+def incr(name, label='', amount=1):
+    """
+    Increment a counter.
+
+    Usage:
+        metrics.incr('tenant.unknown_host_misses', label=host)
+    """
+    with _lock:
+        series = _counters.setdefault(name, {})
+        if label not in series and len(series) >= MAX_LABELS:
+            label = OTHER_LABEL
+        series[label] = series.get(label, 0) + amount
+
+
+def get(name, label=''):
+    return _counters.get(name, {}).get(label, 0)
+
+
+def snapshot():
+    """Return a copy of every counter as ``{name: {label: value}}``."""
+    with _lock:
+        return {name: dict(series) for name, series in _counters.items()}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
@@ -0,0 +1,230 @@
+"""
+Full-page cache for anonymous tenant pages.
+
+Views wrapped in ``cache_tenant_page`` store their rendered response under
+the host, path and normalized query string (sorted, blanks and tracking
+parameters dropped). Every entry carries surrogate keys: ``global``,
+``agency:<id>`` and whatever the view adds with ``add_tags()``
+(``property:<reference>``, ``listings:<agency>``...), together with
+each key's version at render time. ``purge(*tags)`` bumps those versions
+once the transaction commits, so a Property save retires exactly the pages
+that showed it without knowing their URLs.
+
+Entries carry an ETag and Last-Modified, and conditional requests are
+answered with a 304 from the entry alone. Requests carrying a session or
+flash-message cookie bypass the cache, and responses that set cookies are
+never stored. A CSRF token in a form is stored as a placeholder and
+replaced with the visitor's own token on every hit.
+"""
+import hashlib
+import logging
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag, urlencode
+from django.utils.module_loading import import_string
+
+from apps.core import metrics
+from apps.core.cache import CacheVersionMap
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10 * 60
+
+IGNORED_QUERY_PARAMS = {'fbclid', 'gclid', 'msclkid', '_'}
+IGNORED_QUERY_PREFIXES = ('utm_',)
+
+CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = b'__page_cache_csrf_token__'
+
+# Tags are open-ended (one per property), so the per-process map is bounded
+# and the shared keys expire; a tag re-seeded after expiry only turns its
+# older entries into misses.
+TAG_VERSIONS_MAXSIZE = 10000
+TAG_VERSION_TIMEOUT = 24 * 60 * 60
+
+tag_versions = CacheVersionMap(
+    'page_cache:tag:{}:version', maxsize=TAG_VERSIONS_MAXSIZE, timeout=TAG_VERSION_TIMEOUT
+)
+
+
+def normalize_query(query_dict):
+    """Canonical query string: sorted, without blanks or tracking parameters."""
+    items = []
+    for name, values in query_dict.lists():
+        if name in IGNORED_QUERY_PARAMS or name.startswith(IGNORED_QUERY_PREFIXES):
+            continue
+        items.extend((name, value) for value in values if value != '')
+    return urlencode(sorted(items))
+
+
+def page_cache_key(request):
+    url = f'{request.path}?{normalize_query(request.GET)}'
+    return f'page_cache:{request.get_host().lower()}:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+def add_tags(request, *tags):
+    """
+    Attach surrogate keys to the page being rendered for ``request``. Call
+    it before reading the data the tags stand for: the versions are taken
+    now, so a purge racing the render leaves the entry already stale. Tags
+    built from request input (a URL reference) belong after the lookup
+    that proves the object exists, so junk URLs create no versions.
+    """
+    page_tags = getattr(request, '_page_cache_tags', None)
+    if page_tags is None:
+        return
+    for tag in map(str, tags):
+        if tag not in page_tags:
+            page_tags[tag] = tag_versions[tag].get()
+
+
+def on_hit(request, func_path, *args):
+    """
+    Call the importable ``func_path`` with ``(request, *args)`` whenever the
+    page is served from the cache, for side effects the view would have had
+    (e.g. counting a property view).
+    """
+    if hasattr(request, '_page_cache_tags'):
+        request._page_cache_hit = (func_path, args)
+
+
+def purge(*tags):
+    """Retire every page tagged with one of ``tags`` once the transaction commits."""
+    tags = {str(tag) for tag in tags}
+    transaction.on_commit(lambda: _bump(tags))
+
+
+def _bump(tags):
+    for tag in tags:
+        tag_versions[tag].bump()
+
+
+def cache_tenant_page(view_func):
+    """Serve ``view_func`` from the page cache for anonymous visitors."""
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable_request(request):
+            metrics.incr('page_cache.bypass')
+            return view_func(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        entry = _load(key)
+        if entry is not None:
+            metrics.incr('page_cache.hit')
+            _run_hit_hook(request, entry)
+            return _respond(request, entry)
+
+        metrics.incr('page_cache.miss')
+        request._page_cache_tags = {}
+        request._page_cache_hit = None
+        add_tags(request, 'global', f'agency:{request.agency.pk}')
+        response = view_func(request, *args, **kwargs)
+        if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+            response.render()
+
+        entry = _store(request, key, response)
+        if entry is None:
+            return response
+        conditional = get_conditional_response(
+            request, etag=entry['etag'], last_modified=entry['last_modified']
+        )
+        if conditional is not None:
+            return _with_validators(conditional, entry)
+        return _with_validators(response, entry)
+
+    return wrapper
+
+
+def _cacheable_request(request):
+    if not getattr(settings, 'PAGE_CACHE_ENABLED', True):
+        return False
+    if request.method not in ('GET', 'HEAD') or getattr(request, 'agency', None) is None:
+        return False
+    cookies = request.COOKIES
+    return settings.SESSION_COOKIE_NAME not in cookies and 'messages' not in cookies
+
+
+def _load(key):
+    try:
+        entry = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Page cache read failed: {str(e)}")
+        return None
+    if entry is None:
+        return None
+    for tag, version in entry['tags'].items():
+        if tag_versions[tag].get() != version:
+            return None
+    return entry
+
+
+def _store(request, key, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return None
+    cache_control = response.get('Cache-Control', '')
+    if 'private' in cache_control or 'no-store' in cache_control:
+        return None
+    session = getattr(request, 'session', None)
+    if session is not None and session.modified:
+        return None
+
+    content = response.content
+    csrf = bool(request.META.get('CSRF_COOKIE_NEEDS_UPDATE'))
+    if csrf:
+        content, replaced = CSRF_INPUT_RE.subn(rb'\1' + CSRF_PLACEHOLDER + rb'\2', content)
+        if not replaced:
+            # The token went somewhere other than a form field; don't share it.
+            return None
+
+    entry = {
+        'content': content,
+        'content_type': response['Content-Type'],
+        'csrf': csrf,
+        'etag': quote_etag(hashlib.md5(content).hexdigest()),
+        'last_modified': int(time.time()),
+        'tags': request._page_cache_tags,
+        'hit': request._page_cache_hit,
+    }
+    try:
+        cache.set(key, entry, getattr(settings, 'PAGE_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    except Exception as e:
+        logger.warning(f"Page cache write failed: {str(e)}")
+    return entry
+
+
+def _respond(request, entry):
+    conditional = get_conditional_response(request, etag=entry['etag'], last_modified=entry['last_modified'])
+    if conditional is not None:
+        return _with_validators(conditional, entry)
+
+    content = entry['content']
+    if entry['csrf']:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+    response = HttpResponse(content, content_type=entry['content_type'])
+    return _with_validators(response, entry)
+
+
+def _with_validators(response, entry):
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _run_hit_hook(request, entry):
+    if not entry['hit']:
+        return
+    func_path, args = entry['hit']
+    try:
+        import_string(func_path)(request, *args)
+    except Exception as e:
+        logger.warning(f"Page cache hit hook {func_path} failed: {str(e)}")
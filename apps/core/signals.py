@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Tenant
+from .tenancy import tenant_contexts, tenant_router
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidate_tenant_routing(sender, instance, **kwargs):
+    """Rebuild the domain routing table whenever a tenant changes."""
+    tenant_router.invalidate()
+    tenant_contexts.invalidate()
@@ -6,22 +6,36 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-@shared_task
+@shared_task(ignore_result=True)
 def send_email_task(subject, message, recipient_list):
-    
-    from django.core.mail import send_mail
-    from django.conf import settings
-    
+    """Queue an email in the batched outbox; see apps.core.mail."""
+    from apps.core import mail
+
+    mail.queue_email(subject, message, recipient_list)
+    logger.info(f'Email queued for {recipient_list}')
+
+
+@shared_task(ignore_result=True)
+def flush_outbox():
+    """Send the due outbox messages over one mail connection."""
+    from apps.core import mail
+
+    mail.flush()
+
+
+@shared_task(ignore_result=True)
+def refresh_cache_task(key, func_path, args, timeout, stale_timeout, lock_key=None):
+    """Recompute a get_or_set_cache entry off the request path."""
+    from django.core.cache import cache
+    from django.utils.module_loading import import_string
+    from apps.core.utils import store_cached_value
+    import time
+
     try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=recipient_list,
-            fail_silently=False,
-        )
-        logger.info(f'Email sent successfully to {recipient_list}')
-        return f'Email sent to {recipient_list}'
-    except Exception as e:
-        logger.error(f'Error sending email: {str(e)}')
-        raise
+        started = time.monotonic()
+        value = import_string(func_path)(*args)
+        store_cached_value(key, value, timeout, stale_timeout, time.monotonic() - started)
+        logger.info(f'Cache entry {key} refreshed')
+    finally:
+        if lock_key:
+            cache.delete(lock_key)
@@ -0,0 +1,179 @@
+"""
+In-process tenant resolution for TenantMiddleware.
+"""
+import logging
+import pickle
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.core import metrics
+from apps.core.cache import BoundedTTLCache, CacheVersion
+
+logger = logging.getLogger(__name__)
+
+
+class TenantRouter:
+    """
+    Maps every primary and additional domain of the active tenants to a
+    tenant id.
+
+    The table is built with a single query per process and rebuilt only when
+    the shared routing version changes, so resolving a host is a dict lookup.
+
+    The first miss for a host re-checks the shared version right away, in
+    case another worker just added the domain. The host is then remembered
+    in a bounded negative cache for ``UNKNOWN_HOST_TTL`` seconds, and
+    repeated probes short-circuit without touching Redis or the database.
+    """
+
+    UNKNOWN_HOST_TTL = 30
+    UNKNOWN_HOST_MAXSIZE = 4096
+
+    def __init__(self, version_key='tenant_routing:version'):
+        self.version = CacheVersion(version_key)
+        self.unknown_hosts = BoundedTTLCache(self.UNKNOWN_HOST_MAXSIZE, self.UNKNOWN_HOST_TTL)
+        self._routes = {}
+        self._loaded_version = None
+        self._lock = threading.Lock()
+
+    def resolve(self, host):
+        """Return the id of the active tenant serving ``host``, or None."""
+        host = host.lower()
+        tenant_id = self.get_routes().get(host)
+        if tenant_id is not None:
+            return tenant_id
+
+        metrics.incr('tenant.unknown_host_misses', label=host)
+        if host in self.unknown_hosts:
+            metrics.incr('tenant.unknown_host_short_circuits')
+            return None
+
+        tenant_id = self.get_routes(force=True).get(host)
+        if tenant_id is None:
+            logger.debug(f"No tenant found for domain: {host}")
+            self.unknown_hosts.set(host, True)
+        return tenant_id
+
+    def get_routes(self, force=False):
+        version = self.version.get(force=force)
+        if self._loaded_version != version:
+            with self._lock:
+                if self._loaded_version != version:
+                    self._routes = self._build()
+                    self._loaded_version = version
+                    self.unknown_hosts.clear()
+        return self._routes
+
+    def invalidate(self):
+        """
+        Drop the table here right away and in every other worker once the
+        current transaction commits, so nobody rebuilds from uncommitted rows.
+        """
+        self._loaded_version = None
+        transaction.on_commit(self.version.bump)
+
+    def forget(self, tenant_id):
+        """
+        Drop ``tenant_id``'s domains from this worker's table only. For routes
+        that outlived their tenant: unlike ``invalidate()``, one stale host
+        can't make every worker rebuild, and the tenant signals bump the
+        shared version when the row really changes.
+        """
+        with self._lock:
+            self._routes = {host: routed_id for host, routed_id in self._routes.items() if routed_id != tenant_id}
+
+    def _build(self):
+        from apps.core.models import Tenant
+
+        routes = {}
+        tenants = (
+            Tenant.objects
+            .filter(is_active=True)
+            .order_by('id')
+            .values_list('id', 'domain', 'additional_domains')
+        )
+        for tenant_id, domain, additional_domains in tenants:
+            for name in [domain, *(additional_domains or [])]:
+                name = (name or '').strip().lower()
+                if not name:
+                    continue
+                # Primary domains are unique; an additional domain never
+                # shadows a domain another tenant already claimed.
+                if name in routes and name != domain.lower():
+                    logger.warning(f"Domain {name} is claimed by several tenants, keeping tenant {routes[name]}")
+                    continue
+                routes[name] = tenant_id
+        logger.info(f"Tenant routing table built with {len(routes)} domains")
+        return routes
+
+
+class TenantContextCache:
+    """
+    Fully hydrated tenant objects (tenant, agency with its location and
+    branding fields, agency contacts) cached per worker and in Redis.
+
+    Entries are stored pickled and unpickled per request, so every request
+    gets its own copy and a warm lookup runs no SQL. Any Tenant, Agency or
+    AgencyContact change bumps the shared version, which retires every
+    snapshot at once: these rows change rarely, and a global generation keeps
+    invalidation a single Redis write.
+    """
+
+    TIMEOUT = 60 * 60
+
+    def __init__(self, version_key='tenant_context:version'):
+        self.version = CacheVersion(version_key)
+        self._local = {}
+
+    def get(self, tenant_id):
+        """Return a private copy of the active tenant ``tenant_id``, or None."""
+        version = self.version.get()
+        entry = self._local.get(tenant_id)
+        if entry is not None and entry[0] == version:
+            return pickle.loads(entry[1])
+
+        key = f'tenant_context:{tenant_id}:{version}'
+        payload = self._cache_get(key)
+        if payload is None:
+            tenant = self._load(tenant_id)
+            if tenant is None:
+                self._local.pop(tenant_id, None)
+                return None
+            payload = pickle.dumps(tenant, pickle.HIGHEST_PROTOCOL)
+            self._cache_set(key, payload)
+        self._local[tenant_id] = (version, payload)
+        return pickle.loads(payload)
+
+    def invalidate(self):
+        self._local.clear()
+        transaction.on_commit(self.version.bump)
+
+    def _load(self, tenant_id):
+        from apps.core.models import Tenant
+
+        return (
+            Tenant.objects
+            .select_related('agency', 'agency__wilaya', 'agency__commune')
+            .prefetch_related('agency__contacts')
+            .filter(id=tenant_id, is_active=True)
+            .first()
+        )
+
+    def _cache_get(self, key):
+        try:
+            return cache.get(key)
+        except Exception as e:
+            logger.warning(f"Tenant context cache read failed: {str(e)}")
+            return None
+
+    def _cache_set(self, key, payload):
+        try:
+            cache.set(key, payload, self.TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Tenant context cache write failed: {str(e)}")
+
+
+tenant_router = TenantRouter()
+tenant_contexts = TenantContextCache()
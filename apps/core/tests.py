@@ -0,0 +1,469 @@
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core import mail as django_mail
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.mail.backends.locmem import EmailBackend as LocMemEmailBackend
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django_redis.exceptions import ConnectionInterrupted
+
+from apps.core import mail, metrics
+from apps.core.cache import CacheUnavailable, CacheVersion, CacheVersionMap, CircuitBreaker, CircuitBreakerCacheMixin
+from apps.core.models import OutboundEmail, Tenant
+from apps.core.tenancy import tenant_contexts, tenant_router
+from apps.core.utils import get_or_set_cache, store_cached_value
+from config.middleware import TenantMiddleware
+
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'core-tests',
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ALLOWED_HOSTS=["*"])
+class TenantRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.factory = RequestFactory()
+        cls.tenant = Tenant.objects.create(
+            name="Routed",
+            slug="routed",
+            domain="routed.test",
+            additional_domains=["www.routed.test", "Alias.Routed.test"],
+            schema_name="routed",
+        )
+        cls.inactive = Tenant.objects.create(
+            name="Inactive",
+            slug="inactive",
+            domain="inactive.test",
+            schema_name="inactive",
+            is_active=False,
+        )
+
+    def setUp(self):
+        tenant_router.invalidate()
+
+    def test_primary_and_additional_domains_resolve(self):
+        self.assertEqual(tenant_router.resolve("routed.test"), self.tenant.id)
+        self.assertEqual(tenant_router.resolve("www.routed.test"), self.tenant.id)
+        self.assertEqual(tenant_router.resolve("alias.routed.test"), self.tenant.id)
+        self.assertIsNone(tenant_router.resolve("inactive.test"))
+        self.assertIsNone(tenant_router.resolve("unknown.test"))
+
+    def test_warm_lookups_do_not_query(self):
+        tenant_router.resolve("routed.test")
+
+        with self.assertNumQueries(0):
+            for host in ("routed.test", "www.routed.test", "unknown.test"):
+                tenant_router.resolve(host)
+
+    def test_tenant_save_rebuilds_table(self):
+        tenant_router.resolve("routed.test")
+
+        self.tenant.additional_domains = ["new.routed.test"]
+        self.tenant.save()
+
+        self.assertEqual(tenant_router.resolve("new.routed.test"), self.tenant.id)
+        self.assertIsNone(tenant_router.resolve("www.routed.test"))
+
+    def test_middleware_resolves_additional_domain(self):
+        request = self.factory.get("/", HTTP_HOST="www.routed.test")
+
+        response = TenantMiddleware(lambda r: None).process_request(request)
+
+        self.assertIsNone(response)
+        self.assertEqual(request.tenant, self.tenant)
+        self.assertEqual(request.tenant_domain, "www.routed.test")
+
+    def test_middleware_rejects_unknown_domain(self):
+        request = self.factory.get("/", HTTP_HOST="unknown.test")
+
+        response = TenantMiddleware(lambda r: None).process_request(request)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_stale_route_is_dropped_without_a_shared_rebuild(self):
+        stale = Tenant.objects.create(name="Stale", slug="stale", domain="stale.test", schema_name="stale")
+        tenant_router.resolve("routed.test")
+        Tenant.objects.filter(pk=stale.pk).update(is_active=False)  # sends no signal
+        version = tenant_router.version.get(force=True)
+
+        request = self.factory.get("/", HTTP_HOST="stale.test")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(TenantMiddleware(lambda r: None).process_request(request).status_code, 404)
+
+        self.assertEqual(tenant_router.version.get(force=True), version)
+        self.assertIsNone(tenant_router.resolve("stale.test"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(tenant_router.resolve("stale.test"))
+            self.assertEqual(tenant_router.resolve("routed.test"), self.tenant.id)
+
+    def test_repeated_unknown_host_short_circuits(self):
+        tenant_router.resolve("routed.test")
+        metrics.reset()
+
+        tenant_router.resolve("probe.test")
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                self.assertIsNone(tenant_router.resolve("probe.test"))
+
+        self.assertEqual(metrics.get("tenant.unknown_host_misses", "probe.test"), 4)
+        self.assertEqual(metrics.get("tenant.unknown_host_short_circuits"), 3)
+
+    def test_new_tenant_clears_negative_cache(self):
+        self.assertIsNone(tenant_router.resolve("late.test"))
+
+        late = Tenant.objects.create(name="Late", slug="late", domain="late.test", schema_name="late")
+
+        self.assertEqual(tenant_router.resolve("late.test"), late.id)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ALLOWED_HOSTS=["*"])
+class TenantContextCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from apps.accounts.models import User
+        from apps.property.models import Agency, AgencyContact, Commune, Wilaya
+
+        cls.factory = RequestFactory()
+        cls.tenant = Tenant.objects.create(
+            name="Snapshot",
+            slug="snapshot",
+            domain="snapshot.test",
+            schema_name="snapshot",
+        )
+        wilaya = Wilaya.objects.create(id="16", name="Alger")
+        commune = Commune.objects.create(id="1601", name="Alger Centre", wilaya=wilaya)
+        cls.agency = Agency.objects.create(
+            tenant=cls.tenant,
+            owner=User.objects.create_user(username="snapshot_owner", password="password"),
+            name="Snapshot Agency",
+            email="snapshot@example.com",
+            wilaya=wilaya,
+            commune=commune,
+            logo="agencies/logos/logo.png",
+        )
+        AgencyContact.objects.create(agency=cls.agency, type=AgencyContact.PHONE, number="0550000000", is_primary=True)
+
+    def setUp(self):
+        cache.clear()
+        tenant_router.invalidate()
+        tenant_contexts.invalidate()
+
+    def resolve(self):
+        request = self.factory.get("/", HTTP_HOST="snapshot.test")
+        self.assertIsNone(TenantMiddleware(lambda r: None).process_request(request))
+        return request
+
+    def test_warm_request_runs_no_sql(self):
+        self.resolve()
+
+        with self.assertNumQueries(0):
+            request = self.resolve()
+            agency = request.agency
+            self.assertEqual(agency.name, "Snapshot Agency")
+            self.assertEqual(agency.wilaya.name, "Alger")
+            self.assertEqual(agency.commune.name, "Alger Centre")
+            self.assertEqual([c.number for c in agency.contacts.all()], ["0550000000"])
+            self.assertEqual(agency.logo.public_id, "agencies/logos/logo")
+
+    def test_requests_get_independent_copies(self):
+        first = self.resolve()
+        first.agency.name = "Mutated"
+
+        self.assertEqual(self.resolve().agency.name, "Snapshot Agency")
+
+    def test_agency_and_contact_saves_invalidate_snapshot(self):
+        from apps.property.models import AgencyContact
+
+        self.resolve()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agency.name = "Renamed Agency"
+            self.agency.save()
+            AgencyContact.objects.create(agency=self.agency, type=AgencyContact.WHATSAPP, number="0660000000")
+
+        agency = self.resolve().agency
+
+        self.assertEqual(agency.name, "Renamed Agency")
+        self.assertEqual(len(agency.contacts.all()), 2)
+
+    def test_location_renames_invalidate_snapshot(self):
+        self.resolve()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agency.commune.name = "Sidi M'Hamed"
+            self.agency.commune.save()
+
+        self.assertEqual(self.resolve().agency.commune.name, "Sidi M'Hamed")
+
+    def test_location_loader_invalidates_snapshot(self):
+        self.resolve()
+        with tempfile.TemporaryDirectory() as directory:
+            with open(f"{directory}/wilayas.json", "w") as f:
+                f.write('[{"id": 16, "name": "Algiers"}]')
+            with open(f"{directory}/communes.json", "w") as f:
+                f.write("[]")
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command(
+                    "load_wilayas_and_communes",
+                    "--wilaya_file", f"{directory}/wilayas.json",
+                    "--commune_file", f"{directory}/communes.json",
+                    stdout=StringIO(),
+                )
+
+        self.assertEqual(self.resolve().agency.wilaya.name, "Algiers")
+
+
+class FlakyLocMemCache(LocMemCache):
+    down = False
+    calls = 0
+
+    def get(self, *args, **kwargs):
+        self.calls += 1
+        if self.down:
+            raise ConnectionInterrupted(connection=None)
+        return super().get(*args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        self.calls += 1
+        if self.down:
+            raise ConnectionInterrupted(connection=None)
+        return super().incr(*args, **kwargs)
+
+
+class BreakerLocMemCache(CircuitBreakerCacheMixin, FlakyLocMemCache):
+    pass
+
+
+class CircuitBreakerCacheTests(SimpleTestCase):
+    def make_cache(self):
+        return BreakerLocMemCache("breaker-tests", {
+            "CIRCUIT_BREAKER": {"NAME": "test", "FAILURE_THRESHOLD": 2, "RESET_TIMEOUT": 30},
+        })
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        backend = self.make_cache()
+        backend.set("key", "value")
+        backend.down = True
+
+        self.assertEqual(backend.get("key", "fallback"), "fallback")
+        self.assertEqual(backend.get("key", "fallback"), "fallback")
+        self.assertEqual(backend.breaker.state, CircuitBreaker.OPEN)
+
+        calls = backend.calls
+        self.assertIsNone(backend.get("key"))
+        self.assertEqual(backend.calls, calls)
+        with self.assertRaises(CacheUnavailable):
+            backend.incr("counter")
+
+    def test_half_open_probe_closes_circuit(self):
+        backend = self.make_cache()
+        backend.set("key", "value")
+        backend.down = True
+        backend.get("key")
+        backend.get("key")
+
+        backend.down = False
+        with patch("apps.core.cache.time.monotonic", return_value=time.monotonic() + 31):
+            self.assertEqual(backend.get("key"), "value")
+
+        self.assertEqual(backend.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failed_probe_reopens_circuit(self):
+        backend = self.make_cache()
+        backend.down = True
+        backend.get("key")
+        backend.get("key")
+
+        with patch("apps.core.cache.time.monotonic", return_value=time.monotonic() + 31):
+            backend.get("key")
+            self.assertEqual(backend.breaker.state, CircuitBreaker.OPEN)
+            calls = backend.calls
+            backend.get("key")
+            self.assertEqual(backend.calls, calls)
+
+    def test_probe_error_releases_half_open_circuit(self):
+        backend = self.make_cache()
+        backend.down = True
+        backend.get("key")
+        backend.get("key")
+        backend.down = False
+
+        with patch("apps.core.cache.time.monotonic", return_value=time.monotonic() + 31):
+            with self.assertRaises(ValueError):
+                backend.incr("missing")
+            self.assertEqual(backend.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_version_keeps_last_value_during_outage(self):
+        backend = self.make_cache()
+        version = CacheVersion("outage:version", check_interval=0)
+        with patch("apps.core.cache.cache", backend):
+            known = version.get()
+            backend.down = True
+            self.assertEqual([version.get() for _ in range(3)], [known] * 3)
+            self.assertEqual(backend.breaker.state, CircuitBreaker.OPEN)
+            self.assertEqual(version.get(force=True), known)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheVersionMapTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bounded_map_keeps_recently_used_versions(self):
+        versions = CacheVersionMap("bounded:{}:version", maxsize=2, timeout=60)
+        first = versions["a"]
+        versions["b"]
+        self.assertIs(versions["a"], first)
+        versions["c"]
+
+        self.assertEqual(len(versions), 2)
+        self.assertIs(versions["a"], first)
+        self.assertIsNot(versions["a"], versions["b"])
+
+    def test_version_keys_expire(self):
+        versions = CacheVersionMap("expiring:{}:version", timeout=60)
+        with patch.object(cache, "add", wraps=cache.add) as add:
+            versions["a"].get()
+        add.assert_called_once_with("expiring:a:version", versions["a"].get(), 60)
+
+    def test_clear_rereads_versions_from_the_cache(self):
+        versions = CacheVersionMap("cleared:{}:version")
+        first = versions["a"]
+        first.bump()
+        versions.clear()
+
+        self.assertEqual(len(versions), 0)
+        self.assertIsNot(versions["a"], first)
+        self.assertEqual(versions["a"].get(), first.get())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GetOrSetCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_fresh_value_is_not_recomputed(self):
+        self.assertEqual(get_or_set_cache("hot", self.compute, timeout=60, beta=0), 1)
+        self.assertEqual(get_or_set_cache("hot", self.compute, timeout=60, beta=0), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_served_while_another_worker_refreshes(self):
+        store_cached_value("hot", "stale", timeout=-1, stale_timeout=60)
+        cache.add("hot:lock", 1, 30)
+
+        self.assertEqual(get_or_set_cache("hot", self.compute, timeout=60), "stale")
+        self.assertEqual(self.calls, 0)
+
+    def test_waiter_rereads_value_when_lock_clears(self):
+        def holder_just_finished(lock_key, lock_timeout):
+            store_cached_value("cold", "computed", timeout=60, stale_timeout=60)
+            return False
+
+        with patch("apps.core.utils._acquire_lock", side_effect=holder_just_finished):
+            self.assertEqual(get_or_set_cache("cold", self.compute, timeout=60), "computed")
+        self.assertEqual(self.calls, 0)
+
+    def test_stale_value_refreshed_by_lock_holder(self):
+        store_cached_value("hot", "stale", timeout=-1, stale_timeout=60)
+
+        self.assertEqual(get_or_set_cache("hot", self.compute, timeout=60), 1)
+        self.assertIsNone(cache.get("hot:lock"))
+
+    def test_stale_value_refreshed_in_background(self):
+        store_cached_value("hot", "stale", timeout=-1, stale_timeout=60)
+
+        with patch("apps.core.tasks.refresh_cache_task.delay") as delay:
+            value = get_or_set_cache(
+                "hot", self.compute, timeout=60,
+                background_refresh=("apps.core.utils.generate_random_string", (4,)),
+            )
+
+        self.assertEqual(value, "stale")
+        self.assertEqual(self.calls, 0)
+        delay.assert_called_once_with("hot", "apps.core.utils.generate_random_string", [4], 60, 60, "hot:lock")
+
+
+class FlakyEmailBackend(LocMemEmailBackend):
+    opened = 0
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if any(message.to == ["bounce@example.com"] for message in messages):
+            raise OSError("550 mailbox unavailable")
+        return super().send_messages(messages)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    EMAIL_BACKEND="apps.core.tests.FlakyEmailBackend",
+    EMAIL_BATCH_WINDOW=30,
+    EMAIL_RATE_LIMIT=2,
+)
+class OutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        FlakyEmailBackend.opened = 0
+
+    def test_queue_schedules_one_flush_per_window(self):
+        with patch("apps.core.tasks.flush_outbox.apply_async") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                mail.queue_email("Hello", "Body", ["a@example.com", "b@example.com", "a@example.com"])
+            with self.captureOnCommitCallbacks(execute=True):
+                mail.queue_email("Again", "Body", ["c@example.com"])
+
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+        schedule.assert_called_once_with(countdown=30)
+
+    def test_flush_sends_batch_over_one_connection(self):
+        for recipient in ("a@example.com", "b@example.com", "bounce@example.com"):
+            mail.queue_email("Hello", "Body", [recipient])
+
+        self.assertEqual(mail.flush(), 2)
+
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+        self.assertEqual(sorted(message.to[0] for message in django_mail.outbox), ["a@example.com", "b@example.com"])
+        failed = OutboundEmail.objects.get(recipient="bounce@example.com")
+        self.assertEqual(failed.status, OutboundEmail.PENDING)
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn("550", failed.last_error)
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+        self.assertEqual(mail.flush(), 0)
+
+    def test_failures_give_up_after_max_attempts(self):
+        mail.queue_email("Hello", "Body", ["bounce@example.com"])
+        for _ in range(mail.MAX_ATTEMPTS):
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            mail.flush()
+
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, OutboundEmail.FAILED)
+        self.assertEqual(email.attempts, mail.MAX_ATTEMPTS)
+
+    def test_recipient_rate_limit_defers_extra_messages(self):
+        for n in range(3):
+            mail.queue_email(f"Message {n}", "Body", ["busy@example.com"])
+
+        self.assertEqual(mail.flush(), 2)
+
+        deferred = OutboundEmail.objects.get(status=OutboundEmail.PENDING)
+        self.assertEqual(deferred.subject, "Message 2")
+        self.assertEqual(deferred.attempts, 0)
+        self.assertGreater(deferred.next_attempt_at, timezone.now() + timedelta(minutes=4))
+
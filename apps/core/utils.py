@@ -3,8 +3,13 @@ Utility functions and mixins for the project.
 """
 from django.core.cache import cache
 from django.utils.text import slugify
+import logging
+import math
 import random
 import string
+import time
+
+logger = logging.getLogger(__name__)
 
 
 def generate_random_string(length=10):
@@ -25,25 +30,126 @@ def cache_key(prefix, *args, **kwargs):
     return ':'.join(parts)
 
 
-def get_or_set_cache(key, callable_func, timeout=300):
+class CachedValue:
+    """Cache envelope: the value plus its soft expiry and recompute cost."""
+    __slots__ = ('value', 'expires_at', 'delta')
+
+    def __init__(self, value, expires_at, delta):
+        self.value = value
+        self.expires_at = expires_at
+        self.delta = delta
+
+    def __getstate__(self):
+        return (self.value, self.expires_at, self.delta)
+
+    def __setstate__(self, state):
+        self.value, self.expires_at, self.delta = state
+
+
+def get_or_set_cache(key, callable_func, timeout=300, stale_timeout=None, beta=1.0,
+                     lock_timeout=30, lock_wait=2.0, background_refresh=None):
     """
-    Get value from cache or set it if not exists.
-    
+    Get value from cache or set it if not exists, without stampedes.
+
+    The value is fresh for ``timeout`` seconds and then served stale for up
+    to ``stale_timeout`` more seconds while a single worker, holding a
+    ``cache.add`` lock, recomputes it. Shortly before expiry each reader may
+    also volunteer to recompute early, with a probability that grows with the
+    recompute cost and the closeness of the deadline (XFetch), so hot keys
+    are usually refreshed before anyone sees them stale.
+
     Args:
         key: Cache key
         callable_func: Function to call if cache miss
-        timeout: Cache timeout in seconds
-    
+        timeout: Soft TTL in seconds
+        stale_timeout: Extra seconds a stale value may be served (defaults to timeout)
+        beta: Early recomputation eagerness, 0 disables it
+        lock_timeout: Seconds before an abandoned recompute lock expires
+        lock_wait: Seconds a cold-miss caller waits for the lock holder
+        background_refresh: Optional ``(dotted_path, args)`` naming an importable
+            function equivalent to callable_func; stale refreshes are then
+            queued on Celery and the stale value is returned immediately
+
     Usage:
         data = get_or_set_cache('my_key', lambda: expensive_operation(), timeout=600)
     """
-    result = cache.get(key)
-    if result is None:
-        result = callable_func()
-        cache.set(key, result, timeout)
+    if stale_timeout is None:
+        stale_timeout = timeout
+    lock_key = f'{key}:lock'
+
+    entry = cache.get(key)
+    if isinstance(entry, CachedValue):
+        remaining = entry.expires_at - time.time()
+        if remaining > 0 and not _should_recompute_early(entry, remaining, beta):
+            return entry.value
+        if not _acquire_lock(lock_key, lock_timeout):
+            return entry.value
+        if background_refresh and _queue_refresh(key, background_refresh, timeout, stale_timeout, lock_key):
+            return entry.value
+        try:
+            return _compute_and_store(key, callable_func, timeout, stale_timeout)
+        finally:
+            cache.delete(lock_key)
+
+    if _acquire_lock(lock_key, lock_timeout):
+        try:
+            return _compute_and_store(key, callable_func, timeout, stale_timeout)
+        finally:
+            cache.delete(lock_key)
+
+    # Someone else is computing this key: wait for their result rather than
+    # piling on, but never longer than lock_wait.
+    deadline = time.monotonic() + lock_wait
+    while time.monotonic() < deadline and cache.get(lock_key) is not None:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if isinstance(entry, CachedValue):
+            return entry.value
+    # The lock may have cleared between the last read and the loop check.
+    entry = cache.get(key)
+    if isinstance(entry, CachedValue):
+        return entry.value
+    return _compute_and_store(key, callable_func, timeout, stale_timeout)
+
+
+def store_cached_value(key, value, timeout, stale_timeout, delta=0.0):
+    """Store ``value`` in the get_or_set_cache envelope format."""
+    cache.set(key, CachedValue(value, time.time() + timeout, delta), timeout + stale_timeout)
+
+
+def _should_recompute_early(entry, remaining, beta):
+    if beta <= 0 or entry.delta <= 0:
+        return False
+    return entry.delta * beta * -math.log(1.0 - random.random()) >= remaining
+
+
+def _acquire_lock(lock_key, lock_timeout):
+    if cache.add(lock_key, 1, lock_timeout):
+        return True
+    # add() also fails when the cache is unreachable; only a visible lock
+    # means another worker is really computing.
+    return cache.get(lock_key) is None
+
+
+def _compute_and_store(key, callable_func, timeout, stale_timeout):
+    started = time.monotonic()
+    result = callable_func()
+    store_cached_value(key, result, timeout, stale_timeout, time.monotonic() - started)
     return result
 
 
+def _queue_refresh(key, background_refresh, timeout, stale_timeout, lock_key):
+    from apps.core.tasks import refresh_cache_task
+
+    func_path, args = background_refresh
+    try:
+        refresh_cache_task.delay(key, func_path, list(args), timeout, stale_timeout, lock_key)
+        return True
+    except Exception as e:
+        logger.warning(f"Could not queue cache refresh for {key}: {str(e)}")
+        return False
+
+
 class TimestampMixin:
     """Mixin to add created_at and updated_at timestamps."""
     from django.db import models
@@ -1,17 +1,23 @@
 from django import forms
 from django.contrib import admin
-from django.core.exceptions import PermissionDenied
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
 from django.db.models import Q
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
+from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from adminsortable2.admin import SortableAdminMixin, SortableInlineAdminMixin,SortableAdminBase
+from config.pagination import EstimatedCountPaginator
+from . import imports
+from .gazetteer import get_gazetteer
+from .search import search_properties
+from .signals import refresh_agency_listings
 from .models import (
-    Agency, AgencyContact, PropertyType, Property, PropertyMedia,
+    Agency, AgencyContact, Lead, PropertyType, Property, PropertyImport, PropertyMedia,
     Amenity, PropertyAmenity, Wilaya, Commune
 )
-from django.contrib.admin import AdminSite
-from django.urls import path
-from django.shortcuts import render
 from .models import Property, Agency
 
 
@@ -52,36 +58,90 @@ def user_has_any_agency_access(user):
     return getattr(user, "is_superuser", False) or get_user_agency_queryset(user).exists()
 
 
-class PropertyAdminForm(forms.ModelForm):
-    class Meta:
-        model = Property
-        fields = '__all__'
+class AutocompleteListFilter(admin.FieldListFilter):
+    """
+    List filter for high-cardinality foreign keys. Renders the admin
+    autocomplete select (searching the related model's admin) instead of
+    one choice per related row, so the changelist never loads the full
+    choice list or counts per choice.
+    """
+
+    template = "admin/autocomplete_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = "%s__%s__exact" % (field_path, field.target_field.name)
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.title = getattr(field, "verbose_name", field_path)
+        self.choice_field = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(),
+            to_field_name=field.target_field.name,
+            required=False,
+            widget=AutocompleteSelect(field, model_admin.admin_site, attrs={"data-placeholder": self.title}),
+        )
+
+    def value(self):
+        values = self.used_parameters.get(self.lookup_kwarg) or []
+        return next((value for value in reversed(values) if value), None)
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value is None:
+            return queryset
+        try:
+            return queryset.filter(**{self.lookup_kwarg: value})
+        except (ValueError, ValidationError) as e:
+            raise IncorrectLookupParameters(e)
+
+    def choices(self, changelist):
+        yield {
+            "selected": self.value() is None,
+            "query_string": changelist.get_query_string(remove=[self.lookup_kwarg]),
+            "display": _("All"),
+        }
+
+    def rendered_widget(self):
+        return self.choice_field.widget.render(self.lookup_kwarg, self.value())
+
+
+class CommuneChoicesFormMixin:
+    """
+    Limit the commune field to the selected wilaya, with choices rendered
+    from the in-process gazetteer instead of a query per form.
+    """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        posted_wilaya = self.data.get('wilaya') if hasattr(self, 'data') else None
-        if posted_wilaya:
-            self.fields['commune'].queryset = Commune.objects.filter(wilaya_id=posted_wilaya)
-        elif self.instance and self.instance.pk and self.instance.wilaya_id:
-            self.fields['commune'].queryset = Commune.objects.filter(wilaya=self.instance.wilaya)
+        field = self.fields.get('commune')
+        if field is None:
+            return
+        wilaya_id = self.data.get('wilaya') if hasattr(self, 'data') else None
+        if not wilaya_id and self.instance and self.instance.pk:
+            wilaya_id = self.instance.wilaya_id
+        if wilaya_id:
+            field.queryset = Commune.objects.filter(wilaya_id=wilaya_id)
         else:
-            self.fields['commune'].queryset = Commune.objects.none()
+            field.queryset = Commune.objects.none()
+        communes = get_gazetteer().communes(wilaya_id) if wilaya_id else ()
+        # Validation still goes through the queryset; only rendering uses the gazetteer.
+        field.widget.choices = [("", field.empty_label)] + [(commune.id, commune.name) for commune in communes]
 
 
-class AgencyAdminForm(forms.ModelForm):
+class PropertyAdminForm(CommuneChoicesFormMixin, forms.ModelForm):
     class Meta:
-        model = Agency
+        model = Property
         fields = '__all__'
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        posted_wilaya = self.data.get('wilaya') if hasattr(self, 'data') else None
-        if posted_wilaya:
-            self.fields['commune'].queryset = Commune.objects.filter(wilaya_id=posted_wilaya)
-        elif self.instance and self.instance.pk and self.instance.wilaya_id:
-            self.fields['commune'].queryset = Commune.objects.filter(wilaya=self.instance.wilaya)
-        else:
-            self.fields['commune'].queryset = Commune.objects.none()
+
+class AgencyAdminForm(CommuneChoicesFormMixin, forms.ModelForm):
+    class Meta:
+        model = Agency
+        fields = '__all__'
 
 
 
@@ -366,11 +426,15 @@ class PropertyAdmin(admin.ModelAdmin):
         "status_badge", "price", "views_count", "leads_count",
         "is_featured", "is_published", "created_at"
     )
+    list_select_related = ("agency", "property_type")
     list_filter = (
-        "status", "listing_type", "property_type", "wilaya",
-        "is_featured", "is_published", "agency__tenant"
+        "status", "listing_type", "property_type", ("wilaya", AutocompleteListFilter),
+        "is_featured", "is_published", ("agency__tenant", AutocompleteListFilter)
     )
+    # Searched through apps.property.search; see get_search_results().
     search_fields = ("title", "reference", "agency__name", "address")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     form = PropertyAdminForm
     autocomplete_fields = ("agency", "property_type", "wilaya")
     readonly_fields = (
@@ -412,12 +476,26 @@ class PropertyAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return request.user.is_superuser
     
+    @property
+    def media(self):
+        wilaya = Property._meta.get_field("wilaya")
+        return super().media + AutocompleteSelect(wilaya, self.admin_site).media
+
     def get_queryset(self, request):
         qs = super().get_queryset(request).select_related("agency", "property_type")
         
         if request.user.is_superuser:
             return qs
         return qs.filter(agency__in=get_user_agency_queryset(request.user))
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Match the indexed search document (title, reference, address,
+        agency and location names) instead of icontains over every row.
+        """
+        if not search_term.strip():
+            return queryset, False
+        return search_properties(queryset, search_term), False
     
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         """
@@ -463,34 +541,165 @@ class PropertyAdmin(admin.ModelAdmin):
         )
     status_badge.short_description = "Status"
 
+    def bulk_update_properties(self, queryset, **changes):
+        """queryset.update() skips signals, so refresh the derived indexes here."""
+        agency_ids = set(queryset.values_list("agency_id", flat=True))
+        updated = queryset.update(**changes)
+        refresh_agency_listings(agency_ids)
+        return updated
+
     @admin.action(description="✅ Publish selected properties")
     def publish_properties(self, request, queryset):
-        updated = queryset.update(status=Property.ACTIVE, is_published=True)
+        updated = self.bulk_update_properties(queryset, status=Property.ACTIVE, is_published=True)
         self.message_user(request, f"{updated} properties published successfully.")
 
     @admin.action(description="📦 Archive selected properties")
     def archive_properties(self, request, queryset):
-        updated = queryset.update(status=Property.ARCHIVED, is_published=False)
+        updated = self.bulk_update_properties(queryset, status=Property.ARCHIVED, is_published=False)
         self.message_user(request, f"{updated} properties archived successfully.")
 
     @admin.action(description="💰 Mark selected properties as Sold")
     def mark_as_sold(self, request, queryset):
-        updated = queryset.update(status=Property.SOLD, is_published=False)
+        updated = self.bulk_update_properties(queryset, status=Property.SOLD, is_published=False)
         self.message_user(request, f"{updated} properties marked as sold.")
 
     @admin.action(description="🏠 Mark selected properties as Rented")
     def mark_as_rented(self, request, queryset):
-        updated = queryset.update(status=Property.RENTED, is_published=False)
+        updated = self.bulk_update_properties(queryset, status=Property.RENTED, is_published=False)
         self.message_user(request, f"{updated} properties marked as rented.")
     
     @admin.action(description="⭐ Feature selected properties")
     def feature_properties(self, request, queryset):
-        updated = queryset.update(is_featured=True)
+        updated = self.bulk_update_properties(queryset, is_featured=True)
         self.message_user(request, f"{updated} properties marked as featured.")
 
     change_form_template = "admin/property_change_form.html"
 
 
+@admin.register(Lead)
+class LeadAdmin(admin.ModelAdmin):
+    list_display = ("name", "email", "phone", "property", "agency", "created_at", "notified_at")
+    list_select_related = ("property", "agency")
+    list_filter = (("notified_at", admin.EmptyFieldListFilter),)
+    search_fields = ("name", "email", "phone", "property__reference")
+    readonly_fields = ("property", "agency", "name", "email", "phone", "message", "created_at", "notified_at")
+    exclude = ("fingerprint",)
+
+    def has_module_permission(self, request):
+        return user_has_any_agency_access(request.user)
+
+    def has_view_permission(self, request, obj=None):
+        if obj is None:
+            return user_has_any_agency_access(request.user)
+        return user_has_agency_access(request.user, obj.agency)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(agency__in=get_user_agency_queryset(request.user))
+
+
+@admin.register(PropertyImport)
+class PropertyImportAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "agency", "status", "rows_imported", "rows_failed", "created_by", "created_at")
+    list_select_related = ("agency", "created_by")
+    list_filter = ("status",)
+    readonly_fields = (
+        "status", "position", "rows_imported", "rows_failed", "message",
+        "error_report", "created_by", "created_at", "finished_at",
+    )
+    actions = ["resume_imports"]
+
+    def get_fields(self, request, obj=None):
+        if obj is None:
+            return ("agency", "source")
+        return ("agency", "source") + self.readonly_fields
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return ()
+        return ("agency", "source") + self.readonly_fields
+
+    def has_module_permission(self, request):
+        return user_has_any_agency_access(request.user)
+
+    def has_view_permission(self, request, obj=None):
+        if obj is None:
+            return user_has_any_agency_access(request.user)
+        return user_has_agency_access(request.user, obj.agency)
+
+    def has_change_permission(self, request, obj=None):
+        if obj is None:
+            return user_has_any_agency_access(request.user)
+        return user_has_agency_access(request.user, obj.agency)
+
+    def has_add_permission(self, request):
+        return user_has_any_agency_access(request.user)
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(agency__in=get_user_agency_queryset(request.user))
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "agency" and not request.user.is_superuser:
+            kwargs["queryset"] = get_user_agency_queryset(request.user)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def save_model(self, request, obj, form, change):
+        """Record the uploader and queue the import once the job row is committed."""
+        if not user_has_agency_access(request.user, obj.agency):
+            raise PermissionDenied("You cannot import properties for another agency.")
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+        if not change:
+            self.queue_imports([obj.pk])
+
+    def queue_imports(self, job_ids):
+        from .tasks import run_property_import
+
+        def queue():
+            for job_id in job_ids:
+                run_property_import.delay(job_id)
+        transaction.on_commit(queue)
+
+    @admin.action(description="▶️ Resume selected imports")
+    def resume_imports(self, request, queryset):
+        job_ids = list(queryset.filter(imports.claimable()).values_list("pk", flat=True))
+        self.queue_imports(job_ids)
+        self.message_user(request, f"{len(job_ids)} imports queued.")
+
+    @admin.display(description="Rejected rows")
+    def error_report(self, obj):
+        if not obj.errors:
+            return "-"
+        return format_html_join(
+            "",
+            "<div><strong>Row {}</strong>: {}</div>",
+            (
+                (error["row"], "; ".join(
+                    f"{field}: {' '.join(messages)}" for field, messages in error["errors"].items()
+                ))
+                for error in obj.errors
+            ),
+        )
+
+
 
 @admin.register(Amenity)
 class AmenityAdmin(admin.ModelAdmin):
@@ -512,59 +721,3 @@ class AmenityAdmin(admin.ModelAdmin):
         if request.user.is_superuser:
             return super().get_model_perms(request)
         return {}
-
-
-
-class DashboardAdminSite(AdminSite):
-    site_header = "Real Estate Admin"
-    site_title = "RE Admin Dashboard"
-    index_title = "Dashboard"
-    index_template = "admin/custom_index.html"
-
-    def get_urls(self):
-        urls = super().get_urls()
-        return urls
-
-    def each_context(self, request):
-        context = super().each_context(request)
-        property_qs = get_user_property_queryset(request.user)
-        agency_qs = get_user_agency_queryset(request.user)
-        context['dashboard_cards'] = [
-            {
-                "title": "Total Properties",
-                "value": property_qs.count(),
-                "icon": "fas fa-building",
-                "color": "bg-primary",
-                "url": "/admin/property/property/",
-            },
-            {
-                "title": "Active Properties",
-                "value": property_qs.filter(status="active").count(),
-                "icon": "fas fa-check-circle",
-                "color": "bg-success",
-                "url": "/admin/property/property/?status=active",
-            },
-            {
-                "title": "Sold Properties",
-                "value": property_qs.filter(status="sold").count(),
-                "icon": "fas fa-dollar-sign",
-                "color": "bg-danger",
-                "url": "/admin/property/property/?status=sold",
-            },
-            {
-                "title": "Rented Properties",
-                "value": property_qs.filter(status="rented").count(),
-                "icon": "fas fa-key",
-                "color": "bg-info",
-                "url": "/admin/property/property/?status=rented",
-            },
-            {
-                "title": "Total Agencies",
-                "value": agency_qs.count(),
-                "icon": "fas fa-users",
-                "color": "bg-warning",
-                "url": "/admin/property/agency/",
-            },
-        ]
-        context['latest_properties'] = property_qs.order_by("-created_at")[:5]
-        return context
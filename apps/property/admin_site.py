@@ -0,0 +1,37 @@
+"""
+The project's admin site, with the agency dashboard on its index.
+
+Kept out of admin.py so ``DashboardAdminConfig`` can name it as the
+default site: admin.py registers on ``admin.site``, which would otherwise
+import the class it is still defining.
+"""
+from django.contrib.admin import AdminSite
+from django.contrib.admin.apps import AdminConfig
+
+
+class DashboardAdminSite(AdminSite):
+    site_header = "Real Estate Admin"
+    site_title = "RE Admin Dashboard"
+    index_title = "Dashboard"
+    index_template = "admin/custom_index.html"
+
+    def index(self, request, extra_context=None):
+        """The cards and tables are index-only; each_context runs on every admin page."""
+        from . import analytics, dashboard
+        from .admin import get_user_agency_queryset, get_user_property_queryset
+
+        agency_ids = None
+        if not request.user.is_superuser:
+            agency_ids = list(get_user_agency_queryset(request.user).values_list("id", flat=True))
+        extra_context = {
+            "dashboard_cards": dashboard.dashboard_cards(dashboard.get_dashboard_stats(agency_ids)),
+            "latest_properties": get_user_property_queryset(request.user).order_by("-created_at")[:5],
+            "activity_series": analytics.activity_series(agency_ids=agency_ids, days=7),
+            "top_properties": analytics.top_properties(agency_ids=agency_ids, days=7),
+            **(extra_context or {}),
+        }
+        return super().index(request, extra_context)
+
+
+class DashboardAdminConfig(AdminConfig):
+    default_site = "apps.property.admin_site.DashboardAdminSite"
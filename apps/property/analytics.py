@@ -0,0 +1,224 @@
+"""
+Time-bucketed views and leads per property and per agency.
+
+Events are never stored one by one: the view counter flush and the lead
+path add to the current hourly bucket (one row per property and per agency
+per hour). ``rollup()`` sums hourly rows into daily rows and deletes hourly
+rows older than ``HOURLY_RETENTION_DAYS``, so the tables grow with
+properties x days, not with traffic.
+
+``activity_series()`` and ``top_properties()`` answer dashboard questions
+("views over the last 7 days") from those rows alone.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HOURLY_RETENTION_DAYS = 14
+
+
+def hour_start(at):
+    return at.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(at):
+    return hour_start(at).replace(hour=0)
+
+
+def record_views(counts, at=None):
+    """Add ``{property_id: views}`` to the hourly buckets holding ``at``."""
+    _record(counts, 'views', at)
+
+
+def record_lead(property_obj, at=None):
+    """Count one lead for ``property_obj`` in the current hourly bucket."""
+    _record({property_obj.pk: 1}, 'leads', at, agencies={property_obj.pk: property_obj.agency_id})
+
+
+def _record(counts, field, at=None, agencies=None):
+    from apps.property.models import AgencyActivity, Property, PropertyActivity
+
+    counts = {property_id: n for property_id, n in counts.items() if n}
+    if not counts:
+        return
+    bucket = hour_start(at or timezone.now())
+    if agencies is None:
+        agencies = dict(Property.objects.filter(pk__in=counts).values_list('pk', 'agency_id'))
+
+    agency_counts = defaultdict(int)
+    for property_id, n in counts.items():
+        if property_id in agencies:
+            agency_counts[agencies[property_id]] += n
+    property_counts = {property_id: n for property_id, n in counts.items() if property_id in agencies}
+
+    with transaction.atomic():
+        _increment(PropertyActivity, 'property_id', property_counts, field, bucket)
+        _increment(AgencyActivity, 'agency_id', agency_counts, field, bucket)
+
+
+def _increment(model, key_field, counts, field, bucket):
+    """
+    Make sure a row exists for every key (concurrent writers may race to
+    create it, hence ignore_conflicts), then add each count atomically with
+    one UPDATE per distinct increment.
+    """
+    if not counts:
+        return
+    model.objects.bulk_create(
+        [model(**{key_field: key}, granularity=model.HOUR, bucket=bucket) for key in counts],
+        ignore_conflicts=True,
+    )
+    by_increment = defaultdict(list)
+    for key, n in counts.items():
+        by_increment[n].append(key)
+    for n, keys in by_increment.items():
+        model.objects.filter(
+            **{f'{key_field}__in': keys}, granularity=model.HOUR, bucket=bucket
+        ).update(**{field: F(field) + n})
+
+
+def rollup(now=None):
+    """
+    Recompute the daily rows for yesterday and today from the hourly rows,
+    build any older day that still has hourly rows but no daily rows (beat
+    was down), then drop hourly rows past retention. Idempotent; run hourly.
+    """
+    from apps.property.models import AgencyActivity, PropertyActivity
+
+    now = now or timezone.now()
+    since = day_start(now) - timedelta(days=1)
+    expired = day_start(now) - timedelta(days=HOURLY_RETENTION_DAYS)
+
+    with transaction.atomic():
+        for model, key_field in ((PropertyActivity, 'property_id'), (AgencyActivity, 'agency_id')):
+            window = Q(bucket__gte=since)
+            for day in _missed_days(model, since):
+                window |= Q(bucket__gte=day, bucket__lt=day + timedelta(days=1))
+            rows = (
+                model.objects
+                .filter(window, granularity=model.HOUR)
+                .annotate(day=TruncDay('bucket', tzinfo=dt_timezone.utc))
+                .values(key_field, 'day')
+                .annotate(total_views=Sum('views'), total_leads=Sum('leads'))
+                .order_by()
+            )
+            model.objects.bulk_create(
+                [
+                    model(
+                        **{key_field: row[key_field]},
+                        granularity=model.DAY,
+                        bucket=row['day'],
+                        views=row['total_views'],
+                        leads=row['total_leads'],
+                    )
+                    for row in rows
+                ],
+                update_conflicts=True,
+                unique_fields=[key_field.removesuffix('_id'), 'granularity', 'bucket'],
+                update_fields=['views', 'leads'],
+            )
+            deleted, _ = model.objects.filter(granularity=model.HOUR, bucket__lt=expired).delete()
+            if deleted:
+                logger.info(f"Compacted {deleted} hourly {model.__name__} rows")
+
+
+def _missed_days(model, before):
+    """Days before ``before`` with hourly rows but no daily row yet."""
+    hourly = set(
+        model.objects
+        .filter(granularity=model.HOUR, bucket__lt=before)
+        .annotate(day=TruncDay('bucket', tzinfo=dt_timezone.utc))
+        .order_by()
+        .values_list('day', flat=True)
+        .distinct()
+    )
+    if not hourly:
+        return []
+    rolled_up = set(
+        model.objects
+        .filter(granularity=model.DAY, bucket__in=hourly)
+        .order_by()
+        .values_list('bucket', flat=True)
+        .distinct()
+    )
+    return sorted(hourly - rolled_up)
+
+
+def _window(queryset, days, now):
+    """
+    Rows covering the last ``days`` days: daily rows for finished days,
+    hourly rows for yesterday and today, since rollup() may not have run
+    since their last hour.
+    """
+    from apps.property.models import ActivityBucket
+
+    today = day_start(now or timezone.now())
+    start = today - timedelta(days=days - 1)
+    hourly_since = max(start, today - timedelta(days=1))
+    return queryset.filter(
+        Q(granularity=ActivityBucket.DAY, bucket__gte=start, bucket__lt=hourly_since)
+        | Q(granularity=ActivityBucket.HOUR, bucket__gte=hourly_since)
+    ), start
+
+
+def activity_series(agency_ids=None, property_id=None, days=7, now=None):
+    """
+    Return ``[{'day': date, 'views': n, 'leads': n}, ...]`` for the last
+    ``days`` days (today included, missing days zero-filled), summed over
+    ``agency_ids`` (None for every agency) or for a single property.
+    """
+    from apps.property.models import AgencyActivity, PropertyActivity
+
+    if property_id is not None:
+        queryset = PropertyActivity.objects.filter(property_id=property_id)
+    else:
+        queryset = AgencyActivity.objects.all()
+        if agency_ids is not None:
+            queryset = queryset.filter(agency_id__in=agency_ids)
+
+    queryset, start = _window(queryset, days, now)
+    rows = (
+        queryset
+        .annotate(day=TruncDay('bucket', tzinfo=dt_timezone.utc))
+        .values('day')
+        .annotate(total_views=Sum('views'), total_leads=Sum('leads'))
+        .order_by()
+    )
+    totals = {row['day'].date(): row for row in rows}
+
+    series = []
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).date()
+        row = totals.get(day)
+        series.append({
+            'day': day,
+            'views': row['total_views'] if row else 0,
+            'leads': row['total_leads'] if row else 0,
+        })
+    return series
+
+
+def top_properties(agency_ids=None, days=7, limit=5, now=None):
+    """
+    Return the ``limit`` properties with the most views over the last
+    ``days`` days as ``[{'property_id', 'property__title', 'views', 'leads'}, ...]``.
+    """
+    from apps.property.models import PropertyActivity
+
+    queryset = PropertyActivity.objects.all()
+    if agency_ids is not None:
+        queryset = queryset.filter(property__agency_id__in=agency_ids)
+    queryset, _ = _window(queryset, days, now)
+    return list(
+        queryset
+        .values('property_id', 'property__title')
+        .annotate(views=Sum('views'), leads=Sum('leads'))
+        .order_by('-views', 'property_id')[:limit]
+    )
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PropertyConfig(AppConfig):
     name = 'apps.property'
+
+    def ready(self):
+        """Import signals when the app is ready"""
+        import apps.property.signals
@@ -0,0 +1,132 @@
+"""
+Pre-serialized, precompressed commune lists for the admin location picker.
+
+For every gazetteer snapshot each process serializes, once, the commune
+list of every wilaya and an all-wilayas bundle (``{wilaya_id: [...]}``),
+and compresses each with gzip and, when the optional ``brotli`` package is
+installed, brotli. Requests then pick the encoding from Accept-Encoding and
+send stored bytes; nothing is queried, serialized or compressed per request.
+
+Every payload has a strong ETag derived from its JSON, so revalidation is a
+304. The bundle is also served at a URL carrying its version
+(``commune_bundle_url()``); that response is cacheable for a year as
+immutable, and the admin forms load it once and fill the commune select
+locally on every wilaya change.
+"""
+import gzip
+import hashlib
+import json
+import threading
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from apps.property.gazetteer import get_gazetteer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+
+class Payload:
+    __slots__ = ('body', 'encoded', 'etag')
+
+    def __init__(self, data):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+        self.etag = hashlib.md5(self.body).hexdigest()
+        self.encoded = {'gzip': gzip.compress(self.body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(self.body)
+
+    def pick(self, accept_encoding):
+        """Return ``(encoding or None, bytes)`` for an Accept-Encoding header."""
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.encoded:
+                return encoding, self.encoded[encoding]
+        return None, self.body
+
+
+class CommunePayloads:
+    def __init__(self, gazetteer):
+        lists = {
+            wilaya.id: [{'id': commune.id, 'name': commune.name} for commune in gazetteer.communes(wilaya.id)]
+            for wilaya in gazetteer.wilayas
+        }
+        self.by_wilaya = {wilaya_id: Payload(communes) for wilaya_id, communes in lists.items()}
+        self.empty = Payload([])
+        self.bundle = Payload(lists)
+        self.version = self.bundle.etag[:12]
+
+    def for_wilaya(self, wilaya_id):
+        return self.by_wilaya.get(str(wilaya_id), self.empty)
+
+
+_lock = threading.Lock()
+_built = (None, None)
+
+
+def get_payloads():
+    """Payloads for the current gazetteer snapshot, built once per snapshot."""
+    global _built
+    gazetteer = get_gazetteer()
+    source, payloads = _built
+    if source is not gazetteer:
+        with _lock:
+            source, payloads = _built
+            if source is not gazetteer:
+                payloads = CommunePayloads(gazetteer)
+                _built = (gazetteer, payloads)
+    return payloads
+
+
+def commune_bundle_url():
+    return f"{reverse('get_communes_bundle')}?v={get_payloads().version}"
+
+
+def payload_response(request, payload, immutable=False):
+    encoding, content = payload.pick(request.headers.get('Accept-Encoding', ''))
+    if _matches(request.headers.get('If-None-Match', ''), payload.etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    # Each content-coding is a different representation, hence its own strong ETag.
+    response['ETag'] = f'"{payload.etag}-{encoding}"' if encoding else f'"{payload.etag}"'
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        name, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def _matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in parse_etags(if_none_match):
+        candidate = candidate.removeprefix('W/').strip('"')
+        if candidate.split('-')[0] == etag:
+            return True
+    return False
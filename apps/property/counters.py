@@ -0,0 +1,234 @@
+"""
+Buffered property view counting.
+
+Detail pages never write to the database. A qualifying view (not a bot or
+prefetch, not seen from the same visitor within ``DEDUP_TIMEOUT``) is added
+to a Redis hash with HINCRBY; the ``flush_view_counts`` Celery beat task
+moves the hash aside atomically and applies it with one
+``UPDATE ... SET views_count = views_count + n`` per distinct increment,
+adding the same counts to the hourly analytics buckets.
+
+When Redis is unreachable (or the cache isn't django-redis, as in
+development) increments go to an in-process buffer, which the Celery
+flusher (another process) never sees. The web process drains it itself:
+into Redis on the next view that reaches it, or straight into the database
+on a view at least ``BUFFER_WRITE_INTERVAL`` seconds after the last such
+write, so a worker restart loses at most that window.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from apps.core import metrics
+from apps.core.cache import BoundedTTLCache, CacheUnavailable, CircuitBreaker
+from apps.property import analytics
+
+logger = logging.getLogger(__name__)
+
+BOT_USER_AGENT_RE = re.compile(
+    r'bot|crawl|spider|slurp|archiver|facebookexternalhit|embedly|preview|'
+    r'headless|lighthouse|pingdom|monitor|curl|wget|python-requests|httpclient|scrapy',
+    re.IGNORECASE,
+)
+PREFETCH_HEADERS = ('HTTP_PURPOSE', 'HTTP_SEC_PURPOSE', 'HTTP_X_PURPOSE', 'HTTP_X_MOZ')
+
+
+def is_bot(request):
+    user_agent = request.META.get('HTTP_USER_AGENT', '')
+    return not user_agent or bool(BOT_USER_AGENT_RE.search(user_agent))
+
+
+def is_prefetch(request):
+    return any('prefetch' in request.META.get(header, '').lower() for header in PREFETCH_HEADERS)
+
+
+def visitor_id(request):
+    """
+    Identify the visitor without creating a session: the existing session
+    key when there is one, otherwise a hash of the client IP and user agent.
+    """
+    session = getattr(request, 'session', None)
+    session_key = getattr(session, 'session_key', None)
+    if session_key:
+        return f's:{session_key}'
+    raw = f"{request.META.get('REMOTE_ADDR', '')}|{request.META.get('HTTP_USER_AGENT', '')}"
+    return f'a:{hashlib.sha1(raw.encode()).hexdigest()[:16]}'
+
+
+class ViewCounter:
+    DEDUP_TIMEOUT = 30 * 60
+    PENDING_KEY = 'property_views:pending'
+    FLUSHING_KEY = 'property_views:flushing'
+    FLUSH_LOCK_KEY = 'property_views:flush_lock'
+    FLUSH_BATCH_SIZE = 500
+    BUFFER_WRITE_INTERVAL = 60
+
+    def __init__(self):
+        self._buffer = defaultdict(int)
+        self._buffer_written_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._seen = BoundedTTLCache(maxsize=10000, ttl=self.DEDUP_TIMEOUT)
+
+    def record(self, request, property_id):
+        """Count a detail page view. Returns True if it was counted."""
+        if is_bot(request) or is_prefetch(request):
+            metrics.incr('property.views_skipped', label='bot')
+            return False
+        if self._is_duplicate(request, property_id):
+            metrics.incr('property.views_skipped', label='duplicate')
+            return False
+
+        try:
+            self._redis_call(self._hincrby, {property_id: 1})
+        except CacheUnavailable:
+            with self._lock:
+                self._buffer[property_id] += 1
+            metrics.incr('property.views_buffered')
+            self._write_buffer()
+        else:
+            self._push_buffer()
+        return True
+
+    def flush(self):
+        """
+        Apply pending increments to Property.views_count. Returns the
+        ``{property_id: increment}`` mapping that was written.
+        """
+        buffered = self._drain_buffer()
+        counts = Counter(buffered)
+        pending = {}
+        locked = cache.add(self.FLUSH_LOCK_KEY, 1, 5 * 60)
+        try:
+            if locked:
+                try:
+                    pending = self._redis_call(self._take_pending)
+                except CacheUnavailable:
+                    pending = {}
+            counts.update(pending)
+            self._write(counts)
+        except Exception:
+            self._restore(buffered)
+            raise
+        finally:
+            if locked:
+                cache.delete(self.FLUSH_LOCK_KEY)
+
+        if pending:
+            try:
+                self._redis_call(self._clear_flushing)
+            except CacheUnavailable:
+                logger.warning("Could not clear flushed view counts; they may be applied twice")
+        return dict(counts)
+
+    def _is_duplicate(self, request, property_id):
+        key = f'property_view:{property_id}:{visitor_id(request)}'
+        if key in self._seen:
+            return True
+        self._seen.set(key, True)
+        added = cache.add(key, 1, self.DEDUP_TIMEOUT)
+        # add() also reports False while the circuit is open; fall back to
+        # the per-process check rather than dropping every view.
+        breaker = getattr(cache, 'breaker', None)
+        return not added and (breaker is None or breaker.state == CircuitBreaker.CLOSED)
+
+    def _write(self, counts):
+        if not counts:
+            return
+        by_increment = defaultdict(list)
+        for property_id, increment in counts.items():
+            by_increment[increment].append(property_id)
+
+        from apps.property.models import Property
+
+        with transaction.atomic():
+            for increment, property_ids in by_increment.items():
+                for start in range(0, len(property_ids), self.FLUSH_BATCH_SIZE):
+                    Property.objects.filter(
+                        pk__in=property_ids[start:start + self.FLUSH_BATCH_SIZE]
+                    ).update(views_count=F('views_count') + increment)
+            analytics.record_views(counts)
+        logger.info(f"Flushed {sum(counts.values())} views for {len(counts)} properties")
+
+    def _drain_buffer(self):
+        with self._lock:
+            buffered, self._buffer = self._buffer, defaultdict(int)
+        return buffered
+
+    def _restore(self, buffered):
+        with self._lock:
+            for property_id, increment in buffered.items():
+                self._buffer[property_id] += increment
+
+    def _write_buffer(self):
+        """Write the buffer to the database, at most every BUFFER_WRITE_INTERVAL seconds."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._buffer_written_at < self.BUFFER_WRITE_INTERVAL:
+                return
+            self._buffer_written_at = now
+        buffered = self._drain_buffer()
+        try:
+            self._write(buffered)
+        except Exception as e:
+            logger.warning(f"Could not write buffered view counts: {str(e)}")
+            self._restore(buffered)
+
+    def _push_buffer(self):
+        if not self._buffer:
+            return
+        buffered = self._drain_buffer()
+        try:
+            self._redis_call(self._hincrby, buffered)
+        except CacheUnavailable:
+            self._restore(buffered)
+
+    def _client(self):
+        get_client = getattr(getattr(cache, 'client', None), 'get_client', None)
+        if get_client is None:
+            raise CacheUnavailable('The default cache is not a Redis cache')
+        return get_client(write=True)
+
+    def _redis_call(self, func, *args):
+        breaker = getattr(cache, 'breaker', None)
+        if breaker is None:
+            return func(*args)
+        return breaker.call(func, *args, raise_unavailable=True)
+
+    def _hincrby(self, increments):
+        pipe = self._client().pipeline(transaction=False)
+        key = cache.make_key(self.PENDING_KEY)
+        for property_id, increment in increments.items():
+            pipe.hincrby(key, property_id, increment)
+        pipe.execute()
+
+    def _clear_flushing(self):
+        self._client().delete(cache.make_key(self.FLUSHING_KEY))
+
+    def _take_pending(self):
+        """
+        Move the pending hash to FLUSHING_KEY and return it. A FLUSHING_KEY
+        left behind by a failed flush is retried first.
+        """
+        client = self._client()
+        pending_key = cache.make_key(self.PENDING_KEY)
+        flushing_key = cache.make_key(self.FLUSHING_KEY)
+        if not client.exists(flushing_key):
+            if not client.exists(pending_key):
+                return {}
+            client.rename(pending_key, flushing_key)
+        return {int(k): int(v) for k, v in client.hgetall(flushing_key).items()}
+
+
+view_counter = ViewCounter()
+
+
+def record_view(request, property_id):
+    """Count a detail page view; also the page cache hit hook for detail pages."""
+    return view_counter.record(request, property_id)
@@ -0,0 +1,109 @@
+"""
+Admin dashboard cards.
+
+The counts come from one aggregate over the agencies in the user's scope
+(conditional ``Count(filter=...)`` per status) and are cached for
+``DASHBOARD_TIMEOUT`` seconds under a key carrying the version of every
+agency in scope, or of the ``all`` scope for superusers. Property status
+changes and agency creation or deletion bump those versions, so the cards
+are at most a minute stale even for writes that send no signal.
+"""
+import hashlib
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from apps.core.cache import CacheVersionMap
+from apps.core.utils import get_or_set_cache
+
+DASHBOARD_TIMEOUT = 60
+ALL_AGENCIES = 'all'
+
+scope_versions = CacheVersionMap('admin_dashboard:{}:version')
+
+
+def dashboard_key(agency_ids=None):
+    if agency_ids is None:
+        return f'admin_dashboard:{ALL_AGENCIES}:{scope_versions[ALL_AGENCIES].get()}'
+    scope = ','.join(f'{agency_id}.{scope_versions[agency_id].get()}' for agency_id in sorted(agency_ids))
+    return f'admin_dashboard:{hashlib.md5(scope.encode()).hexdigest()}'
+
+
+def get_dashboard_stats(agency_ids=None):
+    """
+    Return ``{'total', 'active', 'sold', 'rented', 'agencies'}`` for
+    ``agency_ids`` (None for every agency).
+    """
+    if agency_ids is not None:
+        agency_ids = list(agency_ids)
+    return get_or_set_cache(
+        dashboard_key(agency_ids),
+        lambda: build_dashboard_stats(agency_ids),
+        timeout=DASHBOARD_TIMEOUT,
+    )
+
+
+def build_dashboard_stats(agency_ids=None):
+    from apps.property.models import Agency, Property
+
+    agencies = Agency.objects.all()
+    if agency_ids is not None:
+        agencies = agencies.filter(pk__in=agency_ids)
+    return agencies.aggregate(
+        agencies=Count('pk', distinct=True),
+        total=Count('properties'),
+        active=Count('properties', filter=Q(properties__status=Property.ACTIVE)),
+        sold=Count('properties', filter=Q(properties__status=Property.SOLD)),
+        rented=Count('properties', filter=Q(properties__status=Property.RENTED)),
+    )
+
+
+def dashboard_cards(stats):
+    return [
+        {
+            "title": "Total Properties",
+            "value": stats['total'],
+            "icon": "fas fa-building",
+            "color": "bg-primary",
+            "url": "/admin/property/property/",
+        },
+        {
+            "title": "Active Properties",
+            "value": stats['active'],
+            "icon": "fas fa-check-circle",
+            "color": "bg-success",
+            "url": "/admin/property/property/?status=active",
+        },
+        {
+            "title": "Sold Properties",
+            "value": stats['sold'],
+            "icon": "fas fa-dollar-sign",
+            "color": "bg-danger",
+            "url": "/admin/property/property/?status=sold",
+        },
+        {
+            "title": "Rented Properties",
+            "value": stats['rented'],
+            "icon": "fas fa-key",
+            "color": "bg-info",
+            "url": "/admin/property/property/?status=rented",
+        },
+        {
+            "title": "Total Agencies",
+            "value": stats['agencies'],
+            "icon": "fas fa-users",
+            "color": "bg-warning",
+            "url": "/admin/property/agency/",
+        },
+    ]
+
+
+def invalidate(agency_ids):
+    """Retire the cached cards of ``agency_ids`` and of the ``all`` scope after commit."""
+    scopes = {*agency_ids, ALL_AGENCIES}
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    for scope in scopes:
+        scope_versions[scope].bump()
@@ -0,0 +1,162 @@
+"""
+Streaming property exports (CSV and NDJSON) for portals and BI.
+
+Rows are read with ``.values()`` over ``.iterator(chunk_size=...)`` (a
+server-side cursor on PostgreSQL), so no model or serializer instance is
+built and memory stays bounded by one chunk. For each chunk the image URLs
+and amenity names are fetched with one query each and joined in Python.
+
+The columns are those apps.property.imports reads (wilaya, commune and
+amenities by name, ``|``-separated lists in CSV), so an export can be fed
+back into an import.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from apps.property.imports import LIST_SEPARATOR
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# (column, values() lookup)
+COLUMNS = (
+    ('id', 'id'),
+    ('reference', 'reference'),
+    ('agency', 'agency__name'),
+    ('title', 'title'),
+    ('slug', 'slug'),
+    ('description', 'description'),
+    ('listing_type', 'listing_type'),
+    ('status', 'status'),
+    ('property_type', 'property_type__slug'),
+    ('price', 'price'),
+    ('negotiable', 'negotiable'),
+    ('available_from', 'available_from'),
+    ('wilaya', 'wilaya__name'),
+    ('commune', 'commune__name'),
+    ('address', 'address'),
+    ('latitude', 'latitude'),
+    ('longitude', 'longitude'),
+    ('area_m2', 'area_m2'),
+    ('bedrooms', 'bedrooms'),
+    ('bathrooms', 'bathrooms'),
+    ('floor', 'floor'),
+    ('furnished', 'furnished'),
+    ('parking', 'parking'),
+    ('is_published', 'is_published'),
+    ('is_featured', 'is_featured'),
+    ('views_count', 'views_count'),
+    ('leads_count', 'leads_count'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+)
+HEADER = [column for column, _ in COLUMNS] + ['cover_image', 'images', 'amenities']
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Yield one dict per property of ``queryset``, in primary key order."""
+    lookups = [lookup for _, lookup in COLUMNS]
+    rows = (
+        queryset
+        .prefetch_related(None)
+        .order_by('pk')
+        .values(*lookups, 'cover_image')
+        .iterator(chunk_size=chunk_size)
+    )
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        ids = [row['id'] for row in chunk]
+        images = _media_urls(ids)
+        amenities = _amenity_names(ids)
+        for row in chunk:
+            record = {column: row[lookup] for column, lookup in COLUMNS}
+            record['cover_image'] = _url(row['cover_image'])
+            record['images'] = images.get(row['id'], [])
+            record['amenities'] = amenities.get(row['id'], [])
+            yield record
+
+
+def _media_urls(property_ids):
+    from apps.property.models import PropertyMedia
+
+    urls = {}
+    media = (
+        PropertyMedia.objects
+        .filter(property_id__in=property_ids)
+        .order_by('property_id', 'order', 'id')
+        .values_list('property_id', 'image')
+    )
+    for property_id, image in media:
+        urls.setdefault(property_id, []).append(_url(image))
+    return urls
+
+
+def _amenity_names(property_ids):
+    from apps.property.models import PropertyAmenity
+
+    names = {}
+    amenities = (
+        PropertyAmenity.objects
+        .filter(property_id__in=property_ids)
+        .order_by('property_id', 'amenity__name')
+        .values_list('property_id', 'amenity__name')
+    )
+    for property_id, name in amenities:
+        names.setdefault(property_id, []).append(name)
+    return names
+
+
+def _url(image):
+    # values() still runs CloudinaryField.from_db_value, so this is a resource.
+    return image.url if image else None
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(HEADER)
+    for record in records:
+        yield writer.writerow([_csv_value(record[column]) for column in HEADER])
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return LIST_SEPARATOR.join(value)
+    if value is None:
+        return ''
+    return value
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def render(queryset, fmt, chunk_size=CHUNK_SIZE):
+    """Return an iterator of ``fmt`` lines (str) for ``queryset``."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format {fmt!r}; use one of {', '.join(FORMATS)}")
+    records = export_rows(queryset, chunk_size=chunk_size)
+    return csv_lines(records) if fmt == 'csv' else ndjson_lines(records)
+
+
+def streaming_response(queryset, fmt, filename):
+    response = StreamingHttpResponse(render(queryset, fmt), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
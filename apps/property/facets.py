@@ -0,0 +1,294 @@
+"""
+In-memory facet index for the shop-grid sidebar.
+
+Each agency's published properties get a slot number, and every facet value
+(listing type, property type, wilaya, commune, furnished, parking, bedroom
+count) keeps a Python int whose set bits are the slots holding that value.
+A filter combination is an AND of bitmaps, and the count for every sidebar
+option is one more AND plus ``int.bit_count()``, so results and all facet
+counts come out of a single pass without a COUNT query per option.
+
+Indexes are built per worker with one ``values_list`` query and patched in
+place by the Property signals. A per-agency CacheVersion tells the other
+workers to rebuild theirs.
+"""
+import logging
+import threading
+from dataclasses import dataclass, field
+
+from apps.core.cache import CacheVersionMap
+
+logger = logging.getLogger(__name__)
+
+FACET_FIELDS = ('listing_type', 'property_type', 'wilaya', 'commune', 'furnished', 'parking', 'bedrooms')
+
+# Facet name -> Property attribute holding its value.
+FACET_ATTRS = {
+    'listing_type': 'listing_type',
+    'property_type': 'property_type_id',
+    'wilaya': 'wilaya_id',
+    'commune': 'commune_id',
+    'furnished': 'furnished',
+    'parking': 'parking',
+    'bedrooms': 'bedrooms',
+}
+
+BEDROOM_BUCKETS = range(1, 6)
+
+
+def facet_key(name, value):
+    """Return the key ``value`` is indexed under for facet ``name``, or None."""
+    if value is None or value == '':
+        return None
+    if name in ('furnished', 'parking'):
+        if isinstance(value, str):
+            return value if value in ('true', 'false') else None
+        return 'true' if value else 'false'
+    if name == 'bedrooms':
+        return int(value)
+    return str(value)
+
+
+@dataclass
+class FacetResult:
+    ids: list
+    count: int
+    facets: dict = field(default_factory=dict)
+
+
+class FacetIndex:
+    """Bitmap index over one agency's published properties."""
+
+    def __init__(self, agency_id, rows=(), version=None):
+        self.agency_id = agency_id
+        self.version = version
+        self.bitmaps = {name: {} for name in FACET_FIELDS}
+        self.all_bits = 0
+        self._slots = []
+        self._positions = {}
+        self._values = {}
+        self._lock = threading.Lock()
+        for row in rows:
+            self._add(row[0], self._keys(dict(zip(FACET_FIELDS, row[1:]))))
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, property_id):
+        return property_id in self._positions
+
+    def upsert(self, property_id, values):
+        """Index ``values`` (facet name -> raw value) for ``property_id``."""
+        with self._lock:
+            self._remove(property_id)
+            self._add(property_id, self._keys(values))
+            # Removed properties leave empty slots behind; renumber once
+            # they outweigh the live ones so bitmaps stay narrow.
+            if len(self._slots) > 2 * len(self._positions) + 64:
+                self._compact()
+
+    def remove(self, property_id):
+        with self._lock:
+            self._remove(property_id)
+
+    def search(self, filters, restrict_ids=None):
+        """
+        Return the properties matching ``filters`` and, for every facet, the
+        number of matches per value when that facet's own filter is ignored
+        (so the sidebar shows what each option would return).
+
+        ``filters`` maps facet names to request values; ``bedrooms`` is a
+        minimum. ``restrict_ids`` narrows everything to properties matched
+        by filters the index does not cover (search text, price, area...).
+        """
+        with self._lock:
+            base = self.all_bits
+            if restrict_ids is not None:
+                base &= self._mask_for_ids(restrict_ids)
+
+            masks = {}
+            for name in FACET_FIELDS:
+                mask = self._filter_mask(name, filters.get(name))
+                if mask is not None:
+                    masks[name] = mask
+
+            matched = base
+            for mask in masks.values():
+                matched &= mask
+
+            facets = {}
+            for name in FACET_FIELDS:
+                others = base
+                for other, mask in masks.items():
+                    if other != name:
+                        others &= mask
+                facets[name] = self._facet_counts(name, others)
+
+            return FacetResult(ids=self._ids_for(matched), count=matched.bit_count(), facets=facets)
+
+    def _filter_mask(self, name, value):
+        if name == 'bedrooms':
+            try:
+                minimum = int(value)
+            except (TypeError, ValueError):
+                return None
+            return self._bedrooms_at_least(minimum)
+        key = facet_key(name, value)
+        if key is None:
+            return None
+        return self.bitmaps[name].get(key, 0)
+
+    def _bedrooms_at_least(self, minimum):
+        mask = 0
+        for bedrooms, bits in self.bitmaps['bedrooms'].items():
+            if bedrooms >= minimum:
+                mask |= bits
+        return mask
+
+    def _facet_counts(self, name, others):
+        if name == 'bedrooms':
+            return {n: (self._bedrooms_at_least(n) & others).bit_count() for n in BEDROOM_BUCKETS}
+        return {key: (bits & others).bit_count() for key, bits in self.bitmaps[name].items()}
+
+    def _mask_for_ids(self, property_ids):
+        mask = 0
+        for property_id in property_ids:
+            slot = self._positions.get(property_id)
+            if slot is not None:
+                mask |= 1 << slot
+        return mask
+
+    def _ids_for(self, bits):
+        ids = []
+        while bits:
+            low = bits & -bits
+            ids.append(self._slots[low.bit_length() - 1])
+            bits ^= low
+        return ids
+
+    @staticmethod
+    def _keys(values):
+        keys = {}
+        for name in FACET_FIELDS:
+            key = facet_key(name, values.get(name))
+            if key is not None:
+                keys[name] = key
+        return keys
+
+    def _add(self, property_id, keys):
+        slot = len(self._slots)
+        self._slots.append(property_id)
+        self._positions[property_id] = slot
+        bit = 1 << slot
+        for name, key in keys.items():
+            bitmap = self.bitmaps[name]
+            bitmap[key] = bitmap.get(key, 0) | bit
+        self._values[property_id] = keys
+        self.all_bits |= bit
+
+    def _compact(self):
+        entries = [(pid, self._values[pid]) for pid in self._slots if pid is not None]
+        self.bitmaps = {name: {} for name in FACET_FIELDS}
+        self.all_bits = 0
+        self._slots = []
+        self._positions = {}
+        self._values = {}
+        for property_id, keys in entries:
+            self._add(property_id, keys)
+
+    def _remove(self, property_id):
+        slot = self._positions.pop(property_id, None)
+        if slot is None:
+            return
+        bit = 1 << slot
+        self._slots[slot] = None
+        for name, key in self._values.pop(property_id).items():
+            bitmap = self.bitmaps[name]
+            bits = bitmap[key] & ~bit
+            if bits:
+                bitmap[key] = bits
+            else:
+                del bitmap[key]
+        self.all_bits &= ~bit
+
+
+class FacetIndexRegistry:
+    """
+    Per-worker FacetIndex for every agency, checked against a per-agency
+    CacheVersion on each lookup.
+
+    Writes in this worker patch the index in place and move it to the
+    version they bump; other workers see the new version and rebuild with a
+    single query.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._versions = CacheVersionMap('property_facets:{}:version')
+
+    def get(self, agency_id):
+        version = self._versions[agency_id].get()
+        index = self._indexes.get(agency_id)
+        if index is None or index.version != version:
+            index = self._build(agency_id, version)
+            self._indexes[agency_id] = index
+        return index
+
+    def apply(self, agency_id, property_id, values):
+        """
+        Record a committed Property write. ``values`` is None when the
+        property was deleted or is no longer published.
+        """
+        for other_id, index in list(self._indexes.items()):
+            if other_id != agency_id and property_id in index:
+                index.remove(property_id)
+                self._bump(other_id, index)
+
+        index = self._indexes.get(agency_id)
+        if index is not None:
+            if values is None:
+                index.remove(property_id)
+            else:
+                index.upsert(property_id, values)
+        self._bump(agency_id, index)
+
+    def invalidate(self, agency_ids):
+        """Force a rebuild after writes that skip signals (queryset.update)."""
+        for agency_id in set(agency_ids):
+            self._indexes.pop(agency_id, None)
+            self._versions[agency_id].bump()
+
+    def clear(self):
+        self._indexes.clear()
+
+    def _bump(self, agency_id, index):
+        version = self._versions[agency_id]
+        previous = version.get(force=True)
+        current = version.bump()
+        # Adopt the new version only if nobody else wrote in between;
+        # otherwise the local copy is missing their change and must rebuild.
+        if index is not None and index.version == previous and current == previous + 1:
+            index.version = current
+        else:
+            self._indexes.pop(agency_id, None)
+
+    def _build(self, agency_id, version):
+        from apps.property.models import Property
+
+        rows = (
+            Property.objects
+            .filter(agency_id=agency_id, is_published=True)
+            .order_by('id')
+            .values_list('id', *(FACET_ATTRS[name] for name in FACET_FIELDS))
+        )
+        index = FacetIndex(agency_id, rows, version=version)
+        logger.info(f"Facet index for agency {agency_id} built with {len(index)} properties")
+        return index
+
+
+def facet_values(property_obj):
+    """Return the raw facet values of ``property_obj`` keyed by facet name."""
+    return {name: getattr(property_obj, attr) for name, attr in FACET_ATTRS.items()}
+
+
+facet_indexes = FacetIndexRegistry()
@@ -0,0 +1,118 @@
+"""
+In-process registry of the Wilaya and Commune reference tables.
+
+The 58 wilayas and ~1500 communes change only when the gazetteer is
+reloaded, yet listing filters, admin forms and the commune dropdown
+endpoint read them on every request. The registry loads both tables with
+two queries per process into immutable ``__slots__`` records (id → record
+maps and a name-sorted commune tuple per wilaya) and rebuilds only when the
+shared ``gazetteer:version`` changes. Wilaya and Commune signals and the
+bulk loader bump it after commit.
+
+Records carry ``id``/``pk`` and ``name`` like the model instances they
+replace in templates and choice lists; code that needs a model instance
+(foreign key assignment, select_related) still queries the tables.
+"""
+import logging
+import threading
+
+from django.db import transaction
+
+from apps.core.cache import CacheVersion
+
+logger = logging.getLogger(__name__)
+
+
+class _Record:
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.id}: {self.name}>"
+
+
+class WilayaRecord(_Record):
+    __slots__ = ('id', 'name')
+
+
+class CommuneRecord(_Record):
+    __slots__ = ('id', 'name', 'wilaya_id')
+
+
+class Gazetteer:
+    """One immutable snapshot of the reference tables."""
+
+    __slots__ = ('wilayas', 'wilaya_by_id', 'commune_by_id', 'communes_by_wilaya')
+
+    def __init__(self, wilayas, communes):
+        self.wilayas = tuple(sorted(wilayas, key=lambda wilaya: wilaya.name))
+        self.wilaya_by_id = {wilaya.id: wilaya for wilaya in self.wilayas}
+        self.commune_by_id = {}
+        by_wilaya = {}
+        for commune in sorted(communes, key=lambda commune: commune.name):
+            self.commune_by_id[commune.id] = commune
+            by_wilaya.setdefault(commune.wilaya_id, []).append(commune)
+        self.communes_by_wilaya = {wilaya_id: tuple(items) for wilaya_id, items in by_wilaya.items()}
+
+    def wilaya(self, wilaya_id):
+        return self.wilaya_by_id.get(str(wilaya_id))
+
+    def commune(self, commune_id):
+        return self.commune_by_id.get(str(commune_id))
+
+    def communes(self, wilaya_id):
+        """Communes of ``wilaya_id`` sorted by name (empty for an unknown wilaya)."""
+        return self.communes_by_wilaya.get(str(wilaya_id), ())
+
+
+class GazetteerRegistry:
+    def __init__(self, version_key='gazetteer:version'):
+        self.version = CacheVersion(version_key)
+        self._gazetteer = None
+        self._loaded_version = None
+        self._lock = threading.Lock()
+
+    def get(self, force=False):
+        version = self.version.get(force=force)
+        if self._loaded_version != version:
+            with self._lock:
+                if self._loaded_version != version:
+                    self._gazetteer = self._build()
+                    self._loaded_version = version
+        return self._gazetteer
+
+    def invalidate(self):
+        """Drop the snapshot here now and in every other worker after commit."""
+        self._loaded_version = None
+        transaction.on_commit(self.version.bump)
+
+    def _build(self):
+        from apps.property.models import Commune, Wilaya
+
+        wilayas = [WilayaRecord(id=pk, name=name) for pk, name in Wilaya.objects.values_list('id', 'name')]
+        communes = [
+            CommuneRecord(id=pk, name=name, wilaya_id=wilaya_id)
+            for pk, name, wilaya_id in Commune.objects.values_list('id', 'name', 'wilaya_id')
+        ]
+        logger.info(f"Gazetteer loaded with {len(wilayas)} wilayas and {len(communes)} communes")
+        return Gazetteer(wilayas, communes)
+
+
+gazetteer = GazetteerRegistry()
+
+
+def get_gazetteer():
+    return gazetteer.get()
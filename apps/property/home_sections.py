@@ -0,0 +1,113 @@
+"""
+Precomputed landing page sections (featured listings, amenity counts,
+locations) per agency, read from the AgencyAmenityStat/AgencyWilayaStat
+tables kept by apps.property.stats.
+
+The sections are built once and cached under a key carrying the agency's
+home version and a global version, so a warm landing page reads one cache
+entry and runs no SQL. Property, PropertyMedia and PropertyAmenity writes
+bump the agency's version; Amenity and Wilaya writes bump the global one.
+With ``HOME_SECTIONS_PREWARM`` enabled, a Celery task rebuilds the entry
+right after each invalidation so visitors never pay for it.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.core import page_cache
+from apps.core.cache import CacheVersion, CacheVersionMap
+from apps.core.utils import get_or_set_cache, store_cached_value
+
+logger = logging.getLogger(__name__)
+
+HOME_SECTIONS_TIMEOUT = 60 * 60
+HOME_SECTIONS_STALE_TIMEOUT = 10 * 60
+
+agency_versions = CacheVersionMap('home_sections:{}:version')
+global_version = CacheVersion('home_sections:version')
+
+
+def home_sections_key(agency_id, force=False):
+    agency_version = agency_versions[agency_id].get(force=force)
+    return f'home_sections:{agency_id}:{agency_version}:{global_version.get(force=force)}'
+
+
+def get_home_sections(agency_id):
+    """Return ``{'amenities', 'featured', 'locations'}`` for the landing page."""
+    return get_or_set_cache(
+        home_sections_key(agency_id),
+        lambda: build_home_sections(agency_id),
+        timeout=HOME_SECTIONS_TIMEOUT,
+        stale_timeout=HOME_SECTIONS_STALE_TIMEOUT,
+        background_refresh=('apps.property.home_sections.build_home_sections', (agency_id,)),
+    )
+
+
+def prewarm(agency_id):
+    """Build and store the sections under the current shared versions."""
+    key = home_sections_key(agency_id, force=True)
+    store_cached_value(key, build_home_sections(agency_id), HOME_SECTIONS_TIMEOUT, HOME_SECTIONS_STALE_TIMEOUT)
+
+
+def build_home_sections(agency_id):
+    from apps.property.models import AgencyAmenityStat, AgencyWilayaStat, Property
+
+    amenities = []
+    amenity_stats = (
+        AgencyAmenityStat.objects
+        .filter(agency_id=agency_id, published_count__gt=0, amenity__icon__isnull=False)
+        .exclude(amenity__icon='')
+        .select_related('amenity')
+        .order_by('-published_count')[:10]
+    )
+    for stat in amenity_stats:
+        stat.amenity.total = stat.published_count
+        amenities.append(stat.amenity)
+
+    featured = (
+        Property.objects
+        .filter(agency_id=agency_id, is_published=True, is_featured=True)
+        .select_related('agency', 'property_type', 'wilaya', 'commune')
+        .order_by('-created_at')[:4]
+    )
+
+    locations = []
+    wilaya_stats = (
+        AgencyWilayaStat.objects
+        .filter(agency_id=agency_id, published_count__gt=0)
+        .select_related('wilaya')
+        .order_by('-published_count')[:8]
+    )
+    for stat in wilaya_stats:
+        stat.wilaya.property_count = stat.published_count
+        stat.wilaya.image = stat.cover_image
+        locations.append(stat.wilaya)
+
+    return {
+        'amenities': amenities,
+        'featured': list(featured),
+        'locations': locations,
+    }
+
+
+def invalidate_agency(agency_id):
+    """Retire the agency's cached sections and landing page once the transaction commits."""
+    transaction.on_commit(lambda: _bump(agency_versions[agency_id], agency_id))
+    page_cache.purge(f'home:{agency_id}')
+
+
+def invalidate_all():
+    transaction.on_commit(lambda: _bump(global_version))
+
+
+def _bump(version, agency_id=None):
+    version.bump()
+    if not getattr(settings, 'HOME_SECTIONS_PREWARM', False):
+        return
+    from apps.property.tasks import prewarm_home_sections
+
+    try:
+        prewarm_home_sections.delay(agency_id)
+    except Exception as e:
+        logger.warning(f"Could not queue home sections prewarm: {str(e)}")
@@ -0,0 +1,454 @@
+"""
+Bulk property import from partner feeds (CSV, JSON, NDJSON, XLSX).
+
+A PropertyImport job streams rows from its source file, validates them
+against in-memory lookup maps (wilayas, communes, property types and
+amenities by id, slug or normalized name) and inserts the valid ones with
+``bulk_create`` in batches of ``BATCH_SIZE``, references generated in bulk.
+Each batch commits together with the job's position and error report, so
+an interrupted job resumes after its last committed batch. Those saves also
+renew the job's lease: a running job left untouched for
+``PROPERTY_IMPORT_LEASE`` seconds lost its worker and can be claimed again.
+
+``bulk_create`` sends no signals: each batch is indexed for search here,
+and the agency's statistics, facets and cached pages are refreshed once
+when the run ends. Images are fetched into Cloudinary by the
+``ingest_property_media`` Celery task, one task per batch, which then
+refreshes the covers.
+
+Columns (header names are case-insensitive):
+    title, description, listing_type, price, wilaya, commune, area_m2
+    (required); property_type, status, negotiable, available_from,
+    address, latitude, longitude, bedrooms, bathrooms, floor, furnished,
+    parking, is_published, is_featured; images (URLs) and amenities
+    (names), separated by ``|``.
+"""
+import csv
+import io
+import json
+import logging
+import os
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from apps.property.search import build_search_document, get_search_backend, normalize_text
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+MAX_STORED_ERRORS = 1000
+LIST_SEPARATOR = '|'
+
+FORMATS = {
+    '.csv': 'csv',
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.xlsx': 'xlsx',
+}
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'oui', 'x'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n', 'non'}
+
+BOOLEAN_COLUMNS = ('negotiable', 'furnished', 'parking', 'is_published', 'is_featured')
+VALUE_COLUMNS = (
+    'title', 'description', 'listing_type', 'price', 'status', 'available_from',
+    'address', 'latitude', 'longitude', 'area_m2', 'bedrooms', 'bathrooms', 'floor',
+)
+# Related fields are resolved through Lookups, so clean_fields() must not query them.
+UNCHECKED_FIELDS = [
+    'agency', 'property_type', 'wilaya', 'commune',
+    'reference', 'slug', 'cover_image', 'search_document',
+]
+
+
+def source_format(name):
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported import format {extension!r}; use one of {', '.join(FORMATS)}")
+    return FORMATS[extension]
+
+
+def read_rows(fileobj, name):
+    """
+    Yield one dict per data row of the binary ``fileobj``, keys lowercased.
+    A row that can't be parsed is yielded as None.
+    """
+    fmt = source_format(name)
+    if fmt == 'xlsx':
+        yield from _read_xlsx(fileobj)
+        return
+
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for row in csv.DictReader(text):
+            yield _normalize_keys(row)
+    elif fmt == 'ndjson':
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield _normalize_keys(row) if isinstance(row, dict) else None
+    else:
+        data = json.load(text)
+        if isinstance(data, dict):
+            data = data.get('properties', [])
+        for row in data:
+            yield _normalize_keys(row) if isinstance(row, dict) else None
+
+
+def _read_xlsx(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('XLSX imports need openpyxl (pip install openpyxl)')
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell or '').strip().lower() for cell in next(rows, ())]
+        for values in rows:
+            if any(value not in (None, '') for value in values):
+                yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _normalize_keys(row):
+    return {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, tuple)):
+        return LIST_SEPARATOR.join(_text(item) for item in value)
+    return str(value).strip()
+
+
+def _split(value):
+    return [part.strip() for part in _text(value).split(LIST_SEPARATOR) if part.strip()]
+
+
+class Lookups:
+    """Reference data keyed by id, slug and normalized name, loaded once per run."""
+
+    def __init__(self):
+        from apps.property.models import Amenity, Commune, PropertyType, Wilaya
+
+        self.wilayas = {}
+        for wilaya in Wilaya.objects.all():
+            self.wilayas[str(wilaya.pk)] = wilaya
+            self.wilayas[normalize_text(wilaya.name)] = wilaya
+
+        self.communes = {}
+        for commune in Commune.objects.all():
+            self.communes[str(commune.pk)] = commune
+            self.communes[(commune.wilaya_id, normalize_text(commune.name))] = commune
+
+        self.property_types = {}
+        for property_type in PropertyType.objects.all():
+            self.property_types[property_type.slug] = property_type
+            self.property_types[normalize_text(property_type.name)] = property_type
+
+        self.amenities = {normalize_text(amenity.name): amenity for amenity in Amenity.objects.all()}
+
+    def wilaya(self, value):
+        return self.wilayas.get(value) or self.wilayas.get(normalize_text(value))
+
+    def commune(self, value, wilaya):
+        commune = self.communes.get(value)
+        if commune is not None:
+            return commune if commune.wilaya_id == wilaya.pk else None
+        return self.communes.get((wilaya.pk, normalize_text(value)))
+
+    def property_type(self, value):
+        return self.property_types.get(value) or self.property_types.get(normalize_text(value))
+
+    def amenity(self, value):
+        return self.amenities.get(normalize_text(value))
+
+
+def build_property(row, agency, lookups):
+    """
+    Return ``(property, image_urls, amenities)`` for a source row, or raise
+    ValidationError with per-field messages.
+    """
+    from apps.property.models import Property
+
+    if row is None:
+        raise ValidationError('Malformed row')
+
+    errors = {}
+    values = {column: _text(row.get(column)) for column in VALUE_COLUMNS}
+    values = {column: value for column, value in values.items() if value != ''}
+    values.setdefault('status', Property.DRAFT)
+
+    for column in BOOLEAN_COLUMNS:
+        raw = _text(row.get(column)).lower()
+        if raw in TRUE_VALUES:
+            values[column] = True
+        elif raw in FALSE_VALUES:
+            if raw or column != 'is_published':
+                values[column] = False
+        else:
+            errors[column] = [f'Expected yes/no, got {raw!r}']
+
+    wilaya = commune = property_type = None
+    wilaya_value = _text(row.get('wilaya'))
+    if wilaya_value:
+        wilaya = lookups.wilaya(wilaya_value)
+        if wilaya is None:
+            errors['wilaya'] = [f'Unknown wilaya {wilaya_value!r}']
+    else:
+        errors['wilaya'] = ['This field cannot be blank.']
+
+    commune_value = _text(row.get('commune'))
+    if not commune_value:
+        errors['commune'] = ['This field cannot be blank.']
+    elif wilaya is not None:
+        commune = lookups.commune(commune_value, wilaya)
+        if commune is None:
+            errors['commune'] = [f'Unknown commune {commune_value!r} in {wilaya.name}']
+
+    property_type_value = _text(row.get('property_type'))
+    if property_type_value:
+        property_type = lookups.property_type(property_type_value)
+        if property_type is None:
+            errors['property_type'] = [f'Unknown property type {property_type_value!r}']
+
+    amenities = []
+    for name in _split(row.get('amenities')):
+        amenity = lookups.amenity(name)
+        if amenity is None:
+            errors.setdefault('amenities', []).append(f'Unknown amenity {name!r}')
+        else:
+            amenities.append(amenity)
+
+    property_obj = Property(
+        agency=agency,
+        wilaya=wilaya,
+        commune=commune,
+        property_type=property_type,
+        **values,
+    )
+    property_obj.slug = slugify(property_obj.title)[:255]
+    try:
+        property_obj.clean_fields(exclude=UNCHECKED_FIELDS)
+    except ValidationError as e:
+        for field, messages in e.message_dict.items():
+            errors.setdefault(field, []).extend(messages)
+
+    if errors:
+        raise ValidationError(errors)
+    images = [url for url in _split(row.get('images')) if url.startswith(('http://', 'https://'))]
+    return property_obj, images, list({amenity.pk: amenity for amenity in amenities}.values())
+
+
+def assign_references(properties, agency_id):
+    """Give each property a reference unused in the database and in the batch."""
+    from apps.property.models import Property
+
+    pending = list(properties)
+    while pending:
+        for property_obj in pending:
+            property_obj.reference = Property.generate_reference(agency_id)
+        taken = set(
+            Property.objects
+            .filter(reference__in=[property_obj.reference for property_obj in pending])
+            .values_list('reference', flat=True)
+        )
+        seen = set()
+        retry = []
+        for property_obj in pending:
+            if property_obj.reference in taken or property_obj.reference in seen:
+                retry.append(property_obj)
+            seen.add(property_obj.reference)
+        pending = retry
+
+
+def run(job, batch_size=BATCH_SIZE):
+    """Import ``job`` from its current position. Returns the job."""
+    from apps.property.models import PropertyImport
+    from apps.property.signals import refresh_agency_listings
+
+    if not claim(job):
+        logger.warning(f"Property import {job.pk} is {job.status}, not running it again")
+        return job
+
+    imported = 0
+    try:
+        lookups = Lookups()
+        with job.source.open('rb') as fileobj:
+            rows = islice(enumerate(read_rows(fileobj, job.source.name), start=1), job.position, None)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                imported += import_batch(job, batch, lookups)
+    except Exception as e:
+        logger.exception(f"Property import {job.pk} failed at row {job.position + 1}")
+        job.status = PropertyImport.FAILED
+        job.message = f"Stopped after row {job.position}: {str(e)}"
+    else:
+        job.status = PropertyImport.DONE
+        job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'message', 'finished_at', 'updated_at'])
+
+    if imported:
+        refresh_agency_listings([job.agency_id])
+    logger.info(f"Property import {job.pk}: {job.rows_imported} imported, {job.rows_failed} rejected")
+    return job
+
+
+def claimable():
+    """Filter for jobs that may be started: pending, failed, or running past their lease."""
+    from apps.property.models import PropertyImport
+
+    expired = timezone.now() - timedelta(seconds=settings.PROPERTY_IMPORT_LEASE)
+    return Q(status__in=PropertyImport.RESUMABLE) | Q(status=PropertyImport.RUNNING, updated_at__lt=expired)
+
+
+def claim(job):
+    """
+    Move a claimable ``job`` to running, so two workers (or a resume racing
+    a worker) never import the same rows. Reloads ``job``; returns False
+    when it was not claimable.
+    """
+    from apps.property.models import PropertyImport
+
+    with transaction.atomic():
+        PropertyImport.objects.select_for_update().filter(pk=job.pk).first()
+        claimed = PropertyImport.objects.filter(claimable(), pk=job.pk).update(
+            status=PropertyImport.RUNNING, message='', updated_at=timezone.now()
+        )
+    job.refresh_from_db()
+    return bool(claimed)
+
+
+def import_batch(job, batch, lookups):
+    """Validate and insert ``[(row_number, row), ...]``. Returns the number inserted."""
+    from apps.property.models import Property, PropertyAmenity
+
+    agency = job.agency
+    properties = []
+    extras = []
+    errors = []
+    for row_number, row in batch:
+        try:
+            property_obj, images, amenities = build_property(row, agency, lookups)
+        except ValidationError as e:
+            errors.append({'row': row_number, 'errors': _error_dict(e)})
+            continue
+        properties.append(property_obj)
+        extras.append((images, amenities))
+
+    assign_references(properties, agency.pk)
+    for property_obj in properties:
+        property_obj.search_document = build_search_document(property_obj)
+
+    with transaction.atomic():
+        Property.objects.bulk_create(properties, batch_size=BATCH_SIZE)
+        PropertyAmenity.objects.bulk_create(
+            [
+                PropertyAmenity(property=property_obj, amenity=amenity)
+                for property_obj, (_, amenities) in zip(properties, extras)
+                for amenity in amenities
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        get_search_backend().index([property_obj.pk for property_obj in properties])
+
+        job.position = batch[-1][0]
+        job.rows_imported += len(properties)
+        job.rows_failed += len(errors)
+        job.errors = (job.errors + errors)[:MAX_STORED_ERRORS]
+        job.save(update_fields=['position', 'rows_imported', 'rows_failed', 'errors', 'updated_at'])
+
+        media = [
+            [property_obj.pk, list(enumerate(images))]
+            for property_obj, (images, _) in zip(properties, extras)
+            if images
+        ]
+        if media:
+            transaction.on_commit(lambda: queue_media(media))
+    return len(properties)
+
+
+def _error_dict(error):
+    if hasattr(error, 'error_dict'):
+        return {field: [str(message) for message in messages] for field, messages in error.message_dict.items()}
+    return {'__all__': [str(message) for message in error.messages]}
+
+
+def queue_media(items):
+    from apps.property.tasks import ingest_property_media
+
+    try:
+        ingest_property_media.delay(items)
+    except Exception as e:
+        logger.warning(f"Could not queue media for {len(items)} imported properties: {str(e)}")
+
+
+def ingest_media(items):
+    """
+    Upload ``[[property_id, [[order, url], ...]], ...]`` to Cloudinary and
+    attach the results, the first image of each property as its cover.
+    Returns the items whose uploads failed, in the same shape.
+    """
+    import cloudinary.uploader
+    from cloudinary import CloudinaryResource
+
+    from apps.property.models import Property, PropertyMedia
+
+    media = []
+    failed = []
+    for property_id, images in items:
+        retry = []
+        for order, url in images:
+            try:
+                result = cloudinary.uploader.upload(url, folder='properties')
+            except Exception as e:
+                logger.warning(f"Image upload failed for property {property_id} ({url}): {str(e)}")
+                retry.append([order, url])
+                continue
+            image = CloudinaryResource(
+                result['public_id'],
+                version=result.get('version'),
+                format=result.get('format'),
+                type=result.get('type', 'upload'),
+                resource_type=result.get('resource_type', 'image'),
+            )
+            media.append(PropertyMedia(property_id=property_id, image=image, order=order, is_cover=order == 0))
+        if retry:
+            failed.append([property_id, retry])
+
+    property_ids = {item.property_id for item in media}
+    if not property_ids:
+        return failed
+    from apps.property.signals import refresh_agency_listings
+
+    with transaction.atomic():
+        existing = set(PropertyMedia.objects.filter(property_id__in=property_ids).values_list('property_id', flat=True))
+        PropertyMedia.objects.bulk_create(media)
+        # A retried batch may add images to properties that already have a cover.
+        PropertyMedia.objects.filter(
+            pk__in=[item.pk for item in media if item.is_cover and item.property_id in existing]
+        ).update(is_cover=False)
+        Property.refresh_cover_images(property_ids)
+        refresh_agency_listings(
+            Property.objects.filter(pk__in=property_ids).values_list('agency_id', flat=True).distinct()
+        )
+    return failed
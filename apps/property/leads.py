@@ -0,0 +1,161 @@
+"""
+Lead capture for property pages.
+
+The request path validates the form, drops resubmissions (same property,
+email and message within ``LEAD_DEDUP_WINDOW`` seconds), inserts the Lead
+and bumps ``Property.leads_count`` with an atomic ``F() + 1``. After
+commit the lead is counted in the hourly activity analytics, whether or
+not the notification goes out.
+
+One ``notify_agency_leads`` task per agency is then scheduled
+``LEAD_NOTIFICATION_DELAY`` seconds out (a cache key keeps it to one per
+window). That task collects every pending lead of the agency and queues
+one digest to ``agency.email``
+through ``send_email_task``, run in-process so the outbox rows
+(apps.core.mail) are written in the same transaction. The
+``notify_pending_leads`` beat task catches leads whose batch was never
+scheduled (broker or cache down).
+"""
+import hashlib
+import logging
+from datetime import timedelta
+
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_LEADS_PER_EMAIL = 50
+
+
+class LeadForm(forms.Form):
+    name = forms.CharField(max_length=120)
+    email = forms.EmailField()
+    phone = forms.CharField(max_length=30, required=False)
+    message = forms.CharField(max_length=5000)
+
+
+def lead_fingerprint(property_id, email, message):
+    text = f"{property_id}|{email.strip().lower()}|{' '.join(message.split()).lower()}"
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def submit_lead(property_obj, data):
+    """
+    Store a lead from LeadForm ``data`` for ``property_obj``. Returns the
+    Lead, or None when it repeats one sent within the dedup window.
+    """
+    from apps.property.models import Lead, Property
+
+    fingerprint = lead_fingerprint(property_obj.pk, data['email'], data['message'])
+    since = timezone.now() - timedelta(seconds=settings.LEAD_DEDUP_WINDOW)
+    if Lead.objects.filter(fingerprint=fingerprint, created_at__gte=since).exists():
+        return None
+
+    agency_id = property_obj.agency_id
+    with transaction.atomic():
+        lead = Lead.objects.create(
+            property=property_obj,
+            agency_id=agency_id,
+            name=data['name'],
+            email=data['email'],
+            phone=data.get('phone', ''),
+            message=data['message'],
+            fingerprint=fingerprint,
+        )
+        Property.objects.filter(pk=property_obj.pk).update(leads_count=F('leads_count') + 1)
+        transaction.on_commit(lambda: record_activity(property_obj, lead.created_at))
+        transaction.on_commit(lambda: schedule_notification(agency_id))
+    return lead
+
+
+def record_activity(property_obj, at):
+    """Count the lead in the activity analytics; a failure only loses the count."""
+    from apps.property import analytics
+
+    try:
+        analytics.record_lead(property_obj, at=at)
+    except Exception as e:
+        logger.warning(f"Could not record lead activity for property {property_obj.pk}: {str(e)}")
+
+
+def schedule_notification(agency_id):
+    """Queue the agency's next notification batch unless one is already pending."""
+    from apps.property.tasks import notify_agency_leads
+
+    delay = settings.LEAD_NOTIFICATION_DELAY
+    try:
+        if not cache.add(f'leads:notify:{agency_id}', 1, delay):
+            return
+    except Exception as e:
+        logger.warning(f"Lead batch lock unavailable: {str(e)}")
+    try:
+        notify_agency_leads.apply_async((agency_id,), countdown=delay)
+    except Exception as e:
+        logger.warning(f"Could not queue lead notification for agency {agency_id}: {str(e)}")
+
+
+def notify_agency(agency_id):
+    """Send the agency one email with its pending leads. Returns how many went out."""
+    from apps.core.tasks import send_email_task
+    from apps.property.models import Agency, Lead
+
+    try:
+        cache.delete(f'leads:notify:{agency_id}')
+    except Exception:
+        pass
+
+    agency = Agency.objects.filter(pk=agency_id).first()
+    if agency is None:
+        return 0
+    with transaction.atomic():
+        leads = list(
+            Lead.objects
+            .select_for_update()
+            .filter(agency_id=agency_id, notified_at__isnull=True)
+            .select_related('property')
+            .order_by('created_at')[:MAX_LEADS_PER_EMAIL]
+        )
+        if not leads:
+            return 0
+        Lead.objects.filter(pk__in=[lead.pk for lead in leads]).update(notified_at=timezone.now())
+
+        if agency.email:
+            subject, message = lead_digest(agency, leads)
+            send_email_task(subject, message, [agency.email])
+        else:
+            logger.warning(f"Agency {agency_id} has no email; {len(leads)} leads not sent")
+    return len(leads)
+
+
+def lead_digest(agency, leads):
+    if len(leads) == 1:
+        subject = f"New lead for {leads[0].property.title}"
+    else:
+        subject = f"{len(leads)} new leads for {agency.name}"
+    blocks = [
+        f"{lead.property.title} ({lead.property.reference})\n"
+        f"Name: {lead.name}\nEmail: {lead.email}\nPhone: {lead.phone or '-'}\n\n{lead.message}"
+        for lead in leads
+    ]
+    return subject, "\n\n----------\n\n".join(blocks)
+
+
+def pending_agency_ids(older_than=None):
+    """Agencies with leads pending for longer than ``older_than`` seconds."""
+    from apps.property.models import Lead
+
+    if older_than is None:
+        older_than = settings.LEAD_NOTIFICATION_DELAY * 2
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    return list(
+        Lead.objects
+        .filter(notified_at__isnull=True, created_at__lt=cutoff)
+        .order_by()
+        .values_list('agency_id', flat=True)
+        .distinct()
+    )
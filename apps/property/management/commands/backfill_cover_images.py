@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from apps.property.models import Property
+
+
+class Command(BaseCommand):
+    help = 'Fill Property.cover_image from each property\'s cover media'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of properties updated per batch'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        property_ids = list(Property.objects.order_by('id').values_list('id', flat=True))
+
+        updated = 0
+        for start in range(0, len(property_ids), batch_size):
+            batch = property_ids[start:start + batch_size]
+            updated += Property.refresh_cover_images(batch, touch=False)
+            self.stdout.write(f'Processed {min(start + batch_size, len(property_ids))}/{len(property_ids)} properties')
+
+        self.stdout.write(self.style.SUCCESS(f'\nTotal: {updated} cover images refreshed'))
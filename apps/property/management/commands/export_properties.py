@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.property import exports
+from apps.property.models import Property
+
+
+class Command(BaseCommand):
+    help = 'Stream property listings to a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--agency',
+            type=int,
+            action='append',
+            dest='agencies',
+            help='Only export this agency id (repeatable)'
+        )
+        parser.add_argument('--format', choices=list(exports.FORMATS), default='csv', dest='export_format')
+        parser.add_argument('--output', '-o', help='Destination file (default: stdout)')
+        parser.add_argument(
+            '--include-unpublished',
+            action='store_true',
+            help='Export drafts and unpublished listings as well'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=exports.CHUNK_SIZE,
+            help='Number of rows fetched per database round trip'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        queryset = Property.objects.all()
+        if options['agencies']:
+            queryset = queryset.filter(agency_id__in=options['agencies'])
+        if not options['include_unpublished']:
+            queryset = queryset.filter(is_published=True)
+
+        records = exports.export_rows(queryset, chunk_size=options['chunk_size'])
+        total = 0
+
+        def counted():
+            nonlocal total
+            for record in records:
+                total += 1
+                yield record
+
+        if options['export_format'] == 'csv':
+            lines = exports.csv_lines(counted())
+        else:
+            lines = exports.ndjson_lines(counted())
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+        self.stderr.write(self.style.SUCCESS(f'Exported {total} properties'))
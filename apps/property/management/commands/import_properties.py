@@ -0,0 +1,70 @@
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from apps.property import imports
+from apps.property.models import Agency, PropertyImport
+
+
+class Command(BaseCommand):
+    help = 'Bulk import properties for an agency from a CSV, JSON, NDJSON or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Source file')
+        parser.add_argument('--agency', type=int, help='Agency id the properties belong to')
+        parser.add_argument(
+            '--resume',
+            type=int,
+            metavar='JOB',
+            help='Resume an interrupted import job after its last committed batch'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=imports.BATCH_SIZE,
+            help='Number of rows inserted per batch'
+        )
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            job = PropertyImport.objects.select_related('agency').filter(pk=options['resume']).first()
+            if job is None:
+                raise CommandError(f"Import job {options['resume']} does not exist")
+            if job.status == PropertyImport.DONE:
+                raise CommandError(f"Import job {job.pk} already finished")
+            if not PropertyImport.objects.filter(imports.claimable(), pk=job.pk).exists():
+                raise CommandError(
+                    f"Import job {job.pk} is already running; its lease expires "
+                    f"{settings.PROPERTY_IMPORT_LEASE}s after its last committed batch"
+                )
+        else:
+            job = self.create_job(options['path'], options['agency'])
+
+        imports.run(job, batch_size=options['batch_size'])
+
+        style = self.style.SUCCESS if job.status == PropertyImport.DONE else self.style.ERROR
+        self.stdout.write(style(
+            f'Import #{job.pk} {job.status}: {job.rows_imported} imported, {job.rows_failed} rejected'
+        ))
+        if job.message:
+            self.stdout.write(job.message)
+        for error in job.errors[:20]:
+            self.stdout.write(f"  row {error['row']}: {error['errors']}")
+
+    def create_job(self, path, agency_id):
+        if not path or not agency_id:
+            raise CommandError('Give a source file and --agency, or --resume JOB')
+        agency = Agency.objects.filter(pk=agency_id).first()
+        if agency is None:
+            raise CommandError(f'Agency {agency_id} does not exist')
+        try:
+            imports.source_format(path)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        job = PropertyImport(agency=agency)
+        with open(path, 'rb') as fileobj:
+            job.source.save(os.path.basename(path), File(fileobj), save=False)
+        job.save()
+        return job
@@ -1,15 +1,77 @@
 import json
-from django.core.management.base import BaseCommand
-  # adjust import to your app name
+from itertools import islice
 from pathlib import Path
 
-from apps.property.models import Commune, Wilaya
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from apps.core import page_cache
+from apps.core.tenancy import tenant_contexts
+from apps.property import home_sections
+from apps.property.gazetteer import gazetteer
+from apps.property.models import Commune, Property, Wilaya
+from apps.property.search import reindex
+
+BATCH_SIZE = 500
+READ_SIZE = 64 * 1024
+
+
+def iter_json_records(path):
+    """
+    Yield the objects of a JSON array file (or of an NDJSON file) one at a
+    time, reading ``READ_SIZE`` bytes at a time instead of loading it whole.
+    """
+    with open(path, "r", encoding="utf-8-sig") as f:
+        if path.suffix in (".ndjson", ".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = f.read(READ_SIZE).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} does not contain a JSON array")
+        buffer = buffer[1:]
+        # Between records exactly one comma is allowed: "[a, b]", never "[a,, b]" or "[a, b,]".
+        after_record = after_comma = False
+        while True:
+            buffer = buffer.lstrip()
+            if not buffer:
+                buffer = f.read(READ_SIZE)
+                if not buffer:
+                    raise ValueError(f"{path} ends before the closing ]")
+                continue
+            if buffer.startswith("]") and not after_comma:
+                return
+            if after_record:
+                if not buffer.startswith(","):
+                    raise ValueError(f"{path}: expected , or ] after a record, got {buffer[:20]!r}")
+                buffer = buffer[1:]
+                after_record, after_comma = False, True
+                continue
+            if buffer.startswith((",", "]")):
+                raise ValueError(f"{path}: expected a record, got {buffer[:20]!r}")
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except ValueError:
+                chunk = f.read(READ_SIZE)
+                if not chunk:
+                    raise ValueError(f"{path} ends in the middle of a record")
+                buffer += chunk
+                continue
+            yield record
+            after_record, after_comma = True, False
+            buffer = buffer[end:]
+            if len(buffer) < READ_SIZE:
+                buffer += f.read(READ_SIZE)
+
 
 class Command(BaseCommand):
-    help = "Load Wilaya and Commune data from JSON files into the database"
+    help = "Load or refresh Wilaya and Commune data from JSON (or NDJSON) files"
     # python manage.py load_wilayas_and_communes --wilaya_file="Wilaya_Of_Algeria.json" --commune_file="Commune_Of_Algeria.json"  this is how to exec the command
 
-
     def add_arguments(self, parser):
         parser.add_argument(
             "--wilaya_file",
@@ -23,40 +85,111 @@ class Command(BaseCommand):
             default="Commune_Of_Algeria.json",
             help="Path to Commune JSON file"
         )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be inserted or updated without writing"
+        )
 
     def handle(self, *args, **options):
         wilaya_path = Path(options["wilaya_file"])
         commune_path = Path(options["commune_file"])
 
         if not wilaya_path.exists():
-            self.stderr.write(self.style.ERROR(f"Wilaya file not found: {wilaya_path}"))
-            return
+            raise CommandError(f"Wilaya file not found: {wilaya_path}")
         if not commune_path.exists():
-            self.stderr.write(self.style.ERROR(f"Commune file not found: {commune_path}"))
-            return
+            raise CommandError(f"Commune file not found: {commune_path}")
 
-        # Load Wilayas
-        with open(wilaya_path, "r", encoding="utf-8") as f:
-            wilayas_data = json.load(f)
+        dry_run = options["dry_run"]
+        try:
+            with transaction.atomic():
+                updated_wilayas, wilaya_ids = self.load_wilayas(wilaya_path, dry_run)
+                updated_communes = self.load_communes(commune_path, wilaya_ids, dry_run)
+                if dry_run:
+                    return
+                if updated_wilayas or updated_communes:
+                    # Location names are part of each property's search document.
+                    reindex(Property.objects.filter(
+                        Q(wilaya_id__in=updated_wilayas) | Q(commune_id__in=updated_communes)
+                    ))
+                # Invalidated only once the upsert is visible, so a concurrent
+                # request can't refill them with the old names.
+                transaction.on_commit(self.invalidate_caches)
+        except ValueError as e:
+            raise CommandError(str(e))
 
-        # Wilaya.objects.all().delete()  # Optional: clear table first
-        for w in wilayas_data:
-            Wilaya.objects.create(
-                id=str(w["id"]),
-                name=w["name"]
-            )
-        self.stdout.write(self.style.SUCCESS(f"Inserted {len(wilayas_data)} wilayas."))
-
-        # Load Communes
-        with open(commune_path, "r", encoding="utf-8") as f:
-            communes_data = json.load(f)
-
-        # Commune.objects.all().delete()  # Optional: clear table first
-        for c in communes_data:
-            wilaya_instance = Wilaya.objects.get(id=str(c["wilaya_id"]))
-            Commune.objects.create(
-                id=str(c["id"]),
-                name=c["name"],
-                wilaya=wilaya_instance
+    def invalidate_caches(self):
+        gazetteer.invalidate()
+        home_sections.invalidate_all()
+        tenant_contexts.invalidate()
+        page_cache.purge("global")
+
+    def load_wilayas(self, path, dry_run):
+        existing = dict(Wilaya.objects.values_list("id", "name"))
+        changed = []
+        seen = set()
+        for w in iter_json_records(path):
+            wilaya = Wilaya(id=str(w["id"]), name=w["name"])
+            seen.add(wilaya.id)
+            if existing.get(wilaya.id) != wilaya.name:
+                changed.append(wilaya)
+
+        created = [wilaya for wilaya in changed if wilaya.id not in existing]
+        updated = [wilaya.id for wilaya in changed if wilaya.id in existing]
+        if not dry_run:
+            self.upsert(Wilaya, changed, ["name"])
+        self.report("wilayas", len(seen), len(created), len(updated), dry_run)
+        return updated, seen | existing.keys()
+
+    def load_communes(self, path, wilaya_ids, dry_run):
+        existing = {pk: (name, wilaya_id) for pk, name, wilaya_id in Commune.objects.values_list("id", "name", "wilaya_id")}
+        total = created = 0
+        updated = []
+        skipped = []
+        pending = []
+        records = iter_json_records(path)
+        while True:
+            batch = list(islice(records, BATCH_SIZE))
+            if not batch:
+                break
+            for c in batch:
+                total += 1
+                commune = Commune(id=str(c["id"]), name=c["name"], wilaya_id=str(c["wilaya_id"]))
+                if commune.wilaya_id not in wilaya_ids:
+                    skipped.append(commune.id)
+                    continue
+                current = existing.get(commune.id)
+                if current == (commune.name, commune.wilaya_id):
+                    continue
+                if current is None:
+                    created += 1
+                else:
+                    updated.append(commune.id)
+                pending.append(commune)
+            if not dry_run:
+                self.upsert(Commune, pending, ["name", "wilaya"])
+            pending = []
+
+        if skipped:
+            self.stderr.write(self.style.WARNING(
+                f"Skipped {len(skipped)} communes with an unknown wilaya: {', '.join(skipped[:10])}"
+            ))
+        self.report("communes", total - len(skipped), created, len(updated), dry_run)
+        return updated
+
+    def upsert(self, model, objs, update_fields):
+        if objs:
+            model.objects.bulk_create(
+                objs,
+                batch_size=BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=["id"],
+                update_fields=update_fields,
             )
-        self.stdout.write(self.style.SUCCESS(f"Inserted {len(communes_data)} communes."))
+
+    def report(self, label, total, created, updated, dry_run):
+        verb = "Would insert" if dry_run else "Inserted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {created} and {'update' if dry_run else 'updated'} {updated} of {total} {label} "
+            f"({total - created - updated} unchanged)."
+        ))
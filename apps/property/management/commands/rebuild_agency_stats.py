@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from apps.property import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-agency wilaya and amenity statistics tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--agency',
+            type=int,
+            action='append',
+            dest='agencies',
+            help='Only rebuild this agency id (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        total = stats.rebuild(options['agencies'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt statistics for {total} agencies'))
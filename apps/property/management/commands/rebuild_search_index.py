@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from apps.property.models import Property
+from apps.property.search import get_search_backend, reindex
+
+
+class Command(BaseCommand):
+    help = 'Recompute property search documents and rebuild the search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of properties updated per batch'
+        )
+
+    def handle(self, *args, **options):
+        total = reindex(Property.objects.all(), batch_size=options['batch_size'], index=False)
+
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {backend.__class__.__name__} index for {total} properties'
+        ))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:45
+
+import cloudinary.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='cover_image',
+            field=cloudinary.models.CloudinaryField(blank=True, editable=False, max_length=255, null=True, verbose_name='property_cover'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:47
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Frozen copy of apps.property.search.normalize_text as of this migration,
+# so later changes to the live function don't rewrite history. Documents
+# built with a newer normalizer come from ``rebuild_search_index``.
+ARABIC_FOLDING = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    'ـ': '',  # tatweel
+})
+NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize_text(value):
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', str(value).translate(ARABIC_FOLDING))
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    value = value.translate(ARABIC_FOLDING).casefold()
+    return NON_WORD_RE.sub(' ', value).strip()
+
+
+def build_search_index(apps, schema_editor):
+    Property = apps.get_model('property', 'Property')
+    properties = Property.objects.select_related('agency', 'property_type', 'wilaya', 'commune')
+    for obj in properties.iterator(chunk_size=500):
+        # Same parts, in the same order, as search.build_search_document.
+        parts = [
+            obj.title, obj.reference, obj.address,
+            obj.agency.name if obj.agency_id else '',
+            obj.property_type.name if obj.property_type_id else '',
+            obj.commune.name if obj.commune_id else '',
+            obj.wilaya.name if obj.wilaya_id else '',
+            obj.description,
+        ]
+        obj.search_document = normalize_text(' '.join(part for part in parts if part))
+        obj.save(update_fields=['search_document'])
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "ALTER TABLE property_property ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', search_document)) STORED"
+        )
+        schema_editor.execute(
+            'CREATE INDEX property_search_vector_gin ON property_property USING GIN (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE property_search USING fts5("
+            "document, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            'INSERT INTO property_search (rowid, document) '
+            'SELECT id, search_document FROM property_property'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE property_property DROP COLUMN search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE property_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0002_property_cover_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0003_property_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgencyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('leads', models.PositiveIntegerField(default=0)),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='property.agency')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('agency', 'granularity', 'bucket'), name='unique_agency_activity_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PropertyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('leads', models.PositiveIntegerField(default=0)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='property.property')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('property', 'granularity', 'bucket'), name='unique_property_activity_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:58
+
+import cloudinary.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_stats(apps, schema_editor):
+    from django.db.models import Count, Max
+
+    Property = apps.get_model('property', 'Property')
+    PropertyAmenity = apps.get_model('property', 'PropertyAmenity')
+    AgencyWilayaStat = apps.get_model('property', 'AgencyWilayaStat')
+    AgencyAmenityStat = apps.get_model('property', 'AgencyAmenityStat')
+
+    wilaya_rows = (
+        Property.objects.filter(is_published=True)
+        .values('agency_id', 'wilaya_id')
+        .annotate(total=Count('id'), cover=Max('cover_image'))
+        .order_by()
+    )
+    AgencyWilayaStat.objects.bulk_create([
+        AgencyWilayaStat(
+            agency_id=row['agency_id'],
+            wilaya_id=row['wilaya_id'],
+            published_count=row['total'],
+            cover_image=row['cover'],
+        )
+        for row in wilaya_rows
+    ], batch_size=500)
+
+    amenity_rows = (
+        PropertyAmenity.objects.filter(property__is_published=True)
+        .values('property__agency_id', 'amenity_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    AgencyAmenityStat.objects.bulk_create([
+        AgencyAmenityStat(
+            agency_id=row['property__agency_id'],
+            amenity_id=row['amenity_id'],
+            published_count=row['total'],
+        )
+        for row in amenity_rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0004_activity_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgencyAmenityStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('published_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='amenity_stats', to='property.agency')),
+                ('amenity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agency_stats', to='property.amenity')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('agency', 'amenity'), name='unique_agency_amenity_stat')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AgencyWilayaStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('published_count', models.PositiveIntegerField(default=0)),
+                ('cover_image', cloudinary.models.CloudinaryField(blank=True, editable=False, max_length=255, null=True, verbose_name='wilaya_cover')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wilaya_stats', to='property.agency')),
+                ('wilaya', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agency_stats', to='property.wilaya')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('agency', 'wilaya'), name='unique_agency_wilaya_stat')],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
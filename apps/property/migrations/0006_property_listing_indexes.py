@@ -0,0 +1,50 @@
+# Generated by Django 5.2.10 on 2026-10-18 03:10
+
+from django.db import migrations, models
+
+from apps.property.search import normalize_text
+
+
+def add_agency_to_search_documents(apps, schema_editor):
+    Property = apps.get_model('property', 'Property')
+    properties = Property.objects.select_related('agency', 'property_type', 'wilaya', 'commune').order_by('pk')
+    batch = []
+    for obj in properties.iterator(chunk_size=500):
+        parts = [
+            obj.title, obj.reference, obj.address, obj.agency.name,
+            obj.property_type.name if obj.property_type_id else '',
+            obj.commune.name, obj.wilaya.name, obj.description,
+        ]
+        obj.search_document = normalize_text(' '.join(part for part in parts if part))
+        batch.append(obj)
+        if len(batch) >= 500:
+            Property.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    if batch:
+        Property.objects.bulk_update(batch, ['search_document'])
+
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DELETE FROM property_search')
+        schema_editor.execute(
+            'INSERT INTO property_search (rowid, document) '
+            'SELECT id, search_document FROM property_property'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0005_agency_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['-created_at', '-id'], name='property_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['agency', '-created_at'], name='property_agency_created_idx'),
+        ),
+        migrations.RunPython(add_agency_to_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.10 on 2026-10-18 03:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0007_property_imports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=120)),
+                ('email', models.EmailField(max_length=254)),
+                ('phone', models.CharField(blank=True, max_length=30)),
+                ('message', models.TextField(max_length=5000)),
+                ('fingerprint', models.CharField(db_index=True, editable=False, max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leads', to='property.agency')),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leads', to='property.property')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['agency', 'notified_at'], name='lead_pending_idx')],
+            },
+        ),
+    ]
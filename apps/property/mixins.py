@@ -1,3 +1,10 @@
+import hashlib
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from apps.core.page_cache import tag_versions
 from apps.property.models import Agency
 
 
@@ -23,4 +30,79 @@ class TenantFilterMixin:
                 )
             except Agency.DoesNotExist:
                 return None
-        return None
\ No newline at end of file
+        return None
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified for read-only viewsets, checked before anything
+    is serialized.
+
+    Collections are validated by one ``MAX(updated_at), COUNT(*)`` over the
+    filtered queryset, single objects by their ``updated_at`` and
+    ``detail_validator_fields``. Both are mixed with the request URL and
+    format and the page cache versions of ``global`` and the tenant's
+    agency, so edits that don't touch ``updated_at`` (reference data, the
+    agency name) still change the ETag. Counters bumped with ``F()`` leave
+    ``updated_at`` alone too, so a collection ordered by one of
+    ``counter_fields`` also validates on that counter's ``SUM`` (counters
+    only grow, so any bump changes it). A matching ``If-None-Match`` is
+    answered with a 304. A collection's Last-Modified is informational only:
+    deleting its newest row moves it backwards, so collections honour
+    ``If-None-Match`` and ignore ``If-Modified-Since``.
+    """
+
+    updated_field = 'updated_at'
+    detail_validator_fields = ()
+    counter_fields = ()
+
+    def conditional_list(self, queryset, respond):
+        """Return a 304 for ``queryset`` if the client is current, else ``respond()``."""
+        counters = self.ordering_counters(queryset)
+        row = queryset.order_by().aggregate(
+            last=Max(self.updated_field),
+            total=Count('pk'),
+            **{f'sum_{field}': Sum(field) for field in counters},
+        )
+        etag = self.make_etag(row['last'], row['total'], *(row[f'sum_{field}'] for field in counters))
+        last_modified = row['last'].timestamp() if row['last'] else None
+        not_modified = get_conditional_response(self.request, etag=etag)
+        return self.with_validators(not_modified or respond(), etag, last_modified)
+
+    def ordering_counters(self, queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        fields = {str(field).lstrip('-') for field in ordering}
+        return [field for field in self.counter_fields if field in fields]
+
+    def conditional_detail(self, queryset, respond):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = (
+            queryset
+            .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            .values_list(self.updated_field, *self.detail_validator_fields)
+            .first()
+        )
+        if row is None:
+            return respond()
+        etag = self.make_etag(*row)
+        last_modified = row[0].timestamp()
+        not_modified = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        return self.with_validators(not_modified or respond(), etag, last_modified)
+
+    def make_etag(self, *validators):
+        agency = getattr(self.request, 'agency', None)
+        parts = [
+            self.request.get_full_path(),
+            getattr(self.request.accepted_renderer, 'format', ''),
+            tag_versions['global'].get(),
+            tag_versions[f'agency:{agency.pk}'].get() if agency else '',
+            *(value.isoformat() if hasattr(value, 'isoformat') else value for value in validators),
+        ]
+        return quote_etag(hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest())
+
+    def with_validators(self, response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, no_cache=True)
+        return response
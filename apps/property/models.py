@@ -1,5 +1,8 @@
 import uuid
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
+from django.utils import timezone
 from django.utils.text import slugify
 from cloudinary.models import CloudinaryField
 
@@ -291,20 +294,63 @@ class Property(models.Model):
     views_count = models.PositiveIntegerField(default=0)
     leads_count = models.PositiveIntegerField(default=0)
 
+    # Denormalized copy of the cover media image, kept in sync by
+    # refresh_cover_images() so list pages never touch PropertyMedia.
+    cover_image = CloudinaryField('property_cover', blank=True, null=True, editable=False)
+
+    # Normalized text indexed by apps.property.search, filled on save.
+    search_document = models.TextField(blank=True, default='', editable=False)
+
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Default ordering of listings and the admin changelist, overall and per agency.
+            models.Index(fields=["-created_at", "-id"], name="property_created_idx"),
+            models.Index(fields=["agency", "-created_at"], name="property_agency_created_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.reference:
-            self.reference = f"{self.agency.id}-{uuid.uuid4().hex[:6].upper()}"
+            self.reference = self.generate_reference(self.agency.id)
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def generate_reference(agency_id):
+        return f"{agency_id}-{uuid.uuid4().hex[:6].upper()}"
+
     def publish(self):
         self.status = self.ACTIVE
         self.is_published = True
         self.save()
 
+    @classmethod
+    def refresh_cover_images(cls, property_ids, touch=True):
+        """
+        Copy the cover media image (or the first image by order when none
+        is flagged as cover) onto each property's cover_image column.
+        """
+        property_ids = set(property_ids)
+        if not property_ids:
+            return 0
+        covers = {}
+        media_rows = (
+            PropertyMedia.objects
+            .filter(property_id__in=property_ids)
+            .order_by('property_id', '-is_cover', 'order', 'id')
+            .values_list('property_id', 'image')
+        )
+        for property_id, image in media_rows:
+            covers.setdefault(property_id, image)
+
+        now = timezone.now()
+        properties = []
+        for property_id in property_ids:
+            obj = cls(pk=property_id, cover_image=covers.get(property_id), updated_at=now)
+            properties.append(obj)
+        fields = ['cover_image', 'updated_at'] if touch else ['cover_image']
+        return cls.objects.bulk_update(properties, fields, batch_size=500)
+
     def __str__(self):
         return f"{self.title} ({self.agency.name})"
 
@@ -363,3 +409,193 @@ class PropertyAmenity(models.Model):
     def __str__(self):
         return f"{self.property} - {self.amenity}"
 
+
+
+class ActivityBucket(models.Model):
+    """Views and leads counted over one hour or one day (UTC bucket start)."""
+    HOUR = "hour"
+    DAY = "day"
+
+    GRANULARITY_CHOICES = (
+        (HOUR, "Hour"),
+        (DAY, "Day"),
+    )
+
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    leads = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class PropertyActivity(ActivityBucket):
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name="activity"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["property", "granularity", "bucket"],
+                name="unique_property_activity_bucket",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id} {self.granularity} {self.bucket:%Y-%m-%d %H:%M}"
+
+
+class AgencyActivity(ActivityBucket):
+    agency = models.ForeignKey(
+        Agency,
+        on_delete=models.CASCADE,
+        related_name="activity"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["agency", "granularity", "bucket"],
+                name="unique_agency_activity_bucket",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.agency_id} {self.granularity} {self.bucket:%Y-%m-%d %H:%M}"
+
+
+class AgencyWilayaStat(models.Model):
+    """Published listings of an agency in one wilaya (kept by signals)."""
+    agency = models.ForeignKey(
+        Agency,
+        on_delete=models.CASCADE,
+        related_name="wilaya_stats"
+    )
+    wilaya = models.ForeignKey(
+        Wilaya,
+        on_delete=models.CASCADE,
+        related_name="agency_stats"
+    )
+    published_count = models.PositiveIntegerField(default=0)
+    cover_image = CloudinaryField("wilaya_cover", blank=True, null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["agency", "wilaya"], name="unique_agency_wilaya_stat"),
+        ]
+
+    def __str__(self):
+        return f"{self.agency_id} - {self.wilaya_id}: {self.published_count}"
+
+
+class AgencyAmenityStat(models.Model):
+    """Published listings of an agency offering one amenity (kept by signals)."""
+    agency = models.ForeignKey(
+        Agency,
+        on_delete=models.CASCADE,
+        related_name="amenity_stats"
+    )
+    amenity = models.ForeignKey(
+        Amenity,
+        on_delete=models.CASCADE,
+        related_name="agency_stats"
+    )
+    published_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["agency", "amenity"], name="unique_agency_amenity_stat"),
+        ]
+
+    def __str__(self):
+        return f"{self.agency_id} - {self.amenity_id}: {self.published_count}"
+
+
+def import_storage():
+    """Import sources stay on local disk (shared with the Celery worker), not Cloudinary."""
+    return FileSystemStorage(location=settings.PROPERTY_IMPORT_ROOT)
+
+
+class PropertyImport(models.Model):
+    """A bulk property import job; see apps.property.imports."""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    RESUMABLE = (PENDING, FAILED)
+
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    agency = models.ForeignKey(
+        Agency,
+        on_delete=models.CASCADE,
+        related_name="imports"
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="property_imports"
+    )
+    source = models.FileField(upload_to="%Y/%m/", storage=import_storage)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    # Source rows already committed (imported or rejected); a resumed run skips them.
+    position = models.PositiveIntegerField(default=0)
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    # [{"row": n, "errors": {field: [messages]}}, ...], capped at MAX_STORED_ERRORS.
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Import #{self.pk} ({self.agency_id}): {self.status}"
+
+
+class Lead(models.Model):
+    """A contact request sent from a property page; see apps.property.leads."""
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name="leads"
+    )
+    agency = models.ForeignKey(
+        Agency,
+        on_delete=models.CASCADE,
+        related_name="leads"
+    )
+    name = models.CharField(max_length=120)
+    email = models.EmailField()
+    phone = models.CharField(max_length=30, blank=True)
+    message = models.TextField(max_length=5000)
+    # Hash of property, email and message; repeats within LEAD_DEDUP_WINDOW are dropped.
+    fingerprint = models.CharField(max_length=32, db_index=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Set once the lead went out in an agency notification batch.
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["agency", "notified_at"], name="lead_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} <{self.email}> on {self.property_id}"
@@ -24,3 +24,14 @@ class TenantPermission(permissions.BasePermission):
             return obj.agency.tenant_id == request.tenant.id
         return False
 
+
+class AgencyStaffPermission(permissions.BasePermission):
+    """Staff of the request's agency, or a superuser."""
+
+    def has_permission(self, request, view):
+        from apps.property.admin import user_has_agency_access
+
+        user = request.user
+        if not (user and user.is_authenticated):
+            return False
+        return user_has_agency_access(user, getattr(request, 'agency', None))
@@ -0,0 +1,235 @@
+"""
+Property full-text search shared by the shop-grid view and the REST API.
+
+Every property carries a normalized ``search_document`` (title, description,
+address, reference, agency, type and location names). A backend indexes that
+document and answers ranked queries:
+
+- PostgreSQL: a generated ``tsvector`` column with a GIN index
+- SQLite: an FTS5 virtual table (development and tests)
+- anything else: normalized substring matching on the document
+
+Normalization folds case and French diacritics, strips Arabic harakat and
+tatweel and unifies alef/yeh/teh marbuta forms, so "Hydra", "hydrâ" and
+"HYDRA" or "الجزائر" and "الجزاىٔر" match each other.
+"""
+import logging
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+logger = logging.getLogger(__name__)
+
+ARABIC_FOLDING = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    'ـ': '',  # tatweel
+})
+NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+MAX_QUERY_TERMS = 8
+
+
+def normalize_text(value):
+    """Lowercase, strip diacritics/harakat and collapse punctuation."""
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', str(value).translate(ARABIC_FOLDING))
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    value = value.translate(ARABIC_FOLDING).casefold()
+    return NON_WORD_RE.sub(' ', value).strip()
+
+
+def query_terms(query):
+    return normalize_text(query).split()[:MAX_QUERY_TERMS]
+
+
+def build_search_document(property_obj):
+    """Return the normalized text indexed for ``property_obj``."""
+    parts = [
+        property_obj.title,
+        property_obj.reference,
+        property_obj.address,
+        property_obj.agency.name if property_obj.agency_id else '',
+        property_obj.property_type.name if property_obj.property_type_id else '',
+        property_obj.commune.name if property_obj.commune_id else '',
+        property_obj.wilaya.name if property_obj.wilaya_id else '',
+        property_obj.description,
+    ]
+    return normalize_text(' '.join(part for part in parts if part))
+
+
+class BaseSearchBackend:
+    """Plain substring matching over the normalized search document."""
+
+    def index(self, property_ids):
+        """Bring the index up to date for ``property_ids``."""
+
+    def remove(self, property_ids):
+        """Drop ``property_ids`` from the index."""
+
+    def rebuild(self):
+        """Recreate the whole index from Property.search_document."""
+
+    def search(self, queryset, query):
+        """
+        Filter ``queryset`` to the properties matching ``query`` and
+        annotate ``search_rank`` (higher is more relevant).
+        """
+        terms = query_terms(query)
+        if not terms:
+            return queryset
+        for term in terms:
+            queryset = queryset.filter(search_document__contains=term)
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    """FTS5 index keyed by property id, ranked with bm25()."""
+
+    table = 'property_search'
+
+    def index(self, property_ids):
+        from apps.property.models import Property
+
+        property_ids = list(property_ids)
+        if not property_ids:
+            return
+        rows = Property.objects.filter(pk__in=property_ids).values_list('pk', 'search_document')
+        with connection.cursor() as cursor:
+            self._delete(cursor, property_ids)
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, document) VALUES (%s, %s)',
+                list(rows),
+            )
+
+    def remove(self, property_ids):
+        with connection.cursor() as cursor:
+            self._delete(cursor, list(property_ids))
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, document) '
+                f'SELECT id, search_document FROM property_property'
+            )
+
+    def search(self, queryset, query):
+        terms = query_terms(query)
+        if not terms:
+            return queryset
+        match = ' '.join(f'"{term}"*' for term in terms)
+        table = self.table
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({table}) FROM {table} '
+                f'WHERE {table} MATCH %s AND rowid = property_property.id',
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+    def _delete(self, cursor, property_ids):
+        for start in range(0, len(property_ids), 500):
+            batch = property_ids[start:start + 500]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', batch)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    ``search_vector`` is a generated tsvector column over search_document
+    (see migration 0003), so PostgreSQL keeps the GIN index current on every
+    write and there is nothing to index from Python.
+    """
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute('REINDEX INDEX property_search_vector_gin')
+
+    def search(self, queryset, query):
+        terms = query_terms(query)
+        if not terms:
+            return queryset
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.filter(
+            RawSQL(
+                "property_property.search_vector @@ to_tsquery('simple', %s)",
+                [tsquery],
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                "ts_rank(property_property.search_vector, to_tsquery('simple', %s))",
+                [tsquery],
+                output_field=FloatField(),
+            )
+        )
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteFTS5SearchBackend,
+    'basic': BaseSearchBackend,
+}
+
+
+def get_search_backend():
+    """
+    Return the backend named by ``PROPERTY_SEARCH_BACKEND`` or the one that
+    matches the database vendor.
+    """
+    name = getattr(settings, 'PROPERTY_SEARCH_BACKEND', None) or connection.vendor
+    return BACKENDS.get(name, BaseSearchBackend)()
+
+
+def reindex(queryset, batch_size=500, index=True):
+    """
+    Recompute the search document of every property in ``queryset`` in
+    batches of ``batch_size``, indexing each batch unless ``index`` is False.
+    Returns the number of properties updated.
+    """
+    from apps.property.models import Property
+
+    backend = get_search_backend()
+    properties = queryset.select_related('agency', 'property_type', 'wilaya', 'commune').order_by('pk')
+    batch = []
+    total = 0
+    for property_obj in properties.iterator(chunk_size=batch_size):
+        property_obj.search_document = build_search_document(property_obj)
+        batch.append(property_obj)
+        if len(batch) >= batch_size:
+            total += _save_documents(Property, backend, batch, index)
+            batch = []
+    if batch:
+        total += _save_documents(Property, backend, batch, index)
+    return total
+
+
+def _save_documents(model, backend, batch, index):
+    updated = model.objects.bulk_update(batch, ['search_document'])
+    if index:
+        backend.index([property_obj.pk for property_obj in batch])
+    return updated
+
+
+def search_properties(queryset, query):
+    """Filter ``queryset`` by ``query`` and annotate ``search_rank``."""
+    return get_search_backend().search(queryset, query)
+
+
+class PropertySearchFilter(filters.SearchFilter):
+    """DRF ``?search=`` filter backed by the property search backend."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return search_properties(queryset, query)
@@ -56,13 +56,12 @@ class PropertyListSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'reference', 'created_at']
     
     def get_cover_image(self, obj):
-        """Get the cover image URL"""
-        cover = obj.media.filter(is_cover=True).first()
-        if cover and cover.image:
+        """Get the cover image URL from the denormalized column"""
+        if obj.cover_image:
             request = self.context.get('request')
             if request:
-                return request.build_absolute_uri(cover.image.url)
-            return cover.image.url
+                return request.build_absolute_uri(obj.cover_image.url)
+            return obj.cover_image.url
         return None
 
 
@@ -0,0 +1,254 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.core import page_cache
+from apps.core.tenancy import tenant_contexts
+from . import dashboard, home_sections, stats
+from .facets import FACET_ATTRS, facet_indexes, facet_values
+from .gazetteer import gazetteer
+from .models import (
+    Agency, AgencyContact, Amenity, Commune, Property, PropertyAmenity, PropertyMedia, PropertyType, Wilaya,
+)
+from .search import build_search_document, get_search_backend, reindex
+
+
+def refresh_agency_listings(agency_ids):
+    """
+    Bring everything derived from the agencies' properties up to date after
+    writes that bypass these receivers (queryset.update(), bulk_create()).
+    """
+    agency_ids = set(agency_ids)
+    stats.rebuild(agency_ids)
+    transaction.on_commit(lambda: facet_indexes.invalidate(agency_ids))
+    for agency_id in agency_ids:
+        home_sections.invalidate_agency(agency_id)
+    page_cache.purge(*(f'agency:{agency_id}' for agency_id in agency_ids))
+    dashboard.invalidate(agency_ids)
+
+
+@receiver(post_save, sender=Agency)
+@receiver(post_delete, sender=Agency)
+@receiver(post_save, sender=AgencyContact)
+@receiver(post_delete, sender=AgencyContact)
+def invalidate_tenant_context(sender, instance, **kwargs):
+    """Cached tenant snapshots and pages embed the agency and its contacts."""
+    tenant_contexts.invalidate()
+    page_cache.purge(f'agency:{instance.pk if sender is Agency else instance.agency_id}')
+
+
+@receiver(post_save, sender=PropertyMedia)
+@receiver(post_delete, sender=PropertyMedia)
+def refresh_property_cover(sender, instance, **kwargs):
+    """Keep Property.cover_image in step with the property's media."""
+    Property.refresh_cover_images([instance.property_id])
+
+
+@receiver(pre_save, sender=Property)
+def update_search_document(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'search_document' in update_fields:
+        instance.search_document = build_search_document(instance)
+
+
+@receiver(post_save, sender=Property)
+def index_property(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'search_document' in update_fields:
+        get_search_backend().index([instance.pk])
+
+
+@receiver(post_delete, sender=Property)
+def unindex_property(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(pre_save, sender=Agency)
+def remember_agency_name(sender, instance, update_fields=None, **kwargs):
+    instance._previous_name = instance.name
+    if instance.pk is not None and (update_fields is None or 'name' in update_fields):
+        instance._previous_name = Agency.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Agency)
+def reindex_agency_properties(sender, instance, created=False, **kwargs):
+    """Search documents include the agency name."""
+    if not created and getattr(instance, '_previous_name', instance.name) != instance.name:
+        reindex(Property.objects.filter(agency=instance))
+
+
+FACET_UPDATE_FIELDS = {'agency', 'agency_id', 'is_published', *FACET_ATTRS.values(), *FACET_ATTRS}
+
+
+@receiver(post_save, sender=Property)
+def update_facet_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not FACET_UPDATE_FIELDS.intersection(update_fields):
+        return
+    values = facet_values(instance) if instance.is_published else None
+    agency_id, property_id = instance.agency_id, instance.pk
+    transaction.on_commit(lambda: facet_indexes.apply(agency_id, property_id, values))
+
+
+@receiver(post_delete, sender=Property)
+def remove_from_facet_index(sender, instance, **kwargs):
+    agency_id, property_id = instance.agency_id, instance.pk
+    transaction.on_commit(lambda: facet_indexes.apply(agency_id, property_id, None))
+
+
+COUNTER_FIELDS = {'views_count', 'leads_count'}
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def invalidate_home_sections_for_property(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= COUNTER_FIELDS:
+        return
+    home_sections.invalidate_agency(instance.agency_id)
+
+
+def property_location(property_id):
+    return Property.objects.filter(pk=property_id).values_list('agency_id', 'wilaya_id').first()
+
+
+@receiver(post_save, sender=PropertyMedia)
+@receiver(post_delete, sender=PropertyMedia)
+def refresh_media_dependents(sender, instance, **kwargs):
+    """Runs after refresh_property_cover, so the wilaya cover is current."""
+    location = property_location(instance.property_id)
+    if location is not None:
+        stats.refresh_wilaya_stats([location])
+        home_sections.invalidate_agency(location[0])
+
+
+@receiver(post_save, sender=PropertyAmenity)
+@receiver(post_delete, sender=PropertyAmenity)
+def refresh_amenity_dependents(sender, instance, **kwargs):
+    location = property_location(instance.property_id)
+    if location is not None:
+        stats.refresh_amenity_stats([(location[0], instance.amenity_id)])
+        home_sections.invalidate_agency(location[0])
+
+
+@receiver(post_save, sender=Amenity)
+@receiver(post_delete, sender=Amenity)
+@receiver(post_save, sender=Wilaya)
+@receiver(post_delete, sender=Wilaya)
+def invalidate_all_home_sections(sender, instance, **kwargs):
+    home_sections.invalidate_all()
+
+
+@receiver(post_save, sender=Amenity)
+@receiver(post_delete, sender=Amenity)
+@receiver(post_save, sender=Wilaya)
+@receiver(post_delete, sender=Wilaya)
+@receiver(post_save, sender=Commune)
+@receiver(post_delete, sender=Commune)
+@receiver(post_save, sender=PropertyType)
+@receiver(post_delete, sender=PropertyType)
+def purge_all_pages(sender, instance, **kwargs):
+    """Reference data appears in every tenant's filters and listings."""
+    page_cache.purge('global')
+
+
+@receiver(post_save, sender=Wilaya)
+@receiver(post_delete, sender=Wilaya)
+@receiver(post_save, sender=Commune)
+@receiver(post_delete, sender=Commune)
+def invalidate_gazetteer(sender, instance, **kwargs):
+    gazetteer.invalidate()
+
+
+@receiver(post_save, sender=Wilaya)
+@receiver(post_delete, sender=Wilaya)
+@receiver(post_save, sender=Commune)
+@receiver(post_delete, sender=Commune)
+def invalidate_tenant_locations(sender, instance, **kwargs):
+    """Cached tenant snapshots embed the agency's wilaya and commune."""
+    tenant_contexts.invalidate()
+
+
+def property_page_tags(reference, agency_id):
+    return {f'property:{reference}', f'listings:{agency_id}'}
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def purge_property_pages(sender, instance, update_fields=None, **kwargs):
+    """
+    Runs after remember_stats_location, so a property that changed agency
+    also purges its previous agency's listings. Listing pages are tagged per
+    agency, not per wilaya, so a wilaya change needs nothing more.
+    """
+    if update_fields is not None and set(update_fields) <= COUNTER_FIELDS:
+        return
+    tags = property_page_tags(instance.reference, instance.agency_id)
+    previous = getattr(instance, '_previous_location', None)
+    if previous:
+        previous_agency_id, _ = previous
+        tags |= property_page_tags(instance.reference, previous_agency_id)
+    page_cache.purge(*tags)
+
+
+@receiver(post_save, sender=PropertyAmenity)
+@receiver(post_delete, sender=PropertyAmenity)
+def touch_property_for_amenities(sender, instance, **kwargs):
+    """API ETags come from updated_at; media already touch it through the cover refresh."""
+    Property.objects.filter(pk=instance.property_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=PropertyMedia)
+@receiver(post_delete, sender=PropertyMedia)
+@receiver(post_save, sender=PropertyAmenity)
+@receiver(post_delete, sender=PropertyAmenity)
+def purge_property_pages_for_related(sender, instance, **kwargs):
+    row = Property.objects.filter(pk=instance.property_id).values_list('reference', 'agency_id').first()
+    if row is not None:
+        page_cache.purge(*property_page_tags(*row))
+
+
+STATS_FIELDS = {'agency', 'agency_id', 'wilaya', 'wilaya_id', 'is_published'}
+
+
+@receiver(pre_save, sender=Property)
+def remember_stats_location(sender, instance, update_fields=None, **kwargs):
+    instance._previous_location = None
+    if instance.pk is None or (update_fields is not None and not STATS_FIELDS.intersection(update_fields)):
+        return
+    instance._previous_location = property_location(instance.pk)
+
+
+@receiver(post_save, sender=Property)
+def refresh_property_stats(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not STATS_FIELDS.intersection(update_fields):
+        return
+    previous = getattr(instance, '_previous_location', None)
+    stats.refresh_property_stats(
+        [instance.pk],
+        extra_wilaya_keys=[previous] if previous else (),
+        extra_agency_ids=[previous[0]] if previous and previous[0] != instance.agency_id else (),
+    )
+
+
+@receiver(post_delete, sender=Property)
+def remove_property_stats(sender, instance, **kwargs):
+    """Amenity rows are refreshed by the cascaded PropertyAmenity deletes."""
+    stats.refresh_wilaya_stats([(instance.agency_id, instance.wilaya_id)])
+
+
+DASHBOARD_FIELDS = {'agency', 'agency_id', 'status'}
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def invalidate_dashboard_for_property(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not DASHBOARD_FIELDS.intersection(update_fields):
+        return
+    previous = getattr(instance, '_previous_location', None)
+    dashboard.invalidate({instance.agency_id, *(previous[:1] if previous else ())})
+
+
+@receiver(post_save, sender=Agency)
+@receiver(post_delete, sender=Agency)
+def invalidate_dashboard_for_agency(sender, instance, created=True, **kwargs):
+    """post_delete sends no ``created``; both it and creation change the agency count."""
+    if created:
+        dashboard.invalidate([instance.pk])
@@ -0,0 +1,145 @@
+"""
+Materialized per-agency statistics for the landing page and facets.
+
+AgencyWilayaStat holds the published listing count and a cover image per
+(agency, wilaya); AgencyAmenityStat the published listing count per
+(agency, amenity). Signals recompute only the keys a write touches, in the
+same transaction, with one grouped query per batch of keys, so readers get
+O(rows displayed) lookups instead of COUNT(DISTINCT) over every property.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_wilaya_stats(keys):
+    """Recompute the AgencyWilayaStat rows for ``(agency_id, wilaya_id)`` pairs."""
+    from apps.property.models import AgencyWilayaStat, Property
+
+    keys = {key for key in keys if None not in key}
+    if not keys:
+        return
+    condition = Q()
+    for agency_id, wilaya_id in keys:
+        condition |= Q(agency_id=agency_id, wilaya_id=wilaya_id)
+    # The cover is the newest published listing's that has one.
+    newest_cover = (
+        Property.objects
+        .filter(agency_id=OuterRef('agency_id'), wilaya_id=OuterRef('wilaya_id'), is_published=True)
+        .exclude(Q(cover_image__isnull=True) | Q(cover_image=''))
+        .order_by('-created_at', '-pk')
+        .values('cover_image')[:1]
+    )
+    rows = (
+        Property.objects
+        .filter(condition, is_published=True)
+        .values('agency_id', 'wilaya_id')
+        .annotate(total=Count('id'), cover=Subquery(newest_cover))
+        .order_by()
+    )
+    stats = [
+        AgencyWilayaStat(
+            agency_id=row['agency_id'],
+            wilaya_id=row['wilaya_id'],
+            published_count=row['total'],
+            cover_image=row['cover'],
+        )
+        for row in rows
+    ]
+    _replace(AgencyWilayaStat, 'wilaya_id', keys, stats, ['published_count', 'cover_image', 'updated_at'])
+
+
+def refresh_amenity_stats(keys):
+    """Recompute the AgencyAmenityStat rows for ``(agency_id, amenity_id)`` pairs."""
+    from apps.property.models import AgencyAmenityStat, PropertyAmenity
+
+    keys = {key for key in keys if None not in key}
+    if not keys:
+        return
+    condition = Q()
+    for agency_id, amenity_id in keys:
+        condition |= Q(property__agency_id=agency_id, amenity_id=amenity_id)
+    rows = (
+        PropertyAmenity.objects
+        .filter(condition, property__is_published=True)
+        .values('property__agency_id', 'amenity_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    stats = [
+        AgencyAmenityStat(
+            agency_id=row['property__agency_id'],
+            amenity_id=row['amenity_id'],
+            published_count=row['total'],
+        )
+        for row in rows
+    ]
+    _replace(AgencyAmenityStat, 'amenity_id', keys, stats, ['published_count', 'updated_at'])
+
+
+def refresh_property_stats(property_ids, extra_wilaya_keys=(), extra_agency_ids=()):
+    """
+    Recompute every stat row the given properties contribute to, plus
+    ``extra_wilaya_keys`` (their previous location) and the amenity rows of
+    ``extra_agency_ids`` (their previous agency).
+    """
+    from apps.property.models import Property, PropertyAmenity
+
+    property_ids = list(property_ids)
+    wilaya_keys = set(extra_wilaya_keys)
+    wilaya_keys.update(Property.objects.filter(pk__in=property_ids).values_list('agency_id', 'wilaya_id'))
+
+    amenity_rows = list(
+        PropertyAmenity.objects
+        .filter(property_id__in=property_ids)
+        .values_list('property__agency_id', 'amenity_id')
+    )
+    amenity_keys = set(amenity_rows)
+    for agency_id in extra_agency_ids:
+        amenity_keys.update((agency_id, amenity_id) for _, amenity_id in amenity_rows)
+
+    refresh_wilaya_stats(wilaya_keys)
+    refresh_amenity_stats(amenity_keys)
+
+
+def rebuild(agency_ids=None):
+    """Recompute every stat row, or those of ``agency_ids``."""
+    from apps.property.models import Agency, AgencyAmenityStat, AgencyWilayaStat, Property, PropertyAmenity
+
+    agencies = Agency.objects.all()
+    if agency_ids is not None:
+        agencies = agencies.filter(pk__in=agency_ids)
+    total = 0
+    for agency_id in agencies.values_list('pk', flat=True).iterator():
+        with transaction.atomic():
+            wilaya_ids = set(Property.objects.filter(agency_id=agency_id).values_list('wilaya_id', flat=True))
+            wilaya_ids.update(AgencyWilayaStat.objects.filter(agency_id=agency_id).values_list('wilaya_id', flat=True))
+            amenity_ids = set(
+                PropertyAmenity.objects.filter(property__agency_id=agency_id).values_list('amenity_id', flat=True)
+            )
+            amenity_ids.update(AgencyAmenityStat.objects.filter(agency_id=agency_id).values_list('amenity_id', flat=True))
+            refresh_wilaya_stats((agency_id, wilaya_id) for wilaya_id in wilaya_ids)
+            refresh_amenity_stats((agency_id, amenity_id) for amenity_id in amenity_ids)
+        total += 1
+    logger.info(f"Rebuilt statistics for {total} agencies")
+    return total
+
+
+def _replace(model, other_field, keys, stats, update_fields):
+    """Upsert ``stats`` and delete the rows of ``keys`` that came back empty."""
+    present = {(stat.agency_id, getattr(stat, other_field)) for stat in stats}
+    if stats:
+        model.objects.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=['agency', other_field.removesuffix('_id')],
+            update_fields=update_fields,
+        )
+    empty = Q()
+    for agency_id, other_id in keys - present:
+        empty |= Q(agency_id=agency_id, **{other_field: other_id})
+    if empty:
+        model.objects.filter(empty).delete()
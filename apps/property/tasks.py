@@ -0,0 +1,70 @@
+from celery import shared_task
+
+
+@shared_task(ignore_result=True)
+def flush_view_counts():
+    """Apply buffered detail page views to Property.views_count."""
+    from apps.property.counters import view_counter
+
+    view_counter.flush()
+
+
+@shared_task(ignore_result=True)
+def rollup_activity():
+    """Fold hourly analytics buckets into daily ones and drop old hours."""
+    from apps.property import analytics
+
+    analytics.rollup()
+
+
+@shared_task(ignore_result=True)
+def prewarm_home_sections(agency_id=None):
+    """Rebuild cached landing page sections for one agency, or all of them."""
+    from apps.property import home_sections
+    from apps.property.models import Agency
+
+    if agency_id is None:
+        agency_ids = Agency.objects.filter(is_active=True).values_list('id', flat=True)
+    else:
+        agency_ids = [agency_id]
+    for pk in agency_ids:
+        home_sections.prewarm(pk)
+
+
+@shared_task(ignore_result=True)
+def run_property_import(job_id):
+    """Run (or resume) a PropertyImport job."""
+    from apps.property import imports
+    from apps.property.models import PropertyImport
+
+    job = PropertyImport.objects.select_related('agency').filter(imports.claimable(), pk=job_id).first()
+    if job is None:
+        return
+    imports.run(job)
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=3, default_retry_delay=60)
+def ingest_property_media(self, items):
+    """Upload imported listing images to Cloudinary; retry only the failed ones."""
+    from apps.property import imports
+
+    failed = imports.ingest_media(items)
+    if failed:
+        raise self.retry(args=(failed,))
+
+
+@shared_task(ignore_result=True)
+def notify_agency_leads(agency_id):
+    """Email an agency its pending leads as one digest."""
+    from apps.property import leads
+
+    leads.notify_agency(agency_id)
+
+
+@shared_task(ignore_result=True)
+def notify_pending_leads():
+    """Send the batches whose notification task was never queued."""
+    from apps.property import leads
+
+    for agency_id in leads.pending_agency_ids():
+        leads.notify_agency(agency_id)
@@ -1,5 +1,7 @@
 from django import template
 
+from apps.property.commune_payloads import commune_bundle_url as _commune_bundle_url
+
 register = template.Library()
 
 
@@ -14,3 +16,17 @@ def get_by_id(queryset, id):
 @register.filter
 def get_attr(obj, attr):
     return getattr(obj, attr, "")
+
+
+@register.filter
+def facet_count(counts, key):
+    """Look up a facet count: {{ facets.wilaya|facet_count:w.id }}"""
+    if not counts:
+        return 0
+    return counts.get(key, counts.get(str(key), 0))
+
+
+@register.simple_tag
+def commune_bundle_url():
+    """Versioned URL of the all-wilayas commune bundle (cacheable as immutable)."""
+    return _commune_bundle_url()
@@ -1,22 +1,114 @@
+import csv
+import gzip
+import json
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+import cloudinary
 from django.contrib import admin
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
-from django.http import Http404
-from django.test import RequestFactory, TestCase
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import resolve
+from django.utils import timezone
+from rest_framework.test import force_authenticate
 from unittest.mock import patch
 
 from apps.accounts.models import User
-from apps.core.models import Tenant
+from apps.core import page_cache
+from apps.core.models import OutboundEmail, Tenant
+from apps.core.tasks import send_email_task
 from apps.property.models import (
     Agency,
+    AgencyActivity,
+    AgencyAmenityStat,
+    AgencyWilayaStat,
     Amenity,
     Commune,
+    Lead,
     Property,
+    PropertyActivity,
     PropertyAmenity,
+    PropertyImport,
+    PropertyMedia,
     PropertyType,
     Wilaya,
 )
-from apps.property.views import PropertyListView, home, property_detail
+from apps.property import analytics, dashboard, imports, leads
+from apps.property.admin import PropertyAdminForm
+from apps.property.admin_site import DashboardAdminSite
+from apps.property.commune_payloads import commune_bundle_url, get_payloads
+from apps.property.counters import ViewCounter, view_counter
+from apps.property.facets import facet_indexes
+from apps.property.gazetteer import gazetteer, get_gazetteer
+from apps.property.search import normalize_text, search_properties
+from apps.property.serializers import PropertyListSerializer
+from apps.property.tasks import flush_view_counts, run_property_import
+from apps.property.views import PropertyListView, PropertyViewSet, get_communes, get_communes_bundle, home, property_detail
+
+# Cloudinary URLs are built locally and only need a cloud name.
+cloudinary.config(cloud_name="test")
+
+
+def locmem_caches(location):
+    return {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": location}}
+
+
+class PropertyTestCase(TestCase):
+    """
+    One agency (``agency_slug``) in wilaya 16 "Alger", commune 1601 "Hydra",
+    with an "Apartment" property type; subclasses add what they need.
+    """
+
+    agency_slug = "agency"
+    owner_is_staff = False
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.factory = RequestFactory()
+        cls.wilaya = Wilaya.objects.create(id="16", name="Alger")
+        cls.commune = Commune.objects.create(id="1601", name="Hydra", wilaya=cls.wilaya)
+        cls.property_type = PropertyType.objects.create(name="Apartment", slug="apartment")
+        cls.agency = cls.create_agency(cls.agency_slug, is_staff=cls.owner_is_staff)
+        cls.tenant = cls.agency.tenant
+
+    @classmethod
+    def create_agency(cls, slug, name=None, is_staff=False):
+        return Agency.objects.create(
+            tenant=Tenant.objects.create(name=slug.title(), slug=slug, domain=f"{slug}.test", schema_name=slug),
+            owner=User.objects.create_user(username=f"{slug}_owner", password="password", is_staff=is_staff),
+            name=name or f"{slug.title()} Agency",
+            slug=f"{slug}-agency",
+            email=f"{slug}@example.com",
+            wilaya=cls.wilaya,
+            commune=cls.commune,
+        )
+
+    @classmethod
+    def create_property(cls, title, **kwargs):
+        values = {
+            "agency": cls.agency,
+            "title": title,
+            "description": "Test description",
+            "property_type": cls.property_type,
+            "listing_type": Property.SALE,
+            "price": "100000.00",
+            "wilaya": cls.wilaya,
+            "commune": cls.commune,
+            "area_m2": 80,
+        }
+        values.update(kwargs)
+        return Property.objects.create(**values)
 
 
 class AdminOwnershipAccessTests(TestCase):
@@ -195,6 +287,30 @@ class AdminOwnershipAccessTests(TestCase):
         self.assertEqual(agency_ids, {self.agency_one.id, self.agency_two.id})
         self.assertEqual(property_ids, {self.property_one.id, self.property_two.id})
 
+    def changelist(self, user, **params):
+        request = self.factory.get("/admin/property/property/", params)
+        request.user = user
+        response = admin.site._registry[Property].changelist_view(request)
+        response.render()
+        return response
+
+    def test_changelist_filters_by_autocomplete_and_searches_the_index(self):
+        response = self.changelist(self.superuser, wilaya__id__exact=self.wilaya.id, q="agency two")
+
+        self.assertEqual(list(response.context_data["cl"].result_list), [self.property_two])
+        self.assertContains(response, "admin-autocomplete")
+        self.assertNotContains(response, self.wilaya_without_properties.name)
+
+        cleared = self.changelist(self.superuser, wilaya__id__exact="")
+        self.assertEqual(set(cleared.context_data["cl"].result_list), {self.property_one, self.property_two})
+
+    def test_renaming_an_agency_reindexes_its_properties(self):
+        self.agency_one.name = "Renamed Realty"
+        self.agency_one.save()
+
+        response = self.changelist(self.superuser, q="realty")
+        self.assertEqual(list(response.context_data["cl"].result_list), [self.property_one])
+
     def test_property_list_view_only_uses_current_agency_properties(self):
         request = self.request_for(self.owner_one, "/properties/")
         request.tenant = self.tenant_one
@@ -215,7 +331,7 @@ class AdminOwnershipAccessTests(TestCase):
         view.object_list = view.get_queryset()
 
         context = view.get_context_data()
-        wilaya_ids = set(context["wilayas"].values_list("id", flat=True))
+        wilaya_ids = {wilaya.id for wilaya in context["wilayas"]}
         property_type_ids = set(context["property_types"].values_list("id", flat=True))
 
         self.assertEqual(wilaya_ids, {self.wilaya.id, self.wilaya_without_properties.id})
@@ -229,6 +345,7 @@ class AdminOwnershipAccessTests(TestCase):
 
         self.assertEqual(match.func.view_class, PropertyListView)
 
+    @override_settings(PAGE_CACHE_ENABLED=False)
     def test_home_context_only_uses_current_agency_properties(self):
         request = self.request_for(self.owner_one, "/")
         request.tenant = self.tenant_one
@@ -239,8 +356,8 @@ class AdminOwnershipAccessTests(TestCase):
             home(request)
 
         context = render_mock.call_args.args[2]
-        featured_ids = set(context["featured"].values_list("id", flat=True))
-        amenity_ids = set(context["amenities"].values_list("id", flat=True))
+        featured_ids = {property_obj.id for property_obj in context["featured"]}
+        amenity_ids = {amenity.id for amenity in context["amenities"]}
         locations = list(context["locations"])
 
         self.assertEqual(featured_ids, {self.property_one.id})
@@ -255,3 +372,1120 @@ class AdminOwnershipAccessTests(TestCase):
 
         with self.assertRaises(Http404):
             property_detail(request, self.property_two.reference)
+
+
+class PropertyApiQueryTests(PropertyTestCase):
+    agency_slug = "api"
+    owner_is_staff = True
+
+    @classmethod
+    def create_property(cls, title, **kwargs):
+        property_obj = super().create_property(title, **kwargs)
+        PropertyMedia.objects.create(property=property_obj, image=f"properties/{title}-gallery", order=0)
+        PropertyMedia.objects.create(property=property_obj, image=f"properties/{title}-cover", order=1, is_cover=True)
+        return property_obj
+
+    def list_properties(self):
+        request = self.factory.get("/api/v1/properties/")
+        request.tenant = self.tenant
+        response = PropertyViewSet.as_view({"get": "list"})(request)
+        response.render()
+        return response
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.list_properties()
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        self.create_property("first")
+        small_page = self.count_list_queries()
+
+        for index in range(5):
+            self.create_property(f"extra-{index}")
+
+        self.assertEqual(self.count_list_queries(), small_page)
+
+    def test_list_uses_cover_media(self):
+        self.create_property("covered")
+
+        results = self.list_properties().data["results"]
+
+        self.assertIn("covered-cover", results[0]["cover_image"])
+
+    def test_cover_image_follows_media_changes(self):
+        property_obj = self.create_property("synced")
+        property_obj.refresh_from_db()
+        self.assertEqual(property_obj.cover_image.public_id, "properties/synced-cover")
+
+        PropertyMedia.objects.get(property=property_obj, is_cover=True).delete()
+        property_obj.refresh_from_db()
+        self.assertEqual(property_obj.cover_image.public_id, "properties/synced-gallery")
+
+        PropertyMedia.objects.filter(property=property_obj).delete()
+        property_obj.refresh_from_db()
+        self.assertFalse(property_obj.cover_image)
+
+    def api_get(self, path, actions, **kwargs):
+        headers = kwargs.pop("headers", {})
+        request = self.factory.get(path, headers=headers)
+        request.tenant = self.tenant
+        response = PropertyViewSet.as_view(actions)(request, **kwargs)
+        if response.status_code != 304:
+            response.render()
+        return response
+
+    def test_list_answers_if_none_match_before_serializing(self):
+        property_obj = self.create_property("tagged")
+        response = self.api_get("/api/v1/properties/", {"get": "list"})
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+
+        with patch.object(PropertyListSerializer, "to_representation") as serialize, \
+                CaptureQueriesContext(connection) as queries:
+            cached = self.api_get("/api/v1/properties/", {"get": "list"}, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        serialize.assert_not_called()
+
+        other_query = self.api_get("/api/v1/properties/?ordering=price", {"get": "list"}, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(other_query.status_code, 200)
+
+        property_obj.title = "Retitled"
+        property_obj.save()
+        changed = self.api_get("/api/v1/properties/", {"get": "list"}, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], response["ETag"])
+
+    def test_list_etag_follows_counters_it_is_ordered_by(self):
+        property_obj = self.create_property("popular")
+        ranked = self.api_get("/api/v1/properties/?ordering=-views_count", {"get": "list"})
+        newest = self.api_get("/api/v1/properties/", {"get": "list"})
+
+        Property.objects.filter(pk=property_obj.pk).update(views_count=F("views_count") + 1)
+
+        headers = {"If-None-Match": ranked["ETag"]}
+        self.assertEqual(self.api_get("/api/v1/properties/?ordering=-views_count", {"get": "list"}, headers=headers).status_code, 200)
+        headers = {"If-None-Match": newest["ETag"]}
+        self.assertEqual(self.api_get("/api/v1/properties/", {"get": "list"}, headers=headers).status_code, 304)
+
+    def test_detail_etag_follows_counters_and_amenities(self):
+        property_obj = self.create_property("detailed")
+        path = f"/api/v1/properties/{property_obj.pk}/"
+        etag = self.api_get(path, {"get": "retrieve"}, pk=property_obj.pk)["ETag"]
+
+        cached = self.api_get(path, {"get": "retrieve"}, pk=property_obj.pk, headers={"If-None-Match": etag})
+        self.assertEqual(cached.status_code, 304)
+
+        Property.objects.filter(pk=property_obj.pk).update(views_count=5)
+        etag = self.api_get(path, {"get": "retrieve"}, pk=property_obj.pk, headers={"If-None-Match": etag})["ETag"]
+
+        PropertyAmenity.objects.create(property=property_obj, amenity=Amenity.objects.create(name="Pool"))
+        response = self.api_get(path, {"get": "retrieve"}, pk=property_obj.pk, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def export(self, export_format, user=None):
+        request = self.factory.get("/api/v1/properties/export/", {"export_format": export_format})
+        request.tenant = self.tenant
+        request.agency = self.agency
+        force_authenticate(request, user=self.agency.owner if user is None else user)
+        return resolve("/api/v1/properties/export/").func(request)
+
+    def test_export_is_limited_to_agency_staff(self):
+        self.create_property("private")
+        request = self.factory.get("/api/v1/properties/export/")
+        request.tenant = self.tenant
+        request.agency = self.agency
+
+        self.assertIn(resolve("/api/v1/properties/export/").func(request).status_code, (401, 403))
+        outsider = User.objects.create_user(username="api_outsider", password="password", is_staff=True)
+        self.assertEqual(self.export("csv", user=outsider).status_code, 403)
+
+    def test_export_streams_rows_with_batched_media_and_amenities(self):
+        first = self.create_property("first")
+        PropertyAmenity.objects.create(property=first, amenity=Amenity.objects.create(name="Pool"))
+        Property.objects.create(
+            agency=self.agency, title="Hidden", description="d", listing_type=Property.SALE,
+            price="1.00", wilaya=self.wilaya, commune=self.commune, area_m2=10, is_published=False,
+        )
+
+        with CaptureQueriesContext(connection) as small:
+            response = self.export("ndjson")
+            records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        for index in range(5):
+            self.create_property(f"extra-{index}")
+        with CaptureQueriesContext(connection) as large:
+            b"".join(self.export("ndjson").streaming_content)
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(len(small), len(large))
+        self.assertEqual([record["title"] for record in records], ["first"])
+        self.assertEqual(records[0]["amenities"], ["Pool"])
+        self.assertEqual(records[0]["wilaya"], "Alger")
+        self.assertIn("first-gallery", records[0]["images"][0])
+        self.assertIn("first-cover", records[0]["cover_image"])
+
+    def test_export_csv_and_command(self):
+        self.create_property("first")
+
+        response = self.export("csv")
+        rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        self.assertIn("attachment;", response["Content-Disposition"])
+        self.assertEqual(rows[0]["property_type"], "apartment")
+        self.assertEqual(len(rows[0]["images"].split("|")), 2)
+        self.assertEqual(self.export("xml").status_code, 400)
+
+        stdout = StringIO()
+        call_command("export_properties", "--format", "ndjson", "--agency", str(self.agency.pk), stdout=stdout, stderr=StringIO())
+        self.assertEqual(json.loads(stdout.getvalue())["title"], "first")
+
+    def test_backfill_cover_images_command(self):
+        property_obj = self.create_property("backfilled")
+        Property.objects.filter(pk=property_obj.pk).update(cover_image=None)
+
+        call_command("backfill_cover_images", stdout=StringIO())
+
+        property_obj.refresh_from_db()
+        self.assertEqual(property_obj.cover_image.public_id, "properties/backfilled-cover")
+
+
+class PropertySearchTests(PropertyTestCase):
+    agency_slug = "search"
+
+    def search(self, query):
+        return list(search_properties(Property.objects.all(), query))
+
+    def test_normalize_text_folds_accents_case_and_arabic_forms(self):
+        self.assertEqual(normalize_text("Résidence  HYDRÂ-Plage"), "residence hydra plage")
+        self.assertEqual(normalize_text("شقّة في الجزائر"), normalize_text("شقة فى الجزاير"))
+
+    def test_search_matches_accents_prefixes_and_location(self):
+        villa = self.create_property("Villa prestige", description="Vue sur mer à Sidi Fredj")
+        studio = self.create_property("Studio meublé")
+
+        self.assertEqual(self.search("fredj VILLA"), [villa])
+        self.assertEqual(self.search("meuble"), [studio])
+        self.assertEqual(self.search("stud"), [studio])
+        self.assertCountEqual(self.search("hydra"), [villa, studio])
+        self.assertEqual(self.search("villa studio"), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        property_obj = self.create_property("Duplex")
+
+        property_obj.title = "Penthouse"
+        property_obj.save()
+        self.assertEqual(self.search("duplex"), [])
+        self.assertEqual(self.search("penthouse"), [property_obj])
+
+        property_obj.delete()
+        self.assertEqual(self.search("penthouse"), [])
+
+    def test_api_search_orders_by_relevance(self):
+        weak = self.create_property("Appartement", description="Proche du jardin d'essai")
+        strong = self.create_property("Jardin jardin", description="Grand jardin privé")
+
+        request = self.factory.get("/api/v1/properties/", {"search": "jardin"})
+        request.tenant = self.tenant
+        response = PropertyViewSet.as_view({"get": "list"})(request)
+
+        self.assertEqual([item["id"] for item in response.data["results"]], [strong.id, weak.id])
+
+
+@override_settings(CACHES=locmem_caches("facet-tests"))
+class PropertyFacetTests(PropertyTestCase):
+    agency_slug = "facets"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.oran = Wilaya.objects.create(id="31", name="Oran")
+        cls.bir = Commune.objects.create(id="3101", name="Bir El Djir", wilaya=cls.oran)
+        cls.villa = PropertyType.objects.create(name="Villa", slug="villa")
+
+    def setUp(self):
+        facet_indexes.clear()
+
+    def create_property(self, title, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return super().create_property(title, **kwargs)
+
+    def test_counts_ignore_each_facets_own_filter(self):
+        flat = self.create_property("Flat", bedrooms=2, furnished=True)
+        villa = self.create_property("Villa", property_type=self.villa, bedrooms=5, parking=True)
+        self.create_property("Oran flat", wilaya=self.oran, commune=self.bir, listing_type=Property.RENT, bedrooms=1)
+
+        result = facet_indexes.get(self.agency.id).search({"wilaya": "16", "bedrooms": "2"})
+
+        self.assertCountEqual(result.ids, [flat.id, villa.id])
+        self.assertEqual(result.count, 2)
+        self.assertEqual(result.facets["wilaya"], {"16": 2, "31": 0})
+        self.assertEqual(result.facets["bedrooms"], {1: 2, 2: 2, 3: 1, 4: 1, 5: 1})
+        self.assertEqual(result.facets["property_type"], {str(self.property_type.id): 1, str(self.villa.id): 1})
+        self.assertEqual(result.facets["furnished"], {"true": 1, "false": 1})
+
+    def test_index_follows_property_writes_without_rebuilding(self):
+        flat = self.create_property("Flat")
+        index = facet_indexes.get(self.agency.id)
+
+        villa = self.create_property("Villa", property_type=self.villa)
+        with self.captureOnCommitCallbacks(execute=True):
+            flat.is_published = False
+            flat.save()
+
+        with self.assertNumQueries(0):
+            self.assertIs(facet_indexes.get(self.agency.id), index)
+            result = index.search({})
+
+        self.assertEqual(result.ids, [villa.id])
+        self.assertEqual(result.facets["property_type"], {str(self.villa.id): 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            villa.delete()
+        self.assertEqual(facet_indexes.get(self.agency.id).search({}).count, 0)
+
+    def test_shop_grid_context_includes_facet_counts(self):
+        self.create_property("Cheap", price="50000.00")
+        self.create_property("Expensive", price="900000.00", wilaya=self.oran, commune=self.bir)
+
+        request = self.factory.get("/properties/", {"price_max": "100000"})
+        request.tenant = self.tenant
+        request.agency = self.agency
+        view = PropertyListView()
+        view.setup(request)
+        view.object_list = view.get_queryset()
+
+        context = view.get_context_data()
+
+        self.assertEqual(context["facets"]["wilaya"], {"16": 1, "31": 0})
+
+
+@override_settings(CACHES=locmem_caches("pagination-tests"))
+class PropertyPaginationTests(PropertyTestCase):
+    agency_slug = "pages"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.properties = [
+            cls.create_property(f"Listing {index}", price=f"{100000 + (index % 3) * 1000}.00")
+            for index in range(7)
+        ]
+        # Ties on the ordering column must still page deterministically.
+        Property.objects.update(created_at=cls.properties[0].created_at)
+
+    def get(self, url, **params):
+        request = self.factory.get(url, params)
+        request.tenant = self.tenant
+        response = PropertyViewSet.as_view({"get": "list"})(request)
+        response.render()
+        return response
+
+    def walk(self, **params):
+        ids = []
+        response = self.get("/api/v1/properties/", page_size=3, **params)
+        pages = [response]
+        while response.data["next"]:
+            response = self.get(response.data["next"])
+            pages.append(response)
+        for page in pages:
+            ids.extend(item["id"] for item in page.data["results"])
+        return ids, pages
+
+    def test_cursor_pages_cover_every_row_once(self):
+        ids, pages = self.walk()
+
+        expected = list(Property.objects.order_by("-created_at", "-pk").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual([page.data["count"] for page in pages], [7, 7, 7])
+        self.assertIsNone(pages[0].data["previous"])
+        self.assertNotIn("page=", pages[1].data["next"])
+
+        previous = self.get(pages[2].data["previous"])
+        self.assertEqual(previous.data["results"], pages[1].data["results"])
+
+    def test_cursor_pages_on_price(self):
+        ids, _ = self.walk(ordering="price")
+
+        expected = list(Property.objects.order_by("price", "pk").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_cursor_for_other_ordering_is_rejected(self):
+        first = self.get("/api/v1/properties/", page_size=3)
+        cursor = first.data["next"].split("cursor=")[1]
+
+        response = self.get("/api/v1/properties/", ordering="price", cursor=cursor)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_parameter_keeps_page_number_pagination(self):
+        response = self.get("/api/v1/properties/", page_size=3, page=3)
+
+        self.assertEqual(response.data["count"], 7)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIn("page=2", response.data["previous"])
+
+    def test_shop_grid_uses_cursor_links(self):
+        request = self.factory.get("/properties/")
+        request.tenant = self.tenant
+        request.agency = self.agency
+        view = PropertyListView()
+        view.setup(request)
+        view.object_list = view.get_queryset()
+
+        context = view.get_context_data()
+
+        self.assertEqual(len(context["properties"]), 7)
+        self.assertFalse(context["cursor_page"].has_next)
+        self.assertEqual(context["total_count"], 7)
+
+
+@override_settings(CACHES=locmem_caches("counter-tests"), PAGE_CACHE_ENABLED=False)
+class PropertyViewCounterTests(PropertyTestCase):
+    agency_slug = "views"
+    browser = "Mozilla/5.0 (X11; Linux x86_64) Firefox/128.0"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.property = cls.create_property("Viewed")
+
+    def setUp(self):
+        cache.clear()
+        view_counter.__init__()
+
+    def visit(self, ip="10.0.0.1", user_agent=browser):
+        request = self.factory.get("/", REMOTE_ADDR=ip, HTTP_USER_AGENT=user_agent)
+        return view_counter.record(request, self.property.pk)
+
+    def test_bots_and_repeat_visits_are_not_counted(self):
+        self.assertTrue(self.visit())
+        self.assertFalse(self.visit())
+        self.assertFalse(self.visit(ip="10.0.0.2", user_agent="Googlebot/2.1"))
+        self.assertFalse(self.visit(ip="10.0.0.3", user_agent=""))
+        self.assertTrue(self.visit(ip="10.0.0.4"))
+
+        self.assertEqual(view_counter.flush(), {self.property.pk: 2})
+
+    def test_flush_adds_to_stored_count(self):
+        Property.objects.filter(pk=self.property.pk).update(views_count=10)
+        for index in range(3):
+            self.visit(ip=f"10.0.1.{index}")
+
+        flush_view_counts()
+
+        self.property.refresh_from_db()
+        self.assertEqual(self.property.views_count, 13)
+        self.assertEqual(view_counter.flush(), {})
+        self.assertEqual(analytics.activity_series(property_id=self.property.pk, days=1)[0]["views"], 3)
+
+    def test_buffered_views_reach_the_database_without_the_web_process_flush(self):
+        # The locmem cache has no Redis client, so views stay in this process.
+        self.visit()
+
+        with patch("apps.property.counters.view_counter", ViewCounter()):
+            flush_view_counts.apply()
+        self.property.refresh_from_db()
+        self.assertEqual(self.property.views_count, 0)
+
+        later = time.monotonic() + ViewCounter.BUFFER_WRITE_INTERVAL
+        with patch("apps.property.counters.time.monotonic", return_value=later):
+            self.visit(ip="10.0.3.1")
+
+        self.property.refresh_from_db()
+        self.assertEqual(self.property.views_count, 2)
+        self.assertEqual(view_counter.flush(), {})
+
+    def test_detail_page_does_not_write(self):
+        request = self.factory.get("/", REMOTE_ADDR="10.0.2.1", HTTP_USER_AGENT=self.browser)
+        request.tenant = self.tenant
+        request.agency = self.agency
+
+        with patch("apps.property.views.render") as render_mock, CaptureQueriesContext(connection) as queries:
+            render_mock.return_value = object()
+            property_detail(request, self.property.reference)
+
+        statements = [query["sql"].split()[0].upper() for query in queries]
+        self.assertEqual(set(statements), {"SELECT"})
+        self.assertEqual(view_counter.flush(), {self.property.pk: 1})
+
+        context = render_mock.call_args.args[2]
+        with self.assertNumQueries(0):
+            list(context["amenities"])
+
+
+class PropertyAnalyticsTests(PropertyTestCase):
+    agency_slug = "stats"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.first, cls.second = [cls.create_property(title) for title in ("First", "Second")]
+        cls.day = datetime(2026, 3, 10, tzinfo=dt_timezone.utc)
+
+    def at(self, days=0, hours=0):
+        return self.day + timedelta(days=days, hours=hours)
+
+    def test_events_share_hourly_buckets(self):
+        analytics.record_views({self.first.pk: 3, self.second.pk: 1}, at=self.at(hours=9))
+        analytics.record_views({self.first.pk: 2}, at=self.at(hours=9) + timedelta(minutes=30))
+        analytics.record_lead(self.first, at=self.at(hours=10))
+
+        self.assertEqual(PropertyActivity.objects.count(), 3)
+        hour = PropertyActivity.objects.get(property=self.first, bucket=self.at(hours=9))
+        self.assertEqual((hour.views, hour.leads), (5, 0))
+        agency_hours = AgencyActivity.objects.filter(agency=self.agency).order_by("bucket")
+        self.assertEqual([(row.views, row.leads) for row in agency_hours], [(6, 0), (0, 1)])
+
+    def test_rollup_builds_daily_rows_and_compacts_old_hours(self):
+        analytics.record_views({self.first.pk: 4}, at=self.at(hours=8))
+        analytics.record_views({self.first.pk: 1}, at=self.at(hours=20))
+        analytics.record_views({self.second.pk: 2}, at=self.at(days=1, hours=3))
+
+        analytics.rollup(now=self.at(days=1, hours=5))
+        day = PropertyActivity.objects.get(property=self.first, granularity=PropertyActivity.DAY)
+        self.assertEqual((day.bucket, day.views), (self.day, 5))
+
+        series = analytics.activity_series(agency_ids=[self.agency.id], days=3, now=self.at(days=2, hours=1))
+        self.assertEqual([row["views"] for row in series], [5, 2, 0])
+        self.assertEqual(series[0]["day"], self.day.date())
+
+        analytics.rollup(now=self.at(days=analytics.HOURLY_RETENTION_DAYS + 2))
+        self.assertFalse(PropertyActivity.objects.filter(granularity=PropertyActivity.HOUR).exists())
+        self.assertEqual(AgencyActivity.objects.filter(granularity=AgencyActivity.DAY).count(), 2)
+
+    def test_rollup_catches_up_on_missed_days(self):
+        analytics.record_views({self.first.pk: 4}, at=self.at(hours=8))
+        analytics.record_views({self.first.pk: 3}, at=self.at(days=2, hours=8))
+
+        analytics.rollup(now=self.at(days=6))
+
+        daily = PropertyActivity.objects.filter(property=self.first, granularity=PropertyActivity.DAY)
+        self.assertEqual(
+            sorted((row.bucket, row.views) for row in daily), [(self.day, 4), (self.at(days=2), 3)]
+        )
+        self.assertEqual(AgencyActivity.objects.filter(granularity=AgencyActivity.DAY).count(), 2)
+
+    def test_series_reads_recent_hours_before_rollup(self):
+        analytics.record_views({self.first.pk: 4, self.second.pk: 7}, at=self.at(hours=23))
+        analytics.record_lead(self.second, at=self.at(days=1, hours=1))
+
+        series = analytics.activity_series(days=2, now=self.at(days=1, hours=2))
+        top = analytics.top_properties(days=2, now=self.at(days=1, hours=2))
+
+        self.assertEqual([(row["views"], row["leads"]) for row in series], [(11, 0), (0, 1)])
+        self.assertEqual([row["property_id"] for row in top], [self.second.pk, self.first.pk])
+
+
+@override_settings(CACHES=locmem_caches("home-tests"), PAGE_CACHE_ENABLED=False)
+class HomeSectionsTests(PropertyTestCase):
+    agency_slug = "home"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.property = cls.create_property("Featured", is_featured=True)
+        PropertyMedia.objects.create(property=cls.property, image="properties/home-cover", is_cover=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def render_home(self):
+        request = self.factory.get("/")
+        request.agency = self.agency
+        with patch("apps.property.views.render") as render_mock:
+            render_mock.return_value = object()
+            home(request)
+        return render_mock.call_args.args[2]
+
+    def test_warm_home_runs_no_queries(self):
+        self.render_home()
+
+        with self.assertNumQueries(0):
+            context = self.render_home()
+
+        self.assertEqual([p.id for p in context["featured"]], [self.property.id])
+        self.assertEqual(context["locations"][0].image.public_id, "properties/home-cover")
+
+    def test_property_changes_refresh_sections(self):
+        self.render_home()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.property.is_featured = False
+            self.property.save()
+
+        self.assertEqual(self.render_home()["featured"], [])
+
+    def test_counter_updates_keep_sections(self):
+        self.render_home()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.property.save(update_fields=["views_count"])
+
+        self.assertEqual(callbacks, [])
+
+
+class AgencyStatsTests(PropertyTestCase):
+    agency_slug = "totals"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.oran = Wilaya.objects.create(id="31", name="Oran")
+        cls.bir = Commune.objects.create(id="3101", name="Bir El Djir", wilaya=cls.oran)
+        cls.pool = Amenity.objects.create(name="Pool", icon="fas fa-swimming-pool")
+
+    def wilaya_counts(self):
+        return dict(AgencyWilayaStat.objects.values_list("wilaya_id", "published_count"))
+
+    def amenity_counts(self):
+        return dict(AgencyAmenityStat.objects.values_list("amenity_id", "published_count"))
+
+    def test_stats_follow_property_writes(self):
+        first = self.create_property("First")
+        second = self.create_property("Second")
+        PropertyAmenity.objects.create(property=first, amenity=self.pool)
+        PropertyAmenity.objects.create(property=second, amenity=self.pool)
+        self.assertEqual(self.wilaya_counts(), {"16": 2})
+        self.assertEqual(self.amenity_counts(), {self.pool.id: 2})
+
+        second.wilaya, second.commune = self.oran, self.bir
+        second.save()
+        self.assertEqual(self.wilaya_counts(), {"16": 1, "31": 1})
+
+        first.is_published = False
+        first.save()
+        self.assertEqual(self.wilaya_counts(), {"31": 1})
+        self.assertEqual(self.amenity_counts(), {self.pool.id: 1})
+
+        second.delete()
+        self.assertEqual(self.wilaya_counts(), {})
+        self.assertEqual(self.amenity_counts(), {})
+
+    def test_wilaya_stat_tracks_cover_image(self):
+        property_obj = self.create_property("Covered")
+        PropertyMedia.objects.create(property=property_obj, image="properties/stat-cover", is_cover=True)
+
+        self.assertEqual(AgencyWilayaStat.objects.get().cover_image.public_id, "properties/stat-cover")
+
+    def test_wilaya_cover_is_newest_published_listing(self):
+        older = self.create_property("Older")
+        PropertyMedia.objects.create(property=older, image="properties/zz-older", is_cover=True)
+        newer = self.create_property("Newer")
+        PropertyMedia.objects.create(property=newer, image="properties/aa-newer", is_cover=True)
+        self.create_property("No media")
+
+        self.assertEqual(AgencyWilayaStat.objects.get().cover_image.public_id, "properties/aa-newer")
+
+    def test_rebuild_command_restores_tables(self):
+        property_obj = self.create_property("Rebuilt")
+        PropertyAmenity.objects.create(property=property_obj, amenity=self.pool)
+        AgencyWilayaStat.objects.all().delete()
+        AgencyAmenityStat.objects.update(published_count=0)
+
+        call_command("rebuild_agency_stats", stdout=StringIO())
+
+        self.assertEqual(self.wilaya_counts(), {"16": 1})
+        self.assertEqual(self.amenity_counts(), {self.pool.id: 1})
+
+
+@override_settings(CACHES=locmem_caches("page-tests"), ALLOWED_HOSTS=["*"])
+class PageCacheTests(PropertyTestCase):
+    agency_slug = "pages"
+    browser = "Mozilla/5.0 (X11; Linux x86_64) Firefox/128.0"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_wilaya = Wilaya.objects.create(id="31", name="Oran")
+        cls.property = cls.create_property("Cached", is_published=True)
+
+    def setUp(self):
+        cache.clear()
+        # Local copies of the cleared versions would go stale mid-test.
+        page_cache.tag_versions.clear()
+        view_counter.__init__()
+
+    def get(self, path, **extra):
+        return self.client.get(path, HTTP_HOST="pages.test", HTTP_USER_AGENT=self.browser, **extra)
+
+    def assertCached(self, path):
+        self.assertIsNone(self.get(path).context, f"{path} was rendered")
+
+    def assertRendered(self, path):
+        self.assertIsNotNone(self.get(path).context, f"{path} was served from the cache")
+
+    def test_repeat_visit_is_served_from_cache(self):
+        first = self.get("/shop-grid/?listing_type=sale&utm_source=mail")
+        self.assertEqual(first.status_code, 200)
+        self.assertIsNotNone(first.context)
+
+        second = self.get("/shop-grid/?utm_campaign=x&listing_type=sale&q=")
+        self.assertIsNone(second.context)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+        self.assertEqual(self.get("/shop-grid/", HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+        not_modified = self.get("/shop-grid/?listing_type=sale", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+
+    def test_sessions_bypass_the_cache(self):
+        self.get("/about/")
+        self.client.cookies["sessionid"] = "abc"
+        self.assertRendered("/about/")
+
+    def test_property_save_purges_only_affected_pages(self):
+        detail = f"/properties/{self.property.reference}/"
+        pages = ["/about/", "/shop-grid/", "/shop-grid/?wilaya=16", "/shop-grid/?wilaya=31", detail]
+        for path in pages:
+            self.get(path)
+        for path in pages:
+            self.assertCached(path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.property.title = "Renamed"
+            self.property.save()
+
+        self.assertCached("/about/")
+        self.assertRendered("/shop-grid/")
+        self.assertRendered("/shop-grid/?wilaya=16")
+        # Its facet sidebar counts the saved property's wilaya too.
+        self.assertRendered("/shop-grid/?wilaya=31")
+        self.assertContains(self.get(detail), "Renamed")
+
+    def test_unknown_reference_creates_no_tag_version(self):
+        self.get("/about/")
+        tags = len(page_cache.tag_versions)
+        for index in range(5):
+            self.assertEqual(self.get(f"/properties/junk-{index}/").status_code, 404)
+
+        self.assertEqual(len(page_cache.tag_versions), tags)
+        self.assertFalse(any("page_cache:tag:property:junk" in key for key in cache._cache))
+
+    def test_reference_data_purges_every_page(self):
+        self.get("/about/")
+        with self.captureOnCommitCallbacks(execute=True):
+            PropertyType.objects.create(name="Villa", slug="villa")
+        self.assertRendered("/about/")
+
+    def test_cached_detail_page_counts_views_and_renews_csrf_token(self):
+        detail = f"/properties/{self.property.reference}/"
+        self.get(detail, REMOTE_ADDR="10.0.3.1")
+        response = self.get(detail, REMOTE_ADDR="10.0.3.2")
+
+        self.assertIsNone(response.context)
+        self.assertNotIn(b"__page_cache_csrf_token__", response.content)
+        self.assertIn("csrftoken", response.cookies)
+        self.assertEqual(view_counter.flush(), {self.property.pk: 2})
+
+
+@override_settings(CACHES=locmem_caches("dashboard-tests"))
+class DashboardTests(PropertyTestCase):
+    agency_slug = "board0"
+    owner_is_staff = True
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.agencies = [cls.agency, cls.create_agency("board1", is_staff=True)]
+        cls.properties = [
+            cls.create_property(f"Board {index}", agency=cls.agencies[index % 2], status=status)
+            for index, status in enumerate([Property.ACTIVE, Property.SOLD, Property.ACTIVE, Property.RENTED])
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stats_come_from_one_query_per_scope(self):
+        with self.assertNumQueries(1):
+            everything = dashboard.get_dashboard_stats()
+        self.assertEqual(everything, {"agencies": 2, "total": 4, "active": 2, "sold": 1, "rented": 1})
+
+        with self.assertNumQueries(0):
+            dashboard.get_dashboard_stats()
+
+        own = dashboard.get_dashboard_stats([self.agencies[1].pk])
+        self.assertEqual(own, {"agencies": 1, "total": 2, "active": 0, "sold": 1, "rented": 1})
+        self.assertEqual(dashboard.get_dashboard_stats([]), {"agencies": 0, "total": 0, "active": 0, "sold": 0, "rented": 0})
+
+    def test_status_changes_refresh_the_cards(self):
+        dashboard.get_dashboard_stats([self.agencies[0].pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.properties[0].status = Property.SOLD
+            self.properties[0].save(update_fields=["status"])
+
+        self.assertEqual(dashboard.get_dashboard_stats([self.agencies[0].pk])["sold"], 1)
+        self.assertEqual(dashboard.get_dashboard_stats()["sold"], 2)
+
+    def test_default_admin_site_renders_the_dashboard(self):
+        request = self.factory.get("/admin/")
+        request.user = User.objects.create_superuser(username="board_admin", password="password")
+
+        self.assertIsInstance(admin.site._wrapped, DashboardAdminSite)
+        response = admin.site.index(request)
+        response.render()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("dashboard_cards", response.context_data)
+        self.assertContains(response, "Board0 Agency")
+
+    def test_cards_are_only_computed_for_the_index(self):
+        request = self.factory.get("/admin/")
+        request.user = self.agencies[0].owner
+        site = DashboardAdminSite(name="dashboard_test")
+
+        with self.assertNumQueries(0):
+            context = site.each_context(request)
+        self.assertNotIn("dashboard_cards", context)
+
+
+@override_settings(CACHES=locmem_caches("import-tests"))
+class PropertyImportTests(PropertyTestCase):
+    agency_slug = "feed"
+    owner_is_staff = True
+    CSV = (
+        "Title,Description,Listing_Type,Price,Wilaya,Commune,Area_m2,Property_Type,Amenities,Images,Is_Published\n"
+        "Imported flat,Bright flat,sale,150000,Alger,Hydra,90,apartment,Pool,https://img.test/a.jpg,yes\n"
+        "Lost flat,Nowhere,sale,100000,16,Atlantis,70,,,,\n"
+        "Imported villa,Sea view,rent,90000,16,1601,300,Apartment,,,\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.pool = Amenity.objects.create(name="Pool")
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        storage = patch.object(PropertyImport._meta.get_field("source"), "storage", FileSystemStorage(directory.name))
+        storage.start()
+        self.addCleanup(storage.stop)
+
+    def make_job(self, content, name="feed.csv"):
+        job = PropertyImport(agency=self.agency)
+        job.source.save(name, ContentFile(content.encode()), save=False)
+        job.save()
+        return job
+
+    def run_import(self, job, **kwargs):
+        with patch("apps.property.tasks.ingest_property_media.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                imports.run(job, **kwargs)
+        job.refresh_from_db()
+        return delay
+
+    def test_csv_rows_are_bulk_inserted_with_per_row_errors(self):
+        job = self.make_job(self.CSV)
+
+        delay = self.run_import(job)
+
+        self.assertEqual(job.status, PropertyImport.DONE)
+        self.assertEqual((job.rows_imported, job.rows_failed, job.position), (2, 1, 3))
+        self.assertEqual(job.errors[0]["row"], 2)
+        self.assertIn("commune", job.errors[0]["errors"])
+
+        flat = Property.objects.get(title="Imported flat")
+        villa = Property.objects.get(title="Imported villa")
+        self.assertEqual(flat.slug, "imported-flat")
+        self.assertTrue(flat.is_published)
+        self.assertEqual(villa.commune_id, "1601")
+        self.assertNotEqual(flat.reference, villa.reference)
+        self.assertTrue(flat.reference.startswith(f"{self.agency.pk}-"))
+        self.assertEqual(list(PropertyAmenity.objects.filter(property=flat).values_list("amenity_id", flat=True)), [self.pool.pk])
+        self.assertEqual(list(search_properties(Property.objects.all(), "villa")), [villa])
+        self.assertEqual(AgencyWilayaStat.objects.get(agency=self.agency, wilaya=self.wilaya).published_count, 2)
+        delay.assert_called_once_with([[flat.pk, [(0, "https://img.test/a.jpg")]]])
+
+    def test_resume_skips_committed_rows(self):
+        job = self.make_job(self.CSV, name="feed.csv")
+        job.position = 2
+        job.save()
+
+        self.run_import(job, batch_size=1)
+
+        self.assertEqual(list(Property.objects.values_list("title", flat=True)), ["Imported villa"])
+        self.assertEqual((job.rows_imported, job.position), (1, 3))
+
+    def test_running_job_is_not_imported_twice(self):
+        job = self.make_job(self.CSV)
+        PropertyImport.objects.filter(pk=job.pk).update(status=PropertyImport.RUNNING)
+
+        self.run_import(job)
+
+        self.assertEqual(job.status, PropertyImport.RUNNING)
+        self.assertFalse(Property.objects.exists())
+
+    @override_settings(PROPERTY_IMPORT_LEASE=600)
+    def test_running_job_past_its_lease_is_resumed(self):
+        job = self.make_job(self.CSV)
+        stalled = timezone.now() - timedelta(seconds=601)
+        PropertyImport.objects.filter(pk=job.pk).update(status=PropertyImport.RUNNING, position=2, updated_at=stalled)
+
+        with patch("apps.property.tasks.ingest_property_media.delay"):
+            with self.captureOnCommitCallbacks(execute=True):
+                run_property_import(job.pk)
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, PropertyImport.DONE)
+        self.assertEqual(list(Property.objects.values_list("title", flat=True)), ["Imported villa"])
+
+    def test_ndjson_and_unparseable_rows(self):
+        job = self.make_job(
+            '{"title": "Json flat", "description": "d", "listing_type": "sale", "price": 1, '
+            '"wilaya": "alger", "commune": "hydra", "area_m2": 50, "negotiable": true}\n'
+            "not json\n",
+            name="feed.ndjson",
+        )
+
+        self.run_import(job)
+
+        self.assertEqual((job.rows_imported, job.rows_failed), (1, 1))
+        self.assertTrue(Property.objects.get(title="Json flat").negotiable)
+        self.assertEqual(job.errors[0], {"row": 2, "errors": {"__all__": ["Malformed row"]}})
+
+    def test_media_ingestion_sets_covers_and_returns_failures(self):
+        job = self.make_job(self.CSV)
+        self.run_import(job)
+        flat = Property.objects.get(title="Imported flat")
+
+        def upload(url, **kwargs):
+            if url.endswith("broken.jpg"):
+                raise OSError("unreachable")
+            return {"public_id": "properties/a", "version": 1, "format": "jpg"}
+
+        with patch("cloudinary.uploader.upload", side_effect=upload):
+            with self.captureOnCommitCallbacks(execute=True):
+                failed = imports.ingest_media([[flat.pk, [[0, "https://img.test/a.jpg"], [1, "https://img.test/broken.jpg"]]]])
+
+        self.assertEqual(failed, [[flat.pk, [[1, "https://img.test/broken.jpg"]]]])
+        flat.refresh_from_db()
+        self.assertEqual(str(flat.cover_image), "properties/a")
+        self.assertTrue(PropertyMedia.objects.get(property=flat).is_cover)
+
+
+class LoadWilayasAndCommunesTests(TestCase):
+    def load(self, *args):
+        stdout = StringIO()
+        call_command("load_wilayas_and_communes", *args, stdout=stdout, stderr=StringIO())
+        return stdout.getvalue()
+
+    def test_bundled_gazetteer_loads_in_bulk_and_reloads_as_no_op(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.load()
+        self.assertEqual(Wilaya.objects.count(), 58)
+        self.assertEqual(Commune.objects.count(), 1541)
+        self.assertLess(len(queries), 20)
+
+        output = self.load()
+        self.assertIn("Inserted 0 and updated 0 of 1541 communes (1541 unchanged)", output)
+
+    def test_dry_run_diff_and_updates(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        wilaya_file = f"{directory.name}/wilayas.json"
+        commune_file = f"{directory.name}/communes.ndjson"
+        with open(wilaya_file, "w") as f:
+            json.dump([{"id": 16, "name": "Alger"}, {"id": "31", "name": "Oran"}], f)
+        with open(commune_file, "w") as f:
+            f.write('{"id": "1601", "name": "Hydra", "wilaya_id": "16"}\n{"id": "9901", "name": "Nowhere", "wilaya_id": "99"}\n')
+        Wilaya.objects.create(id="16", name="Algiers")
+        args = ("--wilaya_file", wilaya_file, "--commune_file", commune_file)
+
+        output = self.load(*args, "--dry-run")
+        self.assertIn("Would insert 1 and update 1 of 2 wilayas", output)
+        self.assertIn("Would insert 1 and update 0 of 1 communes", output)
+        self.assertEqual(Wilaya.objects.get(pk="16").name, "Algiers")
+        self.assertFalse(Commune.objects.exists())
+
+        self.load(*args)
+        self.assertEqual(Wilaya.objects.get(pk="16").name, "Alger")
+        self.assertEqual(list(Commune.objects.values_list("id", "wilaya_id")), [("1601", "16")])
+
+    def write_files(self, wilayas):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with open(f"{directory.name}/wilayas.json", "w") as f:
+            f.write(wilayas)
+        with open(f"{directory.name}/communes.json", "w") as f:
+            f.write("[]")
+        return ("--wilaya_file", f"{directory.name}/wilayas.json", "--commune_file", f"{directory.name}/communes.json")
+
+    def test_records_need_exactly_one_separator(self):
+        self.load(*self.write_files('[ {"id": 16, "name": "Alger"} ,\n {"id": 31, "name": "Oran"} ]'))
+        self.assertEqual(Wilaya.objects.count(), 2)
+
+        for malformed in ('[{"id": 16, "name": "Alger"},,{"id": 31, "name": "Oran"}]',
+                          '[{"id": 16, "name": "Alger"},]',
+                          '[,{"id": 16, "name": "Alger"}]',
+                          '[{"id": 16, "name": "Alger"} {"id": 31, "name": "Oran"}]'):
+            with self.subTest(malformed), self.assertRaises(CommandError):
+                self.load(*self.write_files(malformed))
+
+    def test_caches_are_invalidated_after_commit(self):
+        args = self.write_files('[{"id": 16, "name": "Alger"}]')
+        with patch("apps.property.management.commands.load_wilayas_and_communes.gazetteer") as gazetteer_mock:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.load(*args)
+            gazetteer_mock.invalidate.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+        gazetteer_mock.invalidate.assert_called_once_with()
+
+
+class GazetteerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.factory = RequestFactory()
+        cls.alger = Wilaya.objects.create(id="16", name="Alger")
+        cls.oran = Wilaya.objects.create(id="31", name="Oran")
+        Commune.objects.create(id="1602", name="Hydra", wilaya=cls.alger)
+        Commune.objects.create(id="1601", name="Alger Centre", wilaya=cls.alger)
+        Commune.objects.create(id="3101", name="Oran", wilaya=cls.oran)
+
+    def setUp(self):
+        # Rolled-back rows send no signal; start every test from a fresh snapshot.
+        gazetteer.invalidate()
+
+    def test_lookups_run_no_queries_once_loaded(self):
+        get_gazetteer()
+        with self.assertNumQueries(0):
+            snapshot = get_gazetteer()
+            response = get_communes(self.factory.get("/admin/get_communes/16/"), 16)
+
+        self.assertEqual([wilaya.name for wilaya in snapshot.wilayas], ["Alger", "Oran"])
+        self.assertEqual(snapshot.commune(3101).wilaya_id, "31")
+        self.assertEqual(snapshot.communes("99"), ())
+        self.assertEqual(
+            json.loads(response.content),
+            [{"id": "1601", "name": "Alger Centre"}, {"id": "1602", "name": "Hydra"}],
+        )
+        with self.assertRaises(AttributeError):
+            snapshot.wilaya("16").name = "Algiers"
+
+    def test_table_changes_rebuild_the_snapshot(self):
+        get_gazetteer()
+        self.oran.name = "Wahran"
+        self.oran.save()
+        Commune.objects.filter(pk="3101").delete()
+
+        snapshot = get_gazetteer()
+        self.assertEqual(snapshot.wilaya("31").name, "Wahran")
+        self.assertIsNone(snapshot.commune("3101"))
+
+    def test_admin_form_renders_commune_choices_from_the_gazetteer(self):
+        get_gazetteer()
+        form = PropertyAdminForm(data={"wilaya": "16"})
+        with CaptureQueriesContext(connection) as queries:
+            html = str(form["commune"])
+
+        self.assertFalse([query for query in queries if 'FROM "commune"' in query["sql"]])
+        self.assertIn("Alger Centre", html)
+        self.assertNotIn(">Oran<", html)
+
+    def test_commune_payloads_are_precompressed_and_revalidated(self):
+        get_payloads()
+        with self.assertNumQueries(0):
+            response = get_communes(self.factory.get("/admin/get_communes/16/", HTTP_ACCEPT_ENCODING="gzip, deflate"), 16)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content))[0]["name"], "Alger Centre")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        cached = get_communes(self.factory.get("/admin/get_communes/16/", HTTP_IF_NONE_MATCH=response["ETag"]), 16)
+        self.assertEqual(cached.status_code, 304)
+
+    def test_versioned_bundle_is_immutable_until_the_gazetteer_changes(self):
+        url = commune_bundle_url()
+        response = get_communes_bundle(self.factory.get(url))
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(json.loads(response.content)["31"], [{"id": "3101", "name": "Oran"}])
+
+        Commune.objects.create(id="3102", name="Bir El Djir", wilaya=self.oran)
+        self.assertNotEqual(commune_bundle_url(), url)
+        stale = get_communes_bundle(self.factory.get(url))
+        self.assertIn("no-cache", stale["Cache-Control"])
+        self.assertEqual(len(json.loads(stale.content)["31"]), 2)
+
+
+@override_settings(CACHES=locmem_caches("lead-tests"), PAGE_CACHE_ENABLED=False)
+class LeadPipelineTests(PropertyTestCase):
+    agency_slug = "leads"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.property = cls.create_property("Wanted")
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, **data):
+        request = self.factory.post(f"/properties/{self.property.reference}/", data)
+        request.tenant = self.agency.tenant
+        request.agency = self.agency
+        request._messages = CookieStorage(request)
+        return request, property_detail(request, self.property.reference)
+
+    def lead_data(self, **overrides):
+        return {"name": "Amina", "email": "amina@example.com", "message": "Is it still available?", **overrides}
+
+    def test_submission_inserts_counts_and_schedules_one_batch(self):
+        with patch("apps.property.tasks.notify_agency_leads.apply_async") as schedule:
+            with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+                request, response = self.post(**self.lead_data())
+            with self.captureOnCommitCallbacks(execute=True):
+                self.post(**self.lead_data(email="AMINA@example.com ", message="Is it  still available?"))
+                self.post(**self.lead_data(email="other@example.com"))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], f"/properties/{self.property.reference}/")
+        self.assertEqual([str(message) for message in request._messages], ["Your message has been sent successfully."])
+        writes = [query["sql"].split()[0].upper() for query in queries if not query["sql"].startswith("SELECT")]
+        self.assertEqual([statement for statement in writes if statement in ("INSERT", "UPDATE")], ["INSERT", "UPDATE"])
+
+        self.assertEqual(Lead.objects.count(), 2)
+        self.property.refresh_from_db()
+        self.assertEqual(self.property.leads_count, 2)
+        self.assertEqual(analytics.activity_series(property_id=self.property.pk, days=1)[-1]["leads"], 2)
+        schedule.assert_called_once_with((self.agency.pk,), countdown=60)
+
+    def test_invalid_submission_rerenders_with_error(self):
+        with patch("apps.property.views.render") as render_mock:
+            render_mock.return_value = HttpResponse()
+            request, response = self.post(name="Amina", email="not-an-email", message="")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Lead.objects.exists())
+        self.assertEqual([message.level_tag for message in request._messages], ["error"])
+
+    def test_notification_sends_one_digest_per_batch(self):
+        with patch("apps.property.tasks.notify_agency_leads.apply_async"):
+            self.post(**self.lead_data())
+            self.post(**self.lead_data(name="Karim", email="karim@example.com"))
+
+        with patch("apps.core.tasks.flush_outbox.apply_async"):
+            with patch("apps.core.tasks.send_email_task", wraps=send_email_task) as send:
+                self.assertEqual(leads.notify_agency(self.agency.pk), 2)
+                self.assertEqual(leads.notify_agency(self.agency.pk), 0)
+
+        send.assert_called_once()
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.subject, "2 new leads for Leads Agency")
+        self.assertIn("karim@example.com", email.body)
+        self.assertEqual(email.recipient, "leads@example.com")
+        self.assertFalse(Lead.objects.filter(notified_at__isnull=True).exists())
+
+    def test_outbox_failure_leaves_leads_pending_for_the_sweep(self):
+        with patch("apps.property.tasks.notify_agency_leads.apply_async"):
+            self.post(**self.lead_data())
+        Lead.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+        with patch("apps.core.mail.queue_email", side_effect=DatabaseError("outbox down")):
+            with self.assertRaises(DatabaseError):
+                leads.notify_agency(self.agency.pk)
+
+        self.assertEqual(leads.pending_agency_ids(), [self.agency.pk])
@@ -1,16 +1,41 @@
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, render
+from functools import partial
 
-from apps.property.mixins import TenantFilterMixin
+from django.http import Http404
+from django.contrib import messages
+from django.db.models import prefetch_related_objects
+from django.shortcuts import get_object_or_404, redirect, render
+
+from apps.property.mixins import ConditionalGetMixin, TenantFilterMixin
 from rest_framework import viewsets, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.views.generic import ListView
-from django.db.models import Q, Count, OuterRef, Subquery
-from .models import Amenity, Commune, Property, PropertyMedia, PropertyType, Wilaya
+from apps.core import page_cache
+from apps.core.page_cache import cache_tenant_page
+from .models import Amenity, Property, PropertyType, Wilaya
+
+from config.pagination import (
+    CachedCountPaginator,
+    InvalidCursor,
+    KeysetPagination,
+    KeysetPaginator,
+    cached_count,
+    keyset_ordering,
+)
 
-from config.pagination import StandardPagination
+from . import exports
+from .commune_payloads import get_payloads, payload_response
+from .counters import record_view
+from .facets import facet_indexes
+from .gazetteer import get_gazetteer
+from .home_sections import get_home_sections
+from .leads import LeadForm, submit_lead
+from .permissions import AgencyStaffPermission
+from .search import PropertySearchFilter, search_properties
 
 from .serializers import (
     PropertyListSerializer,
@@ -37,23 +62,27 @@ def get_current_agency_property_queryset(request):
         Property.objects
         .filter(agency=agency, is_published=True)
         .select_related('agency', 'property_type', 'wilaya', 'commune')
-        .prefetch_related('media')
     )
 
 
 
 def get_communes(request, wilaya_id):
-    communes = Commune.objects.filter(wilaya_id=wilaya_id).values("id", "name")
-    return JsonResponse(list(communes), safe=False)
+    return payload_response(request, get_payloads().for_wilaya(wilaya_id))
+
 
-class PropertyViewSet(TenantFilterMixin, viewsets.ReadOnlyModelViewSet):
+def get_communes_bundle(request):
+    """Every wilaya's communes; immutable when requested under its current version."""
+    payloads = get_payloads()
+    return payload_response(request, payloads.bundle, immutable=request.GET.get('v') == payloads.version)
+
+class PropertyViewSet(ConditionalGetMixin, TenantFilterMixin, viewsets.ReadOnlyModelViewSet):
    
     queryset = Property.objects.filter(is_published=True).select_related(
         'agency', 'property_type', 'wilaya', 'commune'
     ).prefetch_related('media')
     permission_classes = []
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    pagination_class = StandardPagination
+    filter_backends = [DjangoFilterBackend, PropertySearchFilter, filters.OrderingFilter]
+    pagination_class = KeysetPagination
     
 
     filterset_fields = {
@@ -72,18 +101,38 @@ class PropertyViewSet(TenantFilterMixin, viewsets.ReadOnlyModelViewSet):
         'is_published': ['exact'],
     }
     
-
-    search_fields = ['title', 'description', 'address', 'reference']
-    
-
     ordering_fields = ['created_at', 'price', 'area_m2', 'views_count']
     ordering = ['-created_at']
+    detail_validator_fields = ('views_count', 'leads_count')
+    counter_fields = ('views_count', 'leads_count')
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'featured'):
+            # List rows read the denormalized cover_image, not the gallery.
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        searching = self.request.query_params.get(PropertySearchFilter.search_param, '').strip()
+        if searching and 'ordering' not in self.request.query_params:
+            queryset = queryset.order_by('-search_rank', '-created_at')
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'list':
             return PropertyListSerializer
         return PropertyDetailSerializer
-    
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_list(queryset, partial(self.list_response, queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        return self.conditional_detail(queryset, partial(super().retrieve, request, *args, **kwargs))
+
     @action(detail=False, methods=['get'])
     def featured(self, request):
         queryset = self.get_queryset().filter(
@@ -91,7 +140,23 @@ class PropertyViewSet(TenantFilterMixin, viewsets.ReadOnlyModelViewSet):
             is_published=True,
             status=Property.ACTIVE
         )
-        
+        return self.conditional_list(queryset, partial(self.list_response, queryset))
+
+    @action(detail=False, methods=['get'], permission_classes=[AgencyStaffPermission])
+    def export(self, request):
+        """
+        Stream every matching listing as CSV or NDJSON
+        (``?export_format=csv|ndjson``), unpaginated, bypassing the serializers.
+        Staff of the agency only: the feed includes the view and lead counters.
+        """
+        fmt = request.query_params.get('export_format', 'csv')
+        if fmt not in exports.FORMATS:
+            raise ValidationError({'export_format': f"Use one of {', '.join(exports.FORMATS)}."})
+        agency = getattr(request, 'agency', None)
+        name = f"properties-{agency.slug if agency else 'all'}-{timezone.localdate():%Y%m%d}"
+        return exports.streaming_response(self.filter_queryset(self.get_queryset()), fmt, name)
+
+    def list_response(self, queryset):
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -102,23 +167,21 @@ class PropertyViewSet(TenantFilterMixin, viewsets.ReadOnlyModelViewSet):
 
 
 
+UNINDEXED_FILTER_PARAMS = ('q', 'price_min', 'price_max', 'area_min', 'bathrooms', 'status')
+
+
+@method_decorator(cache_tenant_page, name='dispatch')
 class PropertyListView(ListView):
     model = Property
     template_name = 'shop-grid.html'
     context_object_name = 'properties'
     paginate_by = 9
+    paginator_class = CachedCountPaginator
+    cursor_kwarg = 'cursor'
 
     def get_queryset(self):
-        queryset = get_current_agency_property_queryset(self.request)
-
-        q = self.request.GET.get('q')
-        if q:
-            queryset = queryset.filter(
-                Q(title__icontains=q) |
-                Q(description__icontains=q) |
-                Q(address__icontains=q) |
-                Q(reference__icontains=q)
-            )
+        self.add_page_cache_tags()
+        queryset = self.filter_unindexed(get_current_agency_property_queryset(self.request))
 
         listing_type = self.request.GET.get('listing_type')
         if listing_type:
@@ -136,6 +199,42 @@ class PropertyListView(ListView):
         if commune:
             queryset = queryset.filter(commune_id=commune)
 
+        bedrooms = self.request.GET.get('bedrooms')
+        if bedrooms:
+            queryset = queryset.filter(bedrooms__gte=bedrooms)
+
+        furnished = self.request.GET.get('furnished')
+        if furnished in ('true', 'false'):
+            queryset = queryset.filter(furnished=(furnished == 'true'))
+
+        parking = self.request.GET.get('parking')
+        if parking in ('true', 'false'):
+            queryset = queryset.filter(parking=(parking == 'true'))
+
+        ordering = self.request.GET.get('ordering', '-created_at')
+        allowed_orderings = ['created_at', '-created_at', 'price', '-price', 'area_m2', '-area_m2']
+        if self.request.GET.get('q') and 'ordering' not in self.request.GET:
+            queryset = queryset.order_by('-search_rank', '-created_at')
+        elif ordering in allowed_orderings:
+            queryset = queryset.order_by(ordering)
+
+        return queryset
+
+    def add_page_cache_tags(self):
+        """
+        Even a wilaya-filtered page shows the agency-wide facet counts in its
+        sidebar, so any listing change of the agency retires it.
+        """
+        agency = get_current_agency(self.request)
+        if agency is not None:
+            page_cache.add_tags(self.request, f'listings:{agency.id}')
+
+    def filter_unindexed(self, queryset):
+        """Apply the filters the facet index does not cover."""
+        q = self.request.GET.get('q')
+        if q:
+            queryset = search_properties(queryset, q)
+
         price_min = self.request.GET.get('price_min')
         if price_min:
             queryset = queryset.filter(price__gte=price_min)
@@ -148,109 +247,104 @@ class PropertyListView(ListView):
         if area_min:
             queryset = queryset.filter(area_m2__gte=area_min)
 
-        bedrooms = self.request.GET.get('bedrooms')
-        if bedrooms:
-            queryset = queryset.filter(bedrooms__gte=bedrooms)
-
         bathrooms = self.request.GET.get('bathrooms')
         if bathrooms:
             queryset = queryset.filter(bathrooms__gte=bathrooms)
 
-        furnished = self.request.GET.get('furnished')
-        if furnished in ('true', 'false'):
-            queryset = queryset.filter(furnished=(furnished == 'true'))
-
-        parking = self.request.GET.get('parking')
-        if parking in ('true', 'false'):
-            queryset = queryset.filter(parking=(parking == 'true'))
-
         status = self.request.GET.get('status')
         if status:
             queryset = queryset.filter(status=status)
 
-        ordering = self.request.GET.get('ordering', '-created_at')
-        allowed_orderings = ['created_at', '-created_at', 'price', '-price', 'area_m2', '-area_m2']
-        if ordering in allowed_orderings:
-            queryset = queryset.order_by(ordering)
-
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Keyset-paginate by default; ``?page=N`` links and orderings without
+        a keyset (search relevance) use page numbers.
+        """
+        self.cursor_page = None
+        ordering = keyset_ordering(queryset)
+        if ordering is None or self.page_kwarg in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+        try:
+            self.cursor_page = KeysetPaginator(ordering, page_size).paginate(
+                queryset, self.request.GET.get(self.cursor_kwarg)
+            )
+        except InvalidCursor:
+            raise Http404('Invalid cursor')
+        return (None, None, self.cursor_page.object_list, False)
+
+    def get_facets(self, agency):
+        if agency is None:
+            return None
+        restrict_ids = None
+        if any(self.request.GET.get(param) for param in UNINDEXED_FILTER_PARAMS):
+            base = get_current_agency_property_queryset(self.request)
+            restrict_ids = set(self.filter_unindexed(base).values_list('pk', flat=True))
+        return facet_indexes.get(agency.id).search(self.request.GET, restrict_ids=restrict_ids)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
         params = self.request.GET.copy()
         params.pop('page', None)  # remove page so pagination links work cleanly
+        params.pop(self.cursor_kwarg, None)
         context['query_params'] = params.urlencode()
 
         current_agency = get_current_agency(self.request)
         context['current_agency'] = current_agency
         context['listing_type_choices'] = Property.LISTING_TYPE_CHOICES
         context['property_types'] = PropertyType.objects.all().order_by('name')
-        context['wilayas'] = Wilaya.objects.all().order_by('name')
+        context['wilayas'] = get_gazetteer().wilayas
         context['bedroom_options'] = range(1, 6)
         context['bathroom_options'] = range(1, 4)
 
         context['filters'] = self.request.GET
 
+        facet_result = self.get_facets(current_agency)
+        context['facets'] = facet_result.facets if facet_result else {}
+
+        context['cursor_page'] = getattr(self, 'cursor_page', None)
         paginator = context.get('paginator')
-        context['total_count'] = paginator.count if paginator else len(context['properties'])
+        context['total_count'] = paginator.count if paginator else cached_count(self.object_list)
 
         return context
     
+@cache_tenant_page
 def property_detail(request, reference):
     property = get_object_or_404(
-        get_current_agency_property_queryset(request).prefetch_related('propertyamenity_set__amenity'),
+        get_current_agency_property_queryset(request),
         reference = reference,
     )
+    page_cache.add_tags(request, f'property:{reference}')
 
-    # Increment views
-    Property.objects.filter(pk=property.pk).update(views_count=property.views_count + 1)
+    if request.method == 'GET':
+        record_view(request, property.pk)
+        page_cache.on_hit(request, 'apps.property.counters.record_view', property.pk)
 
     if request.method == 'POST':
-        name    = request.POST.get('name', '').strip()
-        email   = request.POST.get('email', '').strip()
-        phone   = request.POST.get('phone', '').strip()
-        message = request.POST.get('message', '').strip()
-
-        # if name and email and message:
-        #     # Save lead
-        #     from .models import Lead  # adjust if Lead is elsewhere
-        #     Lead.objects.create(
-        #         property=property,
-        #         name=name,
-        #         email=email,
-        #         phone=phone,
-        #         message=message,
-        #     )
-
-        #     # Increment leads count
-        #     Property.objects.filter(pk=property.pk).update(leads_count=property.leads_count + 1)
-
-            # Send email to agency
-        #     send_mail(
-        #         subject=f"New lead for {property.title}",
-        #         message=f"Name: {name}\nEmail: {email}\nPhone: {phone}\n\n{message}",
-        #         from_email=settings.DEFAULT_FROM_EMAIL,
-        #         recipient_list=[property.agency.email],
-        #         fail_silently=True,
-        #     )
-
-        #     messages.success(request, "Your message has been sent successfully.")
-        # else:
-        #     messages.error(request, "Please fill in all required fields.")
-        print("!! supposed to send email !!")
-
-    cover = property.media.filter(is_cover=True).first() or property.media.first()
-    gallery = property.media.filter(is_cover=False) 
+        # Lead submissions only insert; the agency is notified from Celery.
+        form = LeadForm(request.POST)
+        if form.is_valid():
+            submit_lead(property, form.cleaned_data)
+            messages.success(request, "Your message has been sent successfully.")
+            return redirect(request.path)
+        messages.error(request, "Please fill in all required fields.")
+
+    prefetch_related_objects([property], 'media', 'propertyamenity_set__amenity')
+    media = list(property.media.all())
+    cover = next((m for m in media if m.is_cover), media[0] if media else None)
+    gallery = [m for m in media if not m.is_cover]
 
     return render(request, 'product-details.html', {
         'property': property,
         'cover': cover,
         'gallery': gallery,
-        'amenities': property.propertyamenity_set.select_related('amenity').all(),
+        'amenities': property.propertyamenity_set.all(),
         'primary_contacts': property.agency.contacts.filter(is_primary=True),
     })
 
+@cache_tenant_page
 def home(request):
     current_agency = get_current_agency(request)
     if current_agency is None:
@@ -260,64 +354,5 @@ def home(request):
             'locations': Wilaya.objects.none(),
         })
 
-    agency_properties = get_current_agency_property_queryset(request)
-
-    amenities = (
-        Amenity.objects
-        .filter(icon__isnull=False)
-        .exclude(icon='')
-        .annotate(
-            total=Count(
-                'propertyamenity',
-                filter=Q(
-                    propertyamenity__property__agency=current_agency,
-                    propertyamenity__property__is_published=True,
-                ),
-            )
-        )
-        .filter(total__gt=0)
-        .order_by('-total')[:10]
-    )
-
-    cover_image_subquery = PropertyMedia.objects.filter(
-        property=OuterRef('pk'),
-        is_cover=True
-    ).values('image')[:1]
-
-    featured_properties = (
-        agency_properties
-        .filter(is_featured=True)
-        .annotate(image=Subquery(cover_image_subquery))
-        .order_by('-created_at')[:4]
-    )
-
-    # Subquery: one cover image per wilaya from the current agency's published properties.
-    wilaya_cover_subquery = PropertyMedia.objects.filter(
-        property__wilaya=OuterRef('pk'),
-        property__agency=current_agency,
-        property__is_published=True,
-        is_cover=True
-    ).values('image')[:1]
-
-    locations_with_properties = (
-        Wilaya.objects
-        .annotate(
-            property_count=Count(
-                'properties',
-                filter=Q(
-                    properties__agency=current_agency,
-                    properties__is_published=True,
-                ),
-                distinct=True,
-            ),
-            image=Subquery(wilaya_cover_subquery)
-        )
-        .filter(property_count__gt=0)
-        .order_by('-property_count')[:8]
-    )
-
-    return render(request, 'index5.html', {
-        'amenities': amenities,
-        'featured': featured_properties,
-        'locations': locations_with_properties,
-    })
+    page_cache.add_tags(request, f'home:{current_agency.id}')
+    return render(request, 'index5.html', get_home_sections(current_agency.id))
@@ -30,6 +30,22 @@ app.conf.beat_schedule = {
         'task': 'apps.core.tasks.cleanup_expired_sessions',
         'schedule': crontab(hour=0, minute=0),
     },
+    'flush-property-view-counts': {
+        'task': 'apps.property.tasks.flush_view_counts',
+        'schedule': 60.0,
+    },
+    'rollup-property-activity': {
+        'task': 'apps.property.tasks.rollup_activity',
+        'schedule': crontab(minute=5),
+    },
+    'flush-email-outbox': {
+        'task': 'apps.core.tasks.flush_outbox',
+        'schedule': 60.0,
+    },
+    'notify-pending-leads': {
+        'task': 'apps.property.tasks.notify_pending_leads',
+        'schedule': crontab(minute='*/10'),
+    },
     # Example: Run every 30 minutes
     # 'send-notification-reminders': {
     #     'task': 'apps.notifications.tasks.send_reminders',
@@ -1,7 +1,7 @@
 from django.utils.deprecation import MiddlewareMixin
-from django.core.cache import cache
 from django.http import JsonResponse
 from apps.core.models import Tenant
+from apps.core.tenancy import tenant_contexts, tenant_router
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,48 +9,7 @@ logger = logging.getLogger(__name__)
 
 class TenantMiddleware(MiddlewareMixin):
    
-    CACHE_TIMEOUT = 300  
     LOCALHOST_DOMAINS = ['localhost', '127.0.0.1', 'testserver']
-    _redis_available = None  # Cache Redis availability check
-    
-    def _check_redis_available(self):
-        """Check if Redis is available (cached result)"""
-        if self._redis_available is None:
-            try:
-                cache.set('_redis_test', 1, 1)
-                cache.get('_redis_test')
-                TenantMiddleware._redis_available = True
-            except Exception as e:
-                logger.warning(f"Redis not available, caching disabled: {str(e)}")
-                TenantMiddleware._redis_available = False
-        return self._redis_available
-    
-    def _safe_cache_get(self, key):
-        """Safely get from cache with fallback"""
-        if not self._check_redis_available():
-            return None
-        try:
-            return cache.get(key)
-        except Exception:
-            return None
-    
-    def _safe_cache_set(self, key, value, timeout):
-        """Safely set to cache with fallback"""
-        if not self._check_redis_available():
-            return
-        try:
-            cache.set(key, value, timeout)
-        except Exception:
-            pass
-    
-    def _safe_cache_delete(self, key):
-        """Safely delete from cache with fallback"""
-        if not self._check_redis_available():
-            return
-        try:
-            cache.delete(key)
-        except Exception:
-            pass
     
     def process_request(self, request):
        
@@ -70,29 +29,14 @@ class TenantMiddleware(MiddlewareMixin):
                     'detail': 'Please create a tenant with domain "localhost" for local development'
                 }, status=500)
         
-        cache_key = f'tenant_domain_{host}'
-        tenant_id = self._safe_cache_get(cache_key)
-        
-        if tenant_id:
-            try:
-                tenant = Tenant.objects.select_related("agency").prefetch_related("agency__contacts").get(id=tenant_id, is_active=True)
-                request.tenant = tenant
-                request.agency = getattr(tenant, "agency", None)
-                request.tenant_domain = host
-                return None
-            except Tenant.DoesNotExist:
-                self._safe_cache_delete(cache_key)
-        
         tenant = self._get_tenant_by_domain(host)
         
         if tenant:
-            self._safe_cache_set(cache_key, tenant.id, self.CACHE_TIMEOUT)
             request.tenant = tenant
             request.agency = getattr(tenant, "agency", None)
             request.tenant_domain = host
             return None
         
-        logger.warning(f"No tenant found for domain: {host}")
         return JsonResponse({
             'error': 'Invalid domain',
             'detail': f'No tenant registered for domain: {host}'
@@ -101,20 +45,16 @@ class TenantMiddleware(MiddlewareMixin):
     def _get_tenant_by_domain(self, host):
       
         try:
-            tenant = Tenant.objects.select_related("agency").prefetch_related("agency__contacts").filter(
-                domain=host,
-                is_active=True
-            ).first()
+            tenant_id = tenant_router.resolve(host)
+            if tenant_id is None:
+                return None
             
-            if tenant:
-                return tenant
+            tenant = tenant_contexts.get(tenant_id)
             
-            tenants = Tenant.objects.select_related("agency").prefetch_related("agency__contacts").filter(is_active=True)
-            for tenant in tenants:
-                if host in tenant.get_all_domains():
-                    return tenant
-            
-            return None
+            if tenant is None:
+                # Routing table outlived the tenant (e.g. a queryset update that sent no signal)
+                tenant_router.forget(tenant_id)
+            return tenant
         except Exception as e:
             logger.error(f"Error retrieving tenant for domain {host}: {str(e)}")
             return None
@@ -122,13 +62,11 @@ class TenantMiddleware(MiddlewareMixin):
     def _get_development_tenant(self):
      
         try:
-            tenant = Tenant.objects.select_related("agency").prefetch_related("agency__contacts").filter(
-                domain='localhost',
-                is_active=True
-            ).first()
-            
-            if tenant:
-                return tenant
+            tenant_id = tenant_router.get_routes().get('localhost')
+            if tenant_id is not None:
+                tenant = tenant_contexts.get(tenant_id)
+                if tenant:
+                    return tenant
             
             return Tenant.objects.select_related("agency").prefetch_related("agency__contacts").filter(is_active=True).first()
         except Exception as e:
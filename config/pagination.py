@@ -1,6 +1,250 @@
+import base64
+import binascii
+import hashlib
+import json
+from dataclasses import dataclass
+
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models.fields.tuple_lookups import Tuple, TupleGreaterThan, TupleLessThan
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Non-null columns a listing can be keyset-paginated on, always paired with
+# the primary key as a tie-breaker.
+KEYSET_ORDERINGS = ('created_at', 'price', 'area_m2', 'views_count')
+
+COUNT_CACHE_TIMEOUT = 60
+
+# Unfiltered tables larger than this are counted from planner statistics.
+ESTIMATE_THRESHOLD = 100000
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    """
+    ``queryset.count()`` cached for ``timeout`` seconds under a key derived
+    from its SQL, so paging through a large listing doesn't repeat the
+    COUNT(*) on every request. The total may lag writes by ``timeout``.
+    """
+    from apps.core.utils import get_or_set_cache
+
+    queryset = queryset.order_by()
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:
+        return 0
+    key = f'pagination_count:{hashlib.md5(sql.encode()).hexdigest()}'
+    return get_or_set_cache(key, queryset.count, timeout=timeout)
+
+
+def estimated_count(queryset, threshold=ESTIMATE_THRESHOLD):
+    """
+    ``queryset.count()`` for display: on PostgreSQL an unfiltered queryset
+    over a table the planner estimates above ``threshold`` rows is counted
+    from ``pg_class.reltuples`` (kept current by autovacuum) instead of a
+    sequential scan; everything else goes through cached_count().
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= threshold:
+            return row[0]
+    return cached_count(queryset)
+
+
+class CachedCountPaginator(Paginator):
+    """Django paginator whose total comes from cached_count()."""
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Django paginator whose total comes from estimated_count()."""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def keyset_ordering(queryset, allowed=KEYSET_ORDERINGS):
+    """
+    Return the ordering (e.g. ``'-created_at'``) to keyset-paginate
+    ``queryset`` on, or None when its ORDER BY can't be expressed as one of
+    ``allowed`` followed by the primary key.
+    """
+    query = queryset.query
+    ordering = list(query.order_by) or list(query.get_meta().ordering if query.default_ordering else [])
+    ordering = [o for o in ordering if isinstance(o, str)]
+    if not ordering or ordering[0].lstrip('-') not in allowed:
+        return None
+    if any(o.lstrip('-') not in ('pk', 'id') for o in ordering[1:]):
+        return None
+    return ordering[0]
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: str = None
+    previous_cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Seek pagination on ``(ordering field, pk)``.
+
+    Each page is fetched with ``WHERE (field, pk) < (last field, last pk)``
+    and ``LIMIT page_size + 1``, so deep pages cost the same as the first
+    one instead of scanning and discarding OFFSET rows. Cursors are opaque
+    urlsafe-base64 tokens carrying the ordering, the boundary row and the
+    direction; a cursor issued for another ordering is rejected.
+    """
+
+    def __init__(self, ordering, page_size):
+        self.ordering = ordering
+        self.field = ordering.lstrip('-')
+        self.descending = ordering.startswith('-')
+        self.page_size = page_size
+
+    def paginate(self, queryset, cursor=None):
+        position = self.decode_cursor(queryset.model, cursor) if cursor else None
+        backwards = bool(position and position[2])
+        descending = self.descending != backwards
+
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}pk')
+        if position:
+            # A row-value comparison is a single range seek on the
+            # (field, pk) index; backends without row values get the
+            # equivalent OR expansion from Django.
+            seek = TupleLessThan if descending else TupleGreaterThan
+            queryset = queryset.filter(seek(Tuple(self.field, 'pk'), (position[0], position[1])))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+
+        if backwards:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        return KeysetPage(
+            object_list=rows,
+            next_cursor=self.encode_cursor(rows[-1]) if has_next and rows else None,
+            previous_cursor=self.encode_cursor(rows[0], backwards=True) if has_previous and rows else None,
+        )
+
+    def encode_cursor(self, obj, backwards=False):
+        value = getattr(obj, self.field)
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        payload = json.dumps([self.ordering, value, obj.pk, int(backwards)], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, model, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            ordering, value, pk, backwards = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if ordering != self.ordering:
+                raise InvalidCursor('Cursor was issued for another ordering')
+            value = model._meta.get_field(self.field).to_python(value)
+            pk = model._meta.pk.to_python(pk)
+        except (TypeError, ValueError, ValidationError, binascii.Error) as e:
+            raise InvalidCursor(str(e))
+        return value, pk, bool(backwards)
+
 
 class StandardPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
+
+
+class KeysetPagination(StandardPagination):
+    """
+    Cursor pagination for listings ordered by one of KEYSET_ORDERINGS, with
+    a cached ``count`` so responses keep the page-number shape
+    (count/next/previous/results).
+
+    Requests that pass ``page`` or use another ordering (e.g. search
+    relevance) fall back to page numbers, also with a cached count.
+    """
+
+    cursor_query_param = 'cursor'
+    ordering_fields = KEYSET_ORDERINGS
+    django_paginator_class = CachedCountPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_page = None
+        ordering = keyset_ordering(queryset, self.ordering_fields)
+        if ordering is None or self.page_query_param in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.request = request
+        self.display_page_controls = False
+        try:
+            self.keyset_page = KeysetPaginator(ordering, page_size).paginate(
+                queryset, request.query_params.get(self.cursor_query_param)
+            )
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+        self.count = cached_count(queryset)
+        return self.keyset_page.object_list
+
+    def get_paginated_response(self, data):
+        if self.keyset_page is None:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if self.keyset_page is None:
+            return super().get_next_link()
+        return self._cursor_link(self.keyset_page.next_cursor)
+
+    def get_previous_link(self):
+        if self.keyset_page is None:
+            return super().get_previous_link()
+        return self._cursor_link(self.keyset_page.previous_cursor)
+
+    def _cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
@@ -16,7 +16,7 @@ SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-change-this-in-produc
 DJANGO_APPS = [
     "adminsortable2",
     'jazzmin',
-    'django.contrib.admin',
+    'apps.property.admin_site.DashboardAdminConfig',  # django.contrib.admin with the dashboard site
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -151,6 +151,11 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploaded bulk import files; must be shared by the web and Celery worker containers
+PROPERTY_IMPORT_ROOT = os.environ.get('PROPERTY_IMPORT_ROOT', str(MEDIA_ROOT / 'imports'))
+# A running import not saved for this many seconds (its worker died) can be claimed again
+PROPERTY_IMPORT_LEASE = int(os.environ.get('PROPERTY_IMPORT_LEASE', 15 * 60))
+
 # ========================================
 # Cloudinary Configuration
 # ========================================
@@ -256,12 +261,14 @@ CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 # ========================================
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        'BACKEND': 'apps.core.cache.CircuitBreakerRedisCache',
         'LOCATION': os.environ.get('REDIS_URL', 'redis://localhost:6379/1'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
-            'SOCKET_CONNECT_TIMEOUT': 5,
-            'SOCKET_TIMEOUT': 5,
+            # Redis answers in well under a millisecond; anything slower is an
+            # outage, and the circuit breaker below takes over from there.
+            'SOCKET_CONNECT_TIMEOUT': 1,
+            'SOCKET_TIMEOUT': 1,
             'CONNECTION_POOL_KWARGS': {
                 'max_connections': 50,
                 'retry_on_timeout': True,
@@ -269,11 +276,26 @@ CACHES = {
         },
         'KEY_PREFIX': 'drf_boilerplate',
         'TIMEOUT': 300,  # 5 minutes default
+        # Fail fast for RESET_TIMEOUT seconds after FAILURE_THRESHOLD errors
+        'CIRCUIT_BREAKER': {
+            'NAME': 'default',
+            'FAILURE_THRESHOLD': 3,
+            'RESET_TIMEOUT': 30,
+        },
     }
 }
 
-# Session cache
-SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+# Rebuild cached landing page sections in Celery right after listings change
+HOME_SECTIONS_PREWARM = os.environ.get('HOME_SECTIONS_PREWARM', 'False') == 'True'
+
+# Full-page cache for anonymous visitors of the public tenant pages
+PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', 'True') == 'True'
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 600))
+
+# Session cache (backed by the database, so sessions survive a Redis outage).
+# Sessions created under the previous cache-only engine are not in the
+# database, so switching engines logs every user out once on deploy.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 SESSION_CACHE_ALIAS = 'default'
 
 # ========================================
@@ -307,16 +329,27 @@ SPECTACULAR_SETTINGS = {
 # ========================================
 # Email Configuration
 # ========================================
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# SMTP in production; console (default) or filebased (EMAIL_FILE_PATH) locally.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', str(BASE_DIR / 'logs' / 'emails'))
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@example.com')
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True') == 'True'
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+# Outbox (apps.core.mail): seconds to gather messages into one batch, and
+# messages per recipient per hour.
+EMAIL_BATCH_WINDOW = int(os.environ.get('EMAIL_BATCH_WINDOW', 30))
+EMAIL_RATE_LIMIT = int(os.environ.get('EMAIL_RATE_LIMIT', 20))
 
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
 
+# Property page leads (apps.property.leads): agency notification batching
+# window and the period during which a repeated submission is dropped.
+LEAD_NOTIFICATION_DELAY = int(os.environ.get('LEAD_NOTIFICATION_DELAY', 60))
+LEAD_DEDUP_WINDOW = int(os.environ.get('LEAD_DEDUP_WINDOW', 10 * 60))
+
 # ========================================
 # Logging Configuration
 # ========================================
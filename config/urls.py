@@ -15,8 +15,10 @@ from drf_spectacular.views import (
 from apps.property.views import PropertyListView
 
 from apps.property import views
-from apps.property.views import get_communes
+from apps.property.views import get_communes, get_communes_bundle
 from django.http import JsonResponse
+from apps.core import metrics
+from apps.core.page_cache import cache_tenant_page
 
 def health_check(request):
     """Health check endpoint for Docker and load balancers."""
@@ -25,6 +27,13 @@ def health_check(request):
         'service': 'realestate-api'
     })
 
+def metrics_view(request):
+    """Per-worker counters (tenant resolution, caches) for staff users."""
+    user = getattr(request, 'user', None)
+    if not (user and user.is_staff):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return JsonResponse({'metrics': metrics.snapshot()})
+
 api_v1_patterns = [
     # path('accounts/', include('apps.accounts.urls')), no need for auth for now
     path('', include('apps.property.urls')),
@@ -33,16 +42,18 @@ api_v1_patterns = [
 urlpatterns = [
     # Health check
     path('api/health/', health_check, name='health_check'),
+    path('api/metrics/', metrics_view, name='metrics'),
     
     # Admin
+    path('admin/get_communes/all/', get_communes_bundle, name='get_communes_bundle'),
     path('admin/get_communes/<int:wilaya_id>/', get_communes, name='get_communes'),
     path(settings.ADMIN_URL if hasattr(settings, 'ADMIN_URL') else 'admin/', admin.site.urls),
 
     # Public frontend pages (served from Frontend folder)
     path('', views.home, name='home'),
-    path('about/', TemplateView.as_view(template_name='about.html'), name='about'),
-    path('contact/', TemplateView.as_view(template_name='contact.html'), name='contact'),
-    path('faq/', TemplateView.as_view(template_name='faq.html'), name='faq'),
+    path('about/', cache_tenant_page(TemplateView.as_view(template_name='about.html')), name='about'),
+    path('contact/', cache_tenant_page(TemplateView.as_view(template_name='contact.html')), name='contact'),
+    path('faq/', cache_tenant_page(TemplateView.as_view(template_name='faq.html')), name='faq'),
     path('shop-grid/', PropertyListView.as_view(), name='shop_grid'),
     path('properties/<str:reference>/', views.property_detail, name='property_detail'),
     path('product-details/', TemplateView.as_view(template_name='product-details.html'), name='product_details'),